@@ -2,3 +2,5 @@
 
 from . import models
 from . import controllers
+from . import wizard
+from .hooks import post_init_hook
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Controle de Combustível',
-    'version': '1.0',
+    'version': '1.1',
     'category': 'Fleet',
     'summary': 'Gestão de abastecimento e estoque de combustível',
     'description': """
@@ -12,14 +12,25 @@ Desenvolvido para MachadoERP.
     'website': 'https://github.com/machado-erp',
     'license': 'LGPL-3',
     'depends': ['base', 'fleet', 'mail'],
+    'external_dependencies': {
+        'python': ['numpy', 'xlsxwriter'],
+    },
     'data': [
         'security/security.xml',
         'security/ir.model.access.csv',
         'data/sequence_data.xml',
         'data/tanque_data.xml',
+        'data/cron_data.xml',
         'views/tanque_views.xml',
+        'views/deposito_views.xml',
         'views/abastecimento_views.xml',
+        'views/consumo_diario_views.xml',
+        'views/alerta_views.xml',
+        'views/exportacao_views.xml',
+        'views/auditoria_views.xml',
+        'views/historico_views.xml',
         'views/dashboard_views.xml',
+        'wizard/importacao_abastecimento_views.xml',
         'views/menu_views.xml',
         'reports/report_abastecimento.xml',
     ],
@@ -28,6 +39,7 @@ Desenvolvido para MachadoERP.
             'controle_combustivel/static/src/css/dashboard.css',
         ],
     },
+    'post_init_hook': 'post_init_hook',
     'installable': True,
     'application': True,
     'sequence': 1,
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+from odoo import http
+from odoo.exceptions import UserError
+from odoo.http import request
+from ..models.importador import COLUNAS
+from .main import DashboardCache
+from types import MappingProxyType
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Máximo de eventos por requisição
+LIMITE_LOTE = 1000
+
+# Placas/tanques/fuso resolvidos por usuário, válidos enquanto frota, tanques e depósitos não mudarem
+# (a versão é a geração do cache); o TTL só limita entradas esquecidas
+CACHE_MAPAS = DashboardCache(tamanho=64, ttl=3600)
+
+ALIASES = {alias: coluna for coluna, opcoes in COLUNAS.items() for alias in opcoes}
+
+class IngestaoCombustivelController(http.Controller):
+    """ API de ingestão para terminais de bomba: lotes de abastecimentos por placa, sem onchanges de formulário. """
+
+    def _versao(self):
+        """ Versão dos cadastros usados na resolução: muda a cada criação, alteração ou exclusão. """
+        request.env.cr.execute("""
+            SELECT (SELECT MAX(write_date) FROM fleet_vehicle), (SELECT COUNT(*) FROM fleet_vehicle),
+                   (SELECT MAX(write_date) FROM controle_combustivel_tanque), (SELECT COUNT(*) FROM controle_combustivel_tanque),
+                   (SELECT MAX(write_date) FROM controle_combustivel_deposito)
+        """)
+        return request.env.cr.fetchone()
+
+    def _mapas(self):
+        """ Mapas de resolução do importador para esta requisição.
+
+        Placas e tanques vêm de um retrato imutável, em cache por usuário e empresas ativas e
+        invalidado pela versão dos cadastros. Os motoristas são resolvidos a cada requisição
+        num dicionário próprio: o importador o preenche e um motorista recém-cadastrado vale na hora.
+        """
+        chave = (request.db, request.env.uid, request.env.user.tz, tuple(request.env.companies.ids))
+        versao = self._versao()
+        retrato = CACHE_MAPAS.obter(chave, versao)
+        if retrato is None:
+            mapas = request.env['controle.combustivel.importador']._mapas()
+            retrato = MappingProxyType({
+                'veiculos': MappingProxyType(mapas['veiculos']),
+                'tanques': MappingProxyType(mapas['tanques']),
+                'tz': mapas['tz'],
+            })
+            CACHE_MAPAS.guardar(chave, versao, retrato)
+        return dict(retrato, motoristas={})
+
+    def _linha(self, evento):
+        """ Evento JSON -> linha no formato do importador CSV (mesmos nomes e aliases de coluna). """
+        return {ALIASES.get(nome, nome): valor if isinstance(valor, str) else str(valor)
+                for nome, valor in evento.items() if valor is not None}
+
+    @http.route('/combustivel/api/abastecimentos', type='http', auth='bearer', methods=['POST'], csrf=False, save_session=False)
+    def ingerir(self, **kw):
+        """ Recebe {"eventos": [{placa, data_hora, odometro, litros, preco, chave, ...}]}.
+
+        Autenticação por chave de API (Authorization: Bearer <chave>). O lote é criado
+        e confirmado numa única transação; eventos com erro são isolados e a chave
+        torna o reenvio idempotente. Responde com o resultado de cada evento, na ordem.
+        """
+        inicio = time.perf_counter()
+        try:
+            eventos = request.get_json_data().get('eventos')
+        except (ValueError, AttributeError):
+            eventos = None
+        if not isinstance(eventos, list) or not all(isinstance(e, dict) for e in eventos):
+            return request.make_json_response({'error': 'payload inválido: esperado {"eventos": [...]}'}, status=400)
+        if len(eventos) > LIMITE_LOTE:
+            return request.make_json_response({'error': 'lote acima de %s eventos' % LIMITE_LOTE}, status=413)
+
+        Importador = request.env['controle.combustivel.importador']
+        linhas = [(i, self._linha(e)) for i, e in enumerate(eventos)]
+        mapas = self._mapas()
+        Importador._carregar_motoristas(linhas, mapas)
+
+        resultados, convertidas = [None] * len(eventos), []
+        for i, linha in linhas:
+            try:
+                convertidas.append((i, Importador._valores(linha, mapas)))
+            except UserError as e:
+                resultados[i] = {'status': 'erro', 'mensagem': str(e)}
+        registros, _duplicados, erros = Importador._gravar_lote(convertidas)
+        for i, mensagem in erros:
+            resultados[i] = {'status': 'erro', 'mensagem': mensagem}
+        criados = {r.chave_externa: r for r in registros}
+        for i, valores in convertidas:
+            if resultados[i] is not None:
+                continue
+            registro = criados.pop(valores['chave_externa'], None)
+            resultados[i] = {'status': 'criado', 'id': registro.id, 'name': registro.name} if registro else {'status': 'duplicado'}
+            resultados[i]['chave'] = valores['chave_externa']
+
+        _logger.info("Ingestão: %s eventos, %s criados, %s erros em %.3f s", len(eventos), len(registros),
+                     sum(r['status'] == 'erro' for r in resultados), time.perf_counter() - inicio)
+        return request.make_json_response({'resultados': resultados})
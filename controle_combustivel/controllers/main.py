@@ -2,94 +2,196 @@
 
 from odoo import http, fields
 from odoo.http import request
+from odoo.tools import str2bool
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
+import cProfile
+import hashlib
+import io
+import logging
+import pstats
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+class DashboardCache:
+    """ Cache LRU com TTL dos dados agregados do dashboard, por processo.
+
+    Cada entrada guarda a geração em que foi calculada; entradas de geração
+    anterior (houve commit alterando estoque ou consumo) ou vencidas são
+    recalculadas.
+    """
+
+    def __init__(self, tamanho=256, ttl=60):
+        self.tamanho, self.ttl = tamanho, ttl
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.expiradas = self.descartadas = 0
+
+    def obter(self, chave, geracao):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada and entrada[0] == geracao and entrada[1] > time.monotonic():
+                self._entradas.move_to_end(chave)
+                self.hits += 1
+                return entrada[2]
+            if entrada:
+                del self._entradas[chave]
+                self.expiradas += 1
+            self.misses += 1
+            return None
+
+    def guardar(self, chave, geracao, valor):
+        with self._lock:
+            self._entradas[chave] = (geracao, time.monotonic() + self.ttl, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho:
+                self._entradas.popitem(last=False)
+                self.descartadas += 1
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'hits': self.hits, 'misses': self.misses,
+                'hit_ratio': self.hits / consultas if consultas else 0.0,
+                'expiradas': self.expiradas, 'descartadas': self.descartadas,
+                'entradas': len(self._entradas), 'tamanho': self.tamanho, 'ttl': self.ttl,
+            }
+
+CACHE = DashboardCache()
+
+@contextmanager
+def perfilar(nome):
+    """ cProfile + log SQL do bloco: consultas, tempo e as 30 funções mais caras (tempo acumulado) no log. """
+    logger_sql = logging.getLogger('odoo.sql_db')
+    nivel = logger_sql.level
+    consultas = request.env.cr.sql_log_count
+    perfil = cProfile.Profile()
+    logger_sql.setLevel(logging.DEBUG)
+    inicio = time.perf_counter()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        logger_sql.setLevel(nivel)
+        saida = io.StringIO()
+        pstats.Stats(perfil, stream=saida).sort_stats('cumulative').print_stats(30)
+        _logger.info("Perfil %s: %s consultas, %.3f s\n%s", nome, request.env.cr.sql_log_count - consultas,
+                     time.perf_counter() - inicio, saida.getvalue())
 
 class DashboardCombustivelController(http.Controller):
     """ Controller para o Dashboard de Combustível. """
 
+    def _tanque(self):
+        tanque = request.env['controle.combustivel.tanque']._tanque_padrao()
+        if not tanque:
+            tanque = request.env['controle.combustivel.tanque'].create({'name': 'Tanque Principal', 'capacidade': 6000.0})
+        return tanque
+
+    def _chave(self, vehicle_id, driver_id, tanque):
+        # Dia (e não só o mês) na chave: o gráfico de 7 dias muda à meia-noite;
+        # tanque resolvido do usuário: depósitos diferentes não compartilham a resposta
+        return (request.db, tuple(request.env.companies.ids), vehicle_id, driver_id, fields.Date.today(), tanque.id)
+
+    def _dados(self, chave, geracao):
+        """ KPIs, alertas e gráfico agregados no banco, servidos do cache quando possível. Retorna (dados, hit). """
+        dados = CACHE.obter(chave, geracao)
+        if dados is not None:
+            return dados, True
+        dados = request.env['controle.combustivel.dashboard'].get_dados(vehicle_id=chave[2], driver_id=chave[3], hoje=chave[4])
+        CACHE.guardar(chave, geracao, dados)
+        return dados, False
+
+    def _perfilar(self, kw):
+        """ Perfil sob demanda (?perfil=1), só para administradores e com o parâmetro de sistema ligado. """
+        return (kw.get('perfil') == '1'
+                and request.env.user.has_group('controle_combustivel.group_administrador')
+                and str2bool(request.env['ir.config_parameter'].sudo().get_param('controle_combustivel.perfil_dashboard', 'False')))
+
     @http.route('/combustivel/dashboard', type='http', auth='user', website=False)
     def dashboard(self, **kw):
         # Permissões
         if not request.env.user.has_group('controle_combustivel.group_analista'):
             return request.redirect('/web')
         
+        if self._perfilar(kw):
+            with perfilar('/combustivel/dashboard'):
+                resposta = self._dashboard(kw)
+                # A renderização QWeb é preguiçosa: força dentro do perfil
+                resposta.flatten()
+            return resposta
+        return self._dashboard(kw)
+
+    def _dashboard(self, kw):
         # Dados do Tanque
-        tanque = request.env['controle.combustivel.tanque'].search([], limit=1)
-        if not tanque:
-            tanque = request.env['controle.combustivel.tanque'].create({'name': 'Tanque Principal', 'capacidade': 6000.0})
+        tanque = self._tanque()
         
         # Filtros
         vehicle_id = int(kw.get('vehicle_id', 0))
         driver_id = int(kw.get('driver_id', 0))
         
-        # Período
-        hoje = fields.Date.today()
-        p_dia = hoje.replace(day=1)
-        u_dia = (p_dia + relativedelta(months=1)) - relativedelta(days=1)
-        
-        domain = [
-            ('data_hora', '>=', datetime.combine(p_dia, datetime.min.time())),
-            ('data_hora', '<=', datetime.combine(u_dia, datetime.max.time())),
-            ('state', '=', 'confirmado'),
-        ]
-        if vehicle_id: domain.append(('equipamento_id', '=', vehicle_id))
-        if driver_id: domain.append(('motorista_id', '=', driver_id))
-            
-        abastecimentos = request.env['controle.combustivel.abastecimento'].search(domain)
-        
-        # Totais e KPIs
-        litros = sum(a.quantidade_litros or 0.0 for a in abastecimentos)
-        valor = sum(a.total or 0.0 for a in abastecimentos)
-        total_km = sum(a.km_percorrido or 0.0 for a in abastecimentos)
-        avg_kml = total_km / litros if litros > 0 else 0
-        avg_cost_km = valor / total_km if total_km > 0 else 0
+        # KPIs, alertas e gráfico agregados no banco
+        chave = self._chave(vehicle_id, driver_id, tanque)
+        dados, _hit = self._dados(chave, request.env['controle.combustivel.dashboard']._geracao())
         
-        # Projeção de Estoque
-        d_passados = max(1, hoje.day)
-        consumo_dia = litros / d_passados
-        dias_restantes = int(tanque.estoque_atual / consumo_dia) if consumo_dia > 0 else 0
-        
-        # Alertas de Desvio (queda > 20% da média do veículo)
-        veiculos_alerta = []
-        if not vehicle_id:
-            for v in abastecimentos.mapped('equipamento_id'):
-                abasts_v = abastecimentos.filtered(lambda a: a.equipamento_id == v)
-                if len(abasts_v) >= 2:
-                    media_v = sum(a.consumo_kml or 0.0 for a in abasts_v) / len(abasts_v)
-                    for a in abasts_v:
-                        if 0 < a.consumo_kml < (media_v * 0.8):
-                            veiculos_alerta.append({'veiculo': v.name, 'placa': v.license_plate, 'consumo': a.consumo_kml, 'media': media_v})
-                            break
-        
-        # Gráfico últimos 7 dias
-        consumo_7d = []
-        for i in range(6, -1, -1):
-            dia = hoje - relativedelta(days=i)
-            l_dia = sum(request.env['controle.combustivel.abastecimento'].search([
-                ('data_hora', '>=', datetime.combine(dia, datetime.min.time())),
-                ('data_hora', '<=', datetime.combine(dia, datetime.max.time())),
-                ('state', '=', 'confirmado'),
-            ]).mapped('quantidade_litros'))
-            
-            # Altura proporcional para o gráfico CSS (seguro)
-            divisor = max(10, (litros / max(1, len(abastecimentos))) * 3) if len(abastecimentos) > 0 else 100
-            altura = min(100, (l_dia / divisor) * 100)
-            consumo_7d.append({'dia': dia.strftime('%d/%m'), 'litros': l_dia, 'altura': altura})
-
         # Renderização
-        meses = {1:'Janeiro', 2:'Fevereiro', 3:'Março', 4:'Abril', 5:'Maio', 6:'Junho', 7:'Julho', 8:'Agosto', 9:'Setembro', 10:'Outubro', 11:'Novembro', 12:'Dezembro'}
-        return request.render('controle_combustivel.dashboard_combustivel_template', {
-            'tanque': tanque, 'consumo_litros': litros, 'consumo_valor': valor,
-            'total_abastecimentos': len(abastecimentos), 'periodo_mes': f"{meses[hoje.month]}/{hoje.year}",
+        return request.render('controle_combustivel.dashboard_combustivel_template', dict(dados, **{
+            # Projeção de estoque: previsão gravada pelo cron (sazonalidade semanal)
+            'tanque': tanque, 'dias_restantes': tanque.dias_restantes,
             'ultimo_abastecimento': request.env['controle.combustivel.abastecimento'].search([('state', '=', 'confirmado')], order='data_hora desc', limit=1),
             'data_atualizacao': datetime.now().strftime('%d/%m/%Y %H:%M'),
-            'consumo_diario': consumo_7d, 'avg_kml': avg_kml, 'avg_cost_km': avg_cost_km, 'dias_restantes': dias_restantes,
-            'veiculos_alerta': veiculos_alerta[:3], 'vehicles': request.env['fleet.vehicle'].search([]),
-            'drivers': request.env['res.partner'].search([('is_company', '=', False)]),
+            'vehicles': request.env['fleet.vehicle'].search_fetch([], ['name']),
+            'drivers': request.env['res.partner'].search_fetch([('is_company', '=', False)], ['name']),
             'selected_vehicle': vehicle_id, 'selected_driver': driver_id,
             'action_abastecimento': request.env.ref('controle_combustivel.action_abastecimento_tree').id,
             'cor_badge': 'bg-success' if tanque.percentual_nivel > 30 else ('bg-warning' if tanque.percentual_nivel >= 15 else 'bg-danger'),
             'cor_progress': 'bg-success' if tanque.percentual_nivel > 30 else ('bg-warning' if tanque.percentual_nivel >= 15 else 'bg-danger'),
             'cor_tank': 'tank-green' if tanque.percentual_nivel > 30 else ('tank-yellow' if tanque.percentual_nivel >= 15 else 'tank-red'),
-        })
+        }))
+
+    @http.route('/combustivel/dashboard/data', type='http', auth='user', methods=['GET'])
+    def dashboard_data(self, **kw):
+        """ Dados do dashboard em JSON, com ETag: consultas sem alteração respondem 304. """
+        if not request.env.user.has_group('controle_combustivel.group_analista'):
+            return request.make_json_response({'error': 'forbidden'}, status=403)
+        
+        vehicle_id = int(kw.get('vehicle_id', 0))
+        driver_id = int(kw.get('driver_id', 0))
+        tanque = self._tanque()
+        chave = self._chave(vehicle_id, driver_id, tanque)
+        geracao = request.env['controle.combustivel.dashboard']._geracao()
+        etag = '"%s"' % hashlib.sha1(repr((geracao, chave)).encode()).hexdigest()
+        cabecalhos = [('ETag', etag), ('Cache-Control', 'private, no-cache')]
+        if request.httprequest.if_none_match.contains(etag.strip('"')):
+            return request.make_response('', headers=cabecalhos, status=304)
+        
+        dados, hit = self._dados(chave, geracao)
+        cabecalhos.append(('X-Cache', 'HIT' if hit else 'MISS'))
+        
+        ultimo = request.env['controle.combustivel.abastecimento'].search([('state', '=', 'confirmado')], order='data_hora desc', limit=1)
+        return request.make_json_response(dict(dados, **{
+            'tanque': {
+                'name': tanque.name, 'capacidade': tanque.capacidade,
+                'estoque_atual': tanque.estoque_atual, 'percentual_nivel': tanque.percentual_nivel,
+                'consumo_previsto_dia': tanque.consumo_previsto_dia, 'quantidade_reposicao': tanque.quantidade_reposicao,
+                'data_ruptura': fields.Date.to_string(tanque.data_ruptura), 'data_pedido': fields.Date.to_string(tanque.data_pedido),
+            },
+            'dias_restantes': tanque.dias_restantes,
+            'ultimo_abastecimento': {
+                'data_hora': fields.Datetime.to_string(ultimo.data_hora),
+                'equipamento': ultimo.equipamento_id.name, 'placa': ultimo.placa,
+                'quantidade': ultimo.quantidade_litros, 'usuario': ultimo.usuario_id.name,
+            } if ultimo else False,
+            'data_atualizacao': datetime.now().strftime('%d/%m/%Y %H:%M'),
+        }), headers=cabecalhos)
+
+    @http.route('/combustivel/dashboard/cache', type='http', auth='user', methods=['GET'], readonly=True)
+    def dashboard_cache(self, **kw):
+        """ Contadores do cache deste processo, para dimensionamento. """
+        if not request.env.user.has_group('controle_combustivel.group_administrador'):
+            return request.make_json_response({'error': 'forbidden'}, status=403)
+        return request.make_json_response(CACHE.estatisticas())
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+
+def inicializar_estado(env):
+    """ Estado derivado que não vem dos documentos já gravados: razão de estoque e checkpoints,
+    e a última leitura de cada veículo (validação do odômetro desde a primeira confirmação).
+    """
+    env['controle.combustivel.tanque'].sudo()._inicializar_razao()
+    env['controle.combustivel.leitura.veiculo'].sudo().reconstruir()
+
+
+def post_init_hook(env):
+    inicializar_estado(env)
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, SUPERUSER_ID
+from odoo.addons.controle_combustivel.hooks import inicializar_estado
+
+
+def migrate(cr, version):
+    """ Atualização para 1.1: auditoria por flag, empresa dos alertas e estado derivado (razão, checkpoints, leituras). """
+    if not version:
+        return
+    # Auditoria adiada: a antiga marca d'água vira o flag publicado
+    cr.execute("SELECT value FROM ir_config_parameter WHERE key = 'controle_combustivel.auditoria_ultimo_id'")
+    marca = cr.fetchone()
+    cr.execute("UPDATE controle_combustivel_auditoria SET publicado = id <= %s", [int(marca[0]) if marca else 0])
+    cr.execute("DELETE FROM ir_config_parameter WHERE key = 'controle_combustivel.auditoria_ultimo_id'")
+    # Alertas já detectados herdam a empresa do abastecimento
+    cr.execute("""
+        UPDATE controle_combustivel_alerta l SET company_id = a.company_id
+          FROM controle_combustivel_abastecimento a
+         WHERE a.id = l.abastecimento_id AND l.company_id IS NULL
+    """)
+    inicializar_estado(api.Environment(cr, SUPERUSER_ID, {}))
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+from psycopg2 import sql
+
+
+def migrate(cr, version):
+    """ Atualização para 1.1: a chave externa passa a ser única por empresa.
+
+    Remove os índices únicos globais em chave_externa; o ORM recria a unicidade em (company_id, chave_externa).
+    """
+    if not version:
+        return
+    cr.execute("""
+        SELECT indexname FROM pg_indexes
+         WHERE tablename IN ('controle_combustivel_abastecimento', 'controle_combustivel_abastecimento_historico')
+           AND indexdef ILIKE 'CREATE UNIQUE INDEX%%(chave_externa)%%'
+    """)
+    for nome, in cr.fetchall():
+        cr.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(nome)))
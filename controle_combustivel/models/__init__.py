@@ -1,4 +1,16 @@
 # -*- coding: utf-8 -*-
 
+from . import deposito
 from . import tanque_combustivel
 from . import abastecimento
+from . import leitura_veiculo
+from . import movimento
+from . import consumo_diario
+from . import alerta
+from . import dashboard
+from . import importador
+from . import exportacao
+from . import auditoria
+from . import historico
+from . import fleet_vehicle
+from . import res_users
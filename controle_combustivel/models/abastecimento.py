@@ -2,6 +2,15 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools import str2bool
+from .movimento import CAMPOS_ESTOQUE
+from .consumo_diario import CAMPOS_CONSUMO
+
+# Campos que definem a sequência de leituras de um veículo
+CAMPOS_LEITURA = ['state', 'equipamento_id', 'tipo_medicao', 'data_hora', 'horimetro_odometro']
+CAMPOS_EFICIENCIA = ['leitura_anterior', 'km_percorrido', 'consumo_kml', 'custo_km']
+# Acima disso a impressão vira exportação em segundo plano (renderização em lotes)
+LIMITE_IMPRESSAO_DIRETA = 200
 
 class Abastecimento(models.Model):
     """ Registro de abastecimentos vinculado à frota. """
@@ -10,17 +19,23 @@ class Abastecimento(models.Model):
     _inherit = ['mail.thread', 'mail.activity.mixin']
     _order = 'data_hora desc, id desc'
     _rec_name = 'name'
+    _check_company_auto = True
+
+    # Busca da leitura anterior/seguinte do mesmo veículo (LAG/LEAD em _compute_eficiencia)
+    _equipamento_leitura_idx = models.Index('(equipamento_id, tipo_medicao, state, data_hora)')
+    # Chave da transação por empresa: cada empresa tem suas bombas e cartões
+    _empresa_chave_externa_uniq = models.UniqueIndex('(company_id, chave_externa) WHERE chave_externa IS NOT NULL', 'Este abastecimento já foi importado (chave externa repetida).')
 
     # Identificação
     name = fields.Char(string='Número', required=True, copy=False, readonly=True, default=lambda self: _('Novo'))
     
     # Dados Gerais
     data_hora = fields.Datetime(string='Data/Hora', required=True, default=fields.Datetime.now, tracking=True)
-    equipamento_id = fields.Many2one('fleet.vehicle', string='Veículo/Equipamento', required=True, tracking=True)
+    equipamento_id = fields.Many2one('fleet.vehicle', string='Veículo/Equipamento', required=True, ondelete='restrict', tracking=True)
     placa = fields.Char(related='equipamento_id.license_plate', string='Placa', store=True, readonly=True)
     motorista_id = fields.Many2one('res.partner', string='Motorista', tracking=True, domain="[('is_company', '=', False)]")
     usuario_id = fields.Many2one('res.users', string='Registrado por', default=lambda self: self.env.user, readonly=True, tracking=True)
-    tanque_id = fields.Many2one('controle.combustivel.tanque', string='Tanque', required=True, default=lambda self: self._default_tanque(), tracking=True)
+    tanque_id = fields.Many2one('controle.combustivel.tanque', string='Tanque', required=True, ondelete='restrict', default=lambda self: self._default_tanque(), tracking=True, check_company=True)
     
     # Medição e Consumo
     horimetro_odometro = fields.Float(string='Horímetro/Odômetro', required=True, tracking=True)
@@ -31,6 +46,8 @@ class Abastecimento(models.Model):
     
     # Eficiência
     leitura_anterior = fields.Float(string='Leitura Anterior', compute='_compute_eficiencia', store=True)
+    ultima_leitura_veiculo = fields.Float(string='Última Leitura do Veículo', compute='_compute_ultima_leitura_veiculo')
+    ultima_data_veiculo = fields.Datetime(string='Data da Última Leitura', compute='_compute_ultima_leitura_veiculo')
     km_percorrido = fields.Float(string='KM/H Percorrido', compute='_compute_eficiencia', store=True)
     consumo_kml = fields.Float(string='Consumo (km/L)', compute='_compute_eficiencia', store=True, digits=(12, 2))
     custo_km = fields.Float(string='Custo por KM (R$)', compute='_compute_eficiencia', store=True, digits=(12, 2))
@@ -42,36 +59,163 @@ class Abastecimento(models.Model):
     comprovante_filename = fields.Char(string='Nome do Arquivo')
     estoque_disponivel = fields.Float(related='tanque_id.estoque_atual', string='Estoque Disponível', readonly=True)
     company_id = fields.Many2one('res.company', string='Empresa', default=lambda self: self.env.company)
+    chave_externa = fields.Char(string='Chave Externa', copy=False, readonly=True, help='Identificador da transação de origem (bomba/cartão); evita importar o mesmo abastecimento duas vezes.')
 
     def _default_tanque(self):
-        return self.env['controle.combustivel.tanque'].search([], limit=1)
+        return self.env['controle.combustivel.tanque']._tanque_padrao()
+
+    def _auditoria_adiada(self):
+        """ Auditoria adiada: contexto `auditoria_adiada` ou parâmetro controle_combustivel.auditoria_adiada. """
+        if 'auditoria_adiada' in self.env.context:
+            return bool(self.env.context['auditoria_adiada'])
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param('controle_combustivel.auditoria_adiada', 'False'))
+
+    def _valores_rastreados(self, campos):
+        """ Valores legíveis dos campos rastreados, por registro, para a trilha de auditoria. """
+        return {r.id: {f: r._fields[f].convert_to_export(r[f], r) for f in campos} for r in self}
+
+    def _auditar_alteracoes(self, campos, anteriores):
+        linhas = []
+        for record, atuais in self._valores_rastreados(campos).items():
+            alteracoes = {f: (anteriores[record][f], v) for f, v in atuais.items() if v != anteriores[record][f]}
+            if alteracoes:
+                linhas.append((record, 'alteracao', alteracoes))
+        self.env['controle.combustivel.auditoria']._registrar(linhas)
+
+    @api.model
+    def _reservar_nomes(self, quantidade):
+        """ Reserva `quantidade` números da sequência em bloco, numa única ida ao banco. """
+        sequencia = self.env['ir.sequence'].sudo().search([
+            ('code', '=', self._name), ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not sequencia:
+            return [_('Novo')] * quantidade
+        if sequencia.use_date_range:
+            return [sequencia.next_by_id() for _i in range(quantidade)]
+        if sequencia.implementation == 'standard':
+            self.env.cr.execute("SELECT nextval(%s) FROM generate_series(1, %s)", ['ir_sequence_%03d' % sequencia.id, quantidade])
+            numeros = [numero for numero, in self.env.cr.fetchall()]
+        else:
+            self.env.cr.execute("""
+                UPDATE ir_sequence SET number_next = number_next + %s * number_increment
+                 WHERE id = %s RETURNING number_next - %s * number_increment, number_increment
+            """, [quantidade, sequencia.id, quantidade])
+            primeiro, passo = self.env.cr.fetchone()
+            sequencia.invalidate_recordset(['number_next'])
+            numeros = range(primeiro, primeiro + quantidade * passo, passo)
+        return [sequencia.get_next_char(numero) for numero in numeros]
 
     @api.depends('quantidade_litros', 'valor_por_litro')
     def _compute_total(self):
         for record in self:
             record.total = record.quantidade_litros * record.valor_por_litro
 
-    @api.depends('equipamento_id', 'horimetro_odometro', 'state', 'quantidade_litros', 'total')
+    @api.depends('equipamento_id', 'tipo_medicao', 'data_hora', 'horimetro_odometro', 'state', 'quantidade_litros', 'total')
     def _compute_eficiencia(self):
+        anteriores = self.filtered(lambda r: r.state == 'confirmado' and r._origin.id)._leituras_anteriores()
         for record in self:
-            if record.state != 'confirmado':
+            anterior = anteriores.get(record._origin.id) if record.state == 'confirmado' else None
+            if anterior is None:
                 record.leitura_anterior = record.km_percorrido = record.consumo_kml = record.custo_km = 0
                 continue
 
-            ultimo = self.search([
-                ('equipamento_id', '=', record.equipamento_id.id),
-                ('state', '=', 'confirmado'),
-                ('id', '<', record.id),
-                ('tipo_medicao', '=', record.tipo_medicao),
-            ], order='data_hora desc, id desc', limit=1)
-
-            if ultimo:
-                record.leitura_anterior = ultimo.horimetro_odometro
-                record.km_percorrido = record.horimetro_odometro - ultimo.horimetro_odometro
-                record.consumo_kml = record.km_percorrido / record.quantidade_litros if record.quantidade_litros > 0 else 0
-                record.custo_km = record.total / record.km_percorrido if record.km_percorrido > 0 else 0
-            else:
-                record.leitura_anterior = record.km_percorrido = record.consumo_kml = record.custo_km = 0
+            record.leitura_anterior = anterior
+            record.km_percorrido = record.horimetro_odometro - anterior
+            record.consumo_kml = record.km_percorrido / record.quantidade_litros if record.quantidade_litros > 0 else 0
+            record.custo_km = record.total / record.km_percorrido if record.km_percorrido > 0 else 0
+
+    @api.depends('equipamento_id', 'tipo_medicao')
+    def _compute_ultima_leitura_veiculo(self):
+        estados = self.env['controle.combustivel.leitura.veiculo']._estados(self)
+        for record in self:
+            estado = estados.get((record.equipamento_id.id, record.tipo_medicao))
+            record.ultima_leitura_veiculo = estado.ultima_leitura if estado else 0.0
+            record.ultima_data_veiculo = estado.ultima_data if estado else False
+
+    def _leituras_anteriores(self):
+        """ Leitura confirmada imediatamente anterior de cada registro.
+
+        Registros posteriores à última leitura do veículo a obtêm do estado em O(1); os demais
+        (retroativos, recálculos) numa única consulta (LAG), e o primeiro registro ativo de cada
+        veículo usa a última leitura arquivada como anterior.
+        """
+        if not self.equipamento_id:
+            return {}
+        anteriores, restantes = self.env['controle.combustivel.leitura.veiculo']._anteriores(self._origin)
+        if restantes:
+            anteriores.update(restantes._buscar_leituras_anteriores())
+        return anteriores
+
+    def _buscar_leituras_anteriores(self):
+        self.flush_model(CAMPOS_LEITURA)
+        self.env['controle.combustivel.leitura.veiculo'].flush_model()
+        self.env.cr.execute("""
+            SELECT l.id, COALESCE(l.anterior, b.leitura_base)
+              FROM (
+                    SELECT id, equipamento_id, tipo_medicao, data_hora, LAG(horimetro_odometro) OVER (
+                               PARTITION BY equipamento_id, tipo_medicao ORDER BY data_hora, id) AS anterior
+                      FROM controle_combustivel_abastecimento
+                     WHERE state = 'confirmado' AND equipamento_id IN %s
+              ) l
+              LEFT JOIN controle_combustivel_leitura_veiculo b
+                     ON l.anterior IS NULL AND b.equipamento_id = l.equipamento_id
+                    AND b.tipo_medicao = l.tipo_medicao AND b.data_base <= l.data_hora
+             WHERE l.id IN %s AND COALESCE(l.anterior, b.leitura_base) IS NOT NULL
+        """, [tuple(self.equipamento_id.ids), tuple(self._origin.ids)])
+        return dict(self.env.cr.fetchall())
+
+    def _vizinhos_leitura(self):
+        """ Leituras vizinhas (anterior e seguinte) de cada registro entre os confirmados do veículo e o próprio lote.
+
+        Base da validação de registros retroativos ou de veículos sem estado: {id: (anterior, seguinte)}.
+        """
+        self.flush_model(CAMPOS_LEITURA)
+        self.env['controle.combustivel.leitura.veiculo'].flush_model()
+        self.env.cr.execute("""
+            SELECT l.id, COALESCE(l.anterior, b.leitura_base), l.seguinte
+              FROM (
+                    SELECT id, equipamento_id, tipo_medicao, data_hora,
+                           LAG(horimetro_odometro) OVER leituras AS anterior, LEAD(horimetro_odometro) OVER leituras AS seguinte
+                      FROM controle_combustivel_abastecimento
+                     WHERE (state = 'confirmado' OR id IN %(ids)s) AND equipamento_id IN %(veiculos)s
+                    WINDOW leituras AS (PARTITION BY equipamento_id, tipo_medicao ORDER BY data_hora, id)
+              ) l
+              LEFT JOIN controle_combustivel_leitura_veiculo b
+                     ON l.anterior IS NULL AND b.equipamento_id = l.equipamento_id
+                    AND b.tipo_medicao = l.tipo_medicao AND b.data_base <= l.data_hora
+             WHERE l.id IN %(ids)s
+        """, {'veiculos': tuple(self.equipamento_id.ids), 'ids': tuple(self._origin.ids)})
+        return {id_: (anterior, seguinte) for id_, anterior, seguinte in self.env.cr.fetchall()}
+
+    def _sucessores(self):
+        """ Próxima leitura confirmada (mesmo veículo e tipo de medição) de cada registro confirmado. """
+        confirmados = self.filtered(lambda r: r.state == 'confirmado')
+        # Posteriores à última leitura registrada não têm sucessor
+        _anteriores, confirmados = self.env['controle.combustivel.leitura.veiculo']._anteriores(confirmados)
+        if not confirmados:
+            return self.browse()
+        self.flush_model(CAMPOS_LEITURA)
+        self.env.cr.execute("""
+            SELECT proximo
+              FROM (
+                    SELECT id, LEAD(id) OVER (
+                               PARTITION BY equipamento_id, tipo_medicao ORDER BY data_hora, id) AS proximo
+                      FROM controle_combustivel_abastecimento
+                     WHERE state = 'confirmado' AND equipamento_id IN %s
+              ) leituras
+             WHERE id IN %s AND proximo IS NOT NULL
+        """, [tuple(confirmados.equipamento_id.ids), tuple(confirmados.ids)])
+        return self.browse({proximo for proximo, in self.env.cr.fetchall()})
+
+    def _chaves_consumo(self):
+        """ Pares (dia, veículo) do consumo diário aos quais os registros confirmados contribuem. """
+        return {(r.data_hora.date(), r.equipamento_id.id) for r in self if r.state == 'confirmado'}
+
+    def recalcular_eficiencia(self):
+        """ Marca o recordset inteiro para recálculo em lote da eficiência (uma consulta por lote). """
+        for fname in CAMPOS_EFICIENCIA:
+            self.env.add_to_compute(self._fields[fname], self)
+        return True
 
     @api.onchange('quantidade_litros', 'valor_por_litro')
     def _onchange_calcular_total(self):
@@ -86,6 +230,17 @@ class Abastecimento(models.Model):
     def _onchange_equipamento(self):
         if self.equipamento_id.driver_id:
             self.motorista_id = self.equipamento_id.driver_id
+        if self.equipamento_id and self.state == 'rascunho':
+            self.tanque_id = self.env['controle.combustivel.tanque']._tanque_padrao(self.equipamento_id) or self.tanque_id
+
+    @api.onchange('horimetro_odometro', 'equipamento_id', 'tipo_medicao', 'data_hora')
+    def _onchange_verificar_leitura(self):
+        # Lançamentos retroativos (antes da última leitura) são conferidos com os vizinhos na confirmação
+        retroativo = self.data_hora and self.ultima_data_veiculo and self.data_hora < self.ultima_data_veiculo
+        if self.state == 'rascunho' and not retroativo and self.horimetro_odometro and self.horimetro_odometro < self.ultima_leitura_veiculo:
+            return {'warning': {'title': _('Leitura Menor'), 'message': _(
+                'A leitura informada (%(leitura).1f) é menor que a última registrada para o veículo (%(ultima).1f).',
+                leitura=self.horimetro_odometro, ultima=self.ultima_leitura_veiculo)}}
 
     @api.constrains('quantidade_litros', 'valor_por_litro', 'horimetro_odometro')
     def _check_valores_positivos(self):
@@ -97,16 +252,68 @@ class Abastecimento(models.Model):
 
     @api.model_create_multi
     def create(self, vals_list):
+        Tanque = self.env['controle.combustivel.tanque']
         for vals in vals_list:
             if vals.get('name', _('Novo')) == _('Novo'):
                 vals['name'] = self.env['ir.sequence'].next_by_code('controle.combustivel.abastecimento') or _('Novo')
-        return super().create(vals_list)
+            # Sem tanque informado: o do veículo/depósito, antes do padrão genérico
+            if not vals.get('tanque_id') and vals.get('equipamento_id') and 'default_tanque_id' not in self.env.context:
+                vals['tanque_id'] = Tanque._tanque_padrao(self.env['fleet.vehicle'].browse(vals['equipamento_id'])).id
+        # Auditoria adiada: sem tracking/mensagens agora, só uma linha na trilha por registro
+        adiada = self._auditoria_adiada()
+        records = super(Abastecimento, self.with_context(tracking_disable=True) if adiada else self).create(vals_list).with_env(self.env)
+        if adiada:
+            self.env['controle.combustivel.auditoria']._registrar([(r.id, 'criacao', {}) for r in records])
+        self.env['controle.combustivel.movimento']._registrar_documentos(records, {}, 'saida')
+        # Registro retroativo já confirmado altera a leitura anterior do seguinte
+        sucessores = records._sucessores()
+        sucessores.recalcular_eficiencia()
+        self.env['controle.combustivel.consumo.diario']._atualizar((records | sucessores)._chaves_consumo())
+        confirmados = records.filtered(lambda r: r.state == 'confirmado')
+        if confirmados:
+            confirmados.flush_recordset(CAMPOS_EFICIENCIA)
+            self.env['controle.combustivel.leitura.veiculo'].sudo()._atualizar(confirmados)
+        return records
 
     def write(self, vals):
         for record in self:
             if record.state in ['confirmado', 'cancelado'] and not self.env.user.has_group('controle_combustivel.group_administrador'):
                 raise UserError(_('Registros confirmados não podem ser editados.'))
-        return super(Abastecimento, self).write(vals)
+        Movimento = self.env['controle.combustivel.movimento']
+        antes = Movimento._efeito(self) if CAMPOS_ESTOQUE.intersection(vals) else None
+        leitura = bool(set(CAMPOS_LEITURA).intersection(vals))
+        consumo = bool(CAMPOS_CONSUMO.intersection(vals))
+        # Confirmação avança o estado de leitura do veículo; outras mudanças de leitura em confirmados o reconstroem
+        confirmando = self.filtered(lambda r: r.state != 'confirmado') if vals.keys() == {'state'} and vals['state'] == 'confirmado' else self.browse()
+        veiculos = self.filtered(lambda r: r.state == 'confirmado').equipamento_id if leitura and not confirmando else self.env['fleet.vehicle']
+        sucessores = self._sucessores() if leitura else self.browse()
+        chaves = (self | sucessores)._chaves_consumo() if consumo else set()
+        adiada = self._auditoria_adiada()
+        # Campos cujo evento já é registrado explicitamente por quem escreve (ex.: state na confirmação)
+        rastreados = self._track_get_fields().intersection(vals) - set(self.env.context.get('auditoria_ignorar', ())) if adiada and self else set()
+        anteriores = self._valores_rastreados(rastreados) if rastreados else None
+        res = super(Abastecimento, self.with_context(tracking_disable=True) if adiada else self).write(vals)
+        if confirmando:
+            # Eficiência calculada já, com o estado anterior à confirmação
+            confirmando.flush_recordset(CAMPOS_EFICIENCIA)
+        if anteriores:
+            self._auditar_alteracoes(rastreados, anteriores)
+        if antes is not None:
+            Movimento._registrar_documentos(self, antes, 'saida')
+        if leitura:
+            # Só os vizinhos (antigo e novo) de cada registro alterado mudam de leitura anterior
+            sucessores |= self._sucessores()
+            sucessores.recalcular_eficiencia()
+        if consumo:
+            self.env['controle.combustivel.consumo.diario']._atualizar(chaves | (self | sucessores)._chaves_consumo())
+        Leitura = self.env['controle.combustivel.leitura.veiculo'].sudo()
+        if confirmando:
+            Leitura._atualizar(confirmando)
+        elif leitura:
+            veiculos |= self.filtered(lambda r: r.state == 'confirmado').equipamento_id
+            if veiculos:
+                Leitura.reconstruir(veiculos)
+        return res
 
     def unlink(self):
         for record in self:
@@ -115,13 +322,26 @@ class Abastecimento(models.Model):
         return super(Abastecimento, self).unlink()
 
     def action_confirmar(self):
-        for record in self:
-            if record.state != 'rascunho': continue
-            if not record.tanque_id.verificar_disponibilidade(record.quantidade_litros):
-                raise ValidationError(_('Estoque insuficiente!'))
-            record.tanque_id.consumir_combustivel(record.quantidade_litros)
-            record.state = 'confirmado'
-            record.message_post(body=_('Confirmado: %.2f L') % record.quantidade_litros)
+        """ Confirma em lote: trava cada tanque uma vez, valida a soma dos litros e grava o estado numa só escrita. """
+        rascunhos = self.filtered(lambda r: r.state == 'rascunho')
+        if not rascunhos:
+            return True
+        invalidos = self.env['controle.combustivel.leitura.veiculo']._leituras_invalidas(rascunhos)
+        if invalidos:
+            raise ValidationError(_('Leitura fora da sequência do veículo (menor que a anterior ou maior que a seguinte): %s',
+                                    ', '.join('%s (%.1f %s %.1f)' % (r.equipamento_id.display_name, r.horimetro_odometro, operador, referencia)
+                                              for r, operador, referencia in invalidos[:5])))
+        rascunhos.tanque_id._bloquear()
+        for tanque, registros in rascunhos.grouped('tanque_id').items():
+            litros = sum(registros.mapped('quantidade_litros'))
+            if not tanque.verificar_disponibilidade(litros):
+                raise ValidationError(_('Estoque insuficiente no tanque %(tanque)s: %(litros).2f L solicitados, %(estoque).2f L disponíveis.',
+                                        tanque=tanque.display_name, litros=litros, estoque=tanque.estoque_atual))
+        rascunhos.with_context(auditoria_ignorar=['state']).write({'state': 'confirmado'})
+        if self._auditoria_adiada():
+            self.env['controle.combustivel.auditoria']._registrar([(r.id, 'confirmacao', {'quantidade_litros': r.quantidade_litros}) for r in rascunhos])
+        else:
+            rascunhos._message_log_batch({r.id: _('Confirmado: %.2f L') % r.quantidade_litros for r in rascunhos})
         return True
 
     def action_cancelar(self):
@@ -136,4 +356,16 @@ class Abastecimento(models.Model):
         return True
 
     def action_imprimir(self):
+        if len(self) > LIMITE_IMPRESSAO_DIRETA:
+            return self.action_exportar_lote()
         return self.env.ref('controle_combustivel.action_report_abastecimento').report_action(self)
+
+    def action_exportar_lote(self):
+        exportacao = self.env['controle.combustivel.exportacao'].create({'abastecimento_ids': [(6, 0, self.ids)]})
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'controle.combustivel.exportacao',
+            'res_id': exportacao.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
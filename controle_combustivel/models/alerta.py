@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from datetime import timedelta
+import logging
+import warnings
+
+import numpy as np
+
+_logger = logging.getLogger(__name__)
+
+# Desvio relativo mínimo em relação à mediana do veículo (mesmo critério de -20% do dashboard)
+LIMITE_DESVIO = 0.2
+# Escore robusto (mediana/MAD) a partir do qual o desvio deixa de ser ruído
+LIMITE_ESCORE = 3.0
+# Leituras anteriores mínimas para haver linha de base
+MINIMO_LEITURAS = 4
+# Leituras anteriores do próprio veículo que formam a linha de base móvel
+JANELA_BASE = 20
+# Leituras processadas por bloco (limita a matriz leituras x janela em memória)
+BLOCO = 50000
+
+def linha_de_base(grupos, valores, janela=JANELA_BASE):
+    """ Mediana e MAD móveis das `janela` leituras anteriores de cada leitura, dentro do próprio grupo.
+
+    Os arrays vêm ordenados por grupo e data; a leitura avaliada nunca entra na própria base.
+    Retorna (contagem, mediana, mad), um valor por leitura.
+    """
+    posicao = np.arange(len(valores))
+    novo = np.concatenate(([True], grupos[1:] != grupos[:-1]))
+    inicio_grupo = np.maximum.accumulate(np.where(novo, posicao, 0))
+    contagem, mediana, mad = (np.zeros(len(valores)) for _i in range(3))
+    for inicio in range(0, len(valores), BLOCO):
+        bloco = slice(inicio, inicio + BLOCO)
+        indices = posicao[bloco, None] - np.arange(1, janela + 1)
+        validos = indices >= inicio_grupo[bloco, None]
+        anteriores = np.where(validos, valores[np.maximum(indices, 0)], np.nan)
+        with warnings.catch_warnings():
+            # Leituras sem nenhuma anterior: mediana NaN, descartada pela contagem
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mediana[bloco] = np.nanmedian(anteriores, axis=1)
+            mad[bloco] = np.nanmedian(np.abs(anteriores - mediana[bloco, None]), axis=1)
+        contagem[bloco] = validos.sum(axis=1)
+    return contagem, np.nan_to_num(mediana), np.nan_to_num(mad)
+
+def detectar_desvios(veiculos, valores, sentido):
+    """ Marca leituras fora da linha de base robusta (mediana/MAD) das leituras anteriores do veículo.
+
+    `veiculos` e `valores` vêm ordenados por veículo e data. `sentido` -1 procura quedas (km/L), +1 altas (R$/km).
+    Retorna (mascara, mediana, desvio_relativo, escore), um valor por leitura.
+    """
+    contagem, mediana, mad = linha_de_base(veiculos, valores)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        desvio = np.where(mediana > 0, valores / mediana - 1, 0.0)
+        escore = np.where(mad > 0, 0.6745 * (valores - mediana) / mad, 0.0)
+    mascara = (
+        (contagem >= MINIMO_LEITURAS)
+        & (sentido * desvio >= LIMITE_DESVIO)
+        & ((mad == 0) | (sentido * escore >= LIMITE_ESCORE))
+    )
+    return mascara, mediana, desvio, escore
+
+class AlertaConsumo(models.Model):
+    """ Desvios de eficiência por veículo, recalculados em lote pelo cron e lidos pelo dashboard. """
+    _name = 'controle.combustivel.alerta'
+    _description = 'Alerta de Desvio de Consumo'
+    _order = 'data_hora desc, id desc'
+    _rec_name = 'equipamento_id'
+
+    equipamento_id = fields.Many2one('fleet.vehicle', string='Veículo/Equipamento', required=True, index=True, ondelete='cascade', readonly=True)
+    placa = fields.Char(related='equipamento_id.license_plate', string='Placa')
+    abastecimento_id = fields.Many2one('controle.combustivel.abastecimento', string='Abastecimento', required=True, ondelete='cascade', readonly=True)
+    motorista_id = fields.Many2one(related='abastecimento_id.motorista_id', string='Motorista')
+    data_hora = fields.Datetime(string='Data/Hora', required=True, index=True, readonly=True)
+    company_id = fields.Many2one('res.company', string='Empresa', index=True, readonly=True)
+    tipo = fields.Selection([('consumo', 'Queda de km/L'), ('custo', 'Alta de R$/km')], string='Tipo', required=True, readonly=True)
+    valor = fields.Float(string='Valor', digits=(12, 2), readonly=True)
+    referencia = fields.Float(string='Mediana do Veículo', digits=(12, 2), readonly=True, help='Mediana das leituras anteriores do veículo.')
+    desvio = fields.Float(string='Desvio (%)', digits=(12, 1), readonly=True)
+    escore = fields.Float(string='Escore Robusto', digits=(12, 2), readonly=True)
+
+    @api.model
+    def _carregar_leituras(self, inicio):
+        """ Leituras confirmadas da janela, precedidas das últimas anteriores de cada veículo (base das primeiras),
+        como arrays colunares ordenados por veículo e data, numa única consulta.
+        """
+        self.env['controle.combustivel.abastecimento'].flush_model(['state', 'data_hora', 'equipamento_id', 'consumo_kml', 'custo_km'])
+        self.env.cr.execute("""
+            WITH janela AS (
+                SELECT id, equipamento_id, consumo_kml, custo_km, data_hora, company_id
+                  FROM controle_combustivel_abastecimento
+                 WHERE state = 'confirmado' AND consumo_kml > 0 AND data_hora >= %(inicio)s
+            )
+            SELECT id, equipamento_id, consumo_kml, custo_km, data_hora, company_id, TRUE FROM janela
+            UNION ALL
+            SELECT a.id, a.equipamento_id, a.consumo_kml, a.custo_km, a.data_hora, a.company_id, FALSE
+              FROM (SELECT DISTINCT equipamento_id FROM janela) v
+             CROSS JOIN LATERAL (
+                    SELECT id, equipamento_id, consumo_kml, custo_km, data_hora, company_id
+                      FROM controle_combustivel_abastecimento
+                     WHERE equipamento_id = v.equipamento_id AND state = 'confirmado' AND consumo_kml > 0 AND data_hora < %(inicio)s
+                     ORDER BY data_hora DESC, id DESC
+                     LIMIT %(janela)s
+             ) a
+             ORDER BY 2, 5, 1
+        """, {'inicio': inicio, 'janela': JANELA_BASE})
+        linhas = self.env.cr.fetchall()
+        if not linhas:
+            return None
+        ids, veiculos, consumo, custo, datas, empresas, na_janela = zip(*linhas)
+        return (np.array(ids, dtype=np.int64), np.array(veiculos, dtype=np.int64), np.array(consumo, dtype=float),
+                np.array(custo, dtype=float), datas, empresas, np.array(na_janela, dtype=bool))
+
+    @api.model
+    def detectar(self, dias=None):
+        """ Recalcula todos os alertas da janela (parâmetro controle_combustivel.alerta_dias, padrão 90). """
+        dias = dias or int(self.env['ir.config_parameter'].sudo().get_param('controle_combustivel.alerta_dias', 90))
+        self.search([]).unlink()
+        leituras = self._carregar_leituras(fields.Datetime.now() - timedelta(days=dias))
+        if leituras is None:
+            return self
+        ids, veiculos, consumo, custo, datas, empresas, na_janela = leituras
+        vals_list = []
+        for tipo, valores, sentido in (('consumo', consumo, -1), ('custo', custo, 1)):
+            mascara, mediana, desvio, escore = detectar_desvios(veiculos, valores, sentido)
+            # As leituras anteriores à janela só compõem a base
+            for i in np.flatnonzero(mascara & na_janela):
+                vals_list.append({
+                    'abastecimento_id': int(ids[i]), 'equipamento_id': int(veiculos[i]), 'data_hora': datas[i],
+                    'company_id': empresas[i], 'tipo': tipo,
+                    'valor': float(valores[i]), 'referencia': float(mediana[i]),
+                    'desvio': float(desvio[i]) * 100, 'escore': float(escore[i]),
+                })
+        alertas = self.create(vals_list)
+        self.env['controle.combustivel.dashboard']._invalidar_cache()
+        _logger.info("Detecção de desvios: %s leituras analisadas, %s alertas", int(na_janela.sum()), len(alertas))
+        return alertas
+
+    @api.model
+    def _cron_detectar(self):
+        self.detectar()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from markupsafe import Markup, escape
+from collections import defaultdict
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+class AuditoriaAbastecimento(models.Model):
+    """ Trilha de alterações gravada na transação (modo de auditoria adiada) e publicada no chatter pelo cron.
+
+    O cron trava as linhas pendentes com SKIP LOCKED e as marca como publicadas: uma
+    transação que comita depois de ids maiores já publicados não fica para trás.
+    """
+    _name = 'controle.combustivel.auditoria'
+    _description = 'Auditoria Adiada de Abastecimentos'
+    _order = 'id desc'
+    _log_access = False
+
+    _pendentes_idx = models.Index('(id) WHERE NOT publicado')
+
+    abastecimento_id = fields.Many2one('controle.combustivel.abastecimento', string='Abastecimento', required=True, index=True, ondelete='cascade', readonly=True)
+    usuario_id = fields.Many2one('res.users', string='Usuário', readonly=True)
+    data_hora = fields.Datetime(string='Data/Hora', readonly=True)
+    evento = fields.Selection([('criacao', 'Criação'), ('alteracao', 'Alteração'), ('confirmacao', 'Confirmação')], string='Evento', required=True, readonly=True)
+    valores = fields.Json(string='Valores', readonly=True)
+    publicado = fields.Boolean(string='Publicado', readonly=True)
+
+    @api.model
+    def _registrar(self, linhas):
+        """ Grava [(abastecimento_id, evento, valores)] num único INSERT, sem passar pelo ORM. """
+        if not linhas:
+            return
+        ids, eventos, valores = zip(*linhas)
+        self.env.cr.execute("""
+            INSERT INTO controle_combustivel_auditoria (abastecimento_id, usuario_id, data_hora, evento, valores, publicado)
+            SELECT r.id, %s, NOW() AT TIME ZONE 'UTC', r.evento, r.valores, FALSE
+              FROM unnest(%s::int[], %s::varchar[], %s::jsonb[]) AS r(id, evento, valores)
+        """, [self.env.uid, list(ids), list(eventos), [json.dumps(v, default=str) for v in valores]])
+
+    @api.model
+    def _linha_chatter(self, auditoria, nomes_campos):
+        if auditoria['evento'] == 'confirmacao':
+            texto = escape(_('Confirmado: %.2f L') % auditoria['valores'].get('quantidade_litros', 0.0))
+        elif auditoria['evento'] == 'criacao':
+            texto = escape(_('Abastecimento criado'))
+        else:
+            texto = Markup('<br/>').join(
+                escape('%s: %s → %s' % (nomes_campos.get(campo, campo), antigo, novo))
+                for campo, (antigo, novo) in auditoria['valores'].items())
+        return Markup('<small>%s · %s</small><br/>%s') % (auditoria['usuario'], auditoria['data_hora'], texto)
+
+    @api.model
+    def publicar(self, tamanho_lote=5000, auto_commit=False):
+        """ Converte as entradas pendentes em mensagens do chatter, uma por abastecimento e lote.
+
+        Entradas travadas por outra publicação em andamento são puladas e ficam para a próxima execução.
+        """
+        Abastecimento = self.env['controle.combustivel.abastecimento']
+        nomes_campos = {fname: field.string for fname, field in Abastecimento._fields.items()}
+        publicadas = 0
+        while True:
+            self.env.cr.execute("""
+                SELECT a.id, a.abastecimento_id, a.evento, a.valores, a.data_hora, COALESCE(p.name, '') AS usuario
+                  FROM controle_combustivel_auditoria a
+                  LEFT JOIN res_users u ON u.id = a.usuario_id
+                  LEFT JOIN res_partner p ON p.id = u.partner_id
+                 WHERE NOT a.publicado
+                 ORDER BY a.id
+                 LIMIT %s
+                   FOR UPDATE OF a SKIP LOCKED
+            """, [tamanho_lote])
+            linhas = self.env.cr.dictfetchall()
+            if not linhas:
+                break
+            corpos = defaultdict(list)
+            for linha in linhas:
+                corpos[linha['abastecimento_id']].append(self._linha_chatter(linha, nomes_campos))
+            registros = Abastecimento.browse(corpos).exists()
+            registros._message_log_batch({r.id: Markup('<br/>').join(corpos[r.id]) for r in registros})
+            self.env.cr.execute("UPDATE controle_combustivel_auditoria SET publicado = TRUE WHERE id = ANY(%s)", [[l['id'] for l in linhas]])
+            publicadas += len(linhas)
+            if auto_commit:
+                self.env.cr.commit()
+        if publicadas:
+            _logger.info("Auditoria adiada: %s entradas publicadas no chatter", publicadas)
+        return publicadas
+
+    @api.model
+    def _cron_publicar(self):
+        self.publicar(auto_commit=True)
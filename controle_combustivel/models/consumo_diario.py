@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Campos do abastecimento que alteram a agregação diária
+CAMPOS_CONSUMO = {'state', 'data_hora', 'equipamento_id', 'motorista_id', 'tanque_id', 'company_id',
+                  'quantidade_litros', 'valor_por_litro', 'horimetro_odometro', 'tipo_medicao'}
+
+# Reagregação a partir dos abastecimentos confirmados, ativos e arquivados; {juncao} e {filtro} restringem o recorte
+SQL_AGREGAR = """
+    INSERT INTO controle_combustivel_consumo_diario
+           (data, equipamento_id, motorista_id, tanque_id, company_id,
+            quantidade_litros, total, km_percorrido, quantidade_abastecimentos,
+            create_uid, create_date, write_uid, write_date)
+    SELECT a.data_hora::date, a.equipamento_id, a.motorista_id, a.tanque_id, a.company_id,
+           SUM(a.quantidade_litros), SUM(a.total), SUM(a.km_percorrido), COUNT(*),
+           %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+      FROM controle_combustivel_abastecimento_relatorio a
+      {juncao}
+     WHERE a.state = 'confirmado' {filtro}
+     GROUP BY a.data_hora::date, a.equipamento_id, a.motorista_id, a.tanque_id, a.company_id
+"""
+
+class ConsumoDiario(models.Model):
+    """ Agregação diária dos abastecimentos confirmados (dia x veículo x motorista x tanque). """
+    _name = 'controle.combustivel.consumo.diario'
+    _description = 'Consumo Diário de Combustível'
+    _order = 'data desc, id desc'
+    _rec_name = 'data'
+
+    _chave_uniq = models.UniqueIndex('(data, equipamento_id, COALESCE(motorista_id, 0), tanque_id, COALESCE(company_id, 0))')
+
+    data = fields.Date(string='Data', required=True, index=True, readonly=True)
+    equipamento_id = fields.Many2one('fleet.vehicle', string='Veículo/Equipamento', required=True, index=True, readonly=True, ondelete='cascade')
+    motorista_id = fields.Many2one('res.partner', string='Motorista', index='btree_not_null', readonly=True)
+    tanque_id = fields.Many2one('controle.combustivel.tanque', string='Tanque', required=True, readonly=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', string='Empresa', readonly=True)
+    quantidade_litros = fields.Float(string='Quantidade (L)', readonly=True)
+    total = fields.Float(string='Total (R$)', readonly=True, digits=(12, 2))
+    km_percorrido = fields.Float(string='KM/H Percorrido', readonly=True)
+    quantidade_abastecimentos = fields.Integer(string='Abastecimentos', readonly=True)
+
+    def _flush_abastecimentos(self):
+        self.env['controle.combustivel.abastecimento'].flush_model(list(CAMPOS_CONSUMO) + ['total', 'km_percorrido'])
+
+    @api.model
+    def _atualizar(self, chaves):
+        """ Reagrega só os pares (dia, veículo) afetados, a partir dos abastecimentos confirmados. """
+        if not chaves:
+            return
+        self._flush_abastecimentos()
+        datas, veiculos = zip(*chaves)
+        params = {'datas': list(datas), 'veiculos': list(veiculos), 'uid': self.env.uid}
+        self.env.cr.execute("""
+            DELETE FROM controle_combustivel_consumo_diario r
+             USING unnest(%(datas)s::date[], %(veiculos)s::int[]) AS c(data, equipamento_id)
+             WHERE r.data = c.data AND r.equipamento_id = c.equipamento_id
+        """, params)
+        self.env.cr.execute(SQL_AGREGAR.format(juncao="""
+              JOIN unnest(%(datas)s::date[], %(veiculos)s::int[]) AS c(data, equipamento_id)
+                ON a.equipamento_id = c.equipamento_id
+               AND a.data_hora >= c.data AND a.data_hora < c.data + 1
+        """, filtro=''), params)
+        self.invalidate_model()
+        self.env['controle.combustivel.dashboard']._invalidar_cache()
+
+    @api.model
+    def reconstruir(self, data_inicio=None):
+        """ Refaz a agregação inteira, ou a partir de `data_inicio` (carga retroativa). """
+        self._flush_abastecimentos()
+        params = {'inicio': data_inicio or '1900-01-01', 'uid': self.env.uid}
+        self.env.cr.execute("DELETE FROM controle_combustivel_consumo_diario WHERE data >= %(inicio)s", params)
+        self.env.cr.execute(SQL_AGREGAR.format(juncao='', filtro='AND a.data_hora >= %(inicio)s'), params)
+        _logger.info("Consumo diário reconstruído desde %s: %s linhas", params['inicio'], self.env.cr.rowcount)
+        self.invalidate_model()
+        self.env['controle.combustivel.dashboard']._invalidar_cache()
+
+    @api.model
+    def _cron_reconstruir(self):
+        """ Reagrega a janela recente (parâmetro controle_combustivel.consumo_diario_dias, padrão 7). """
+        dias = int(self.env['ir.config_parameter'].sudo().get_param('controle_combustivel.consumo_diario_dias', 7))
+        self.reconstruir(fields.Date.today() - timedelta(days=dias))
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+
+MESES = {1:'Janeiro', 2:'Fevereiro', 3:'Março', 4:'Abril', 5:'Maio', 6:'Junho', 7:'Julho', 8:'Agosto', 9:'Setembro', 10:'Outubro', 11:'Novembro', 12:'Dezembro'}
+
+class DashboardCombustivel(models.AbstractModel):
+    """ Camada de dados do dashboard: KPIs agregados no banco, em número fixo de consultas. """
+    _name = 'controle.combustivel.dashboard'
+    _description = 'Dados do Dashboard de Combustível'
+
+    def init(self):
+        # Geração dos dados: incrementada a cada commit que altera estoque ou consumo
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS controle_combustivel_dashboard_geracao")
+
+    @api.model
+    def _geracao(self):
+        """ Geração atual dos dados; muda sempre que um commit altera estoque ou consumo. """
+        # O primeiro nextval de uma sequência nova não muda last_value, só is_called
+        self.env.cr.execute("SELECT last_value + is_called::int FROM controle_combustivel_dashboard_geracao")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _invalidar_cache(self):
+        """ Agenda, uma vez por transação, o incremento da geração para depois do commit.
+
+        Incrementar só após o commit evita que um leitor concorrente guarde em
+        cache, sob a geração nova, dados ainda sem a alteração.
+        """
+        postcommit = self.env.cr.postcommit
+        if postcommit.data.get('controle_combustivel.geracao'):
+            return
+        postcommit.data['controle_combustivel.geracao'] = True
+        registry = self.env.registry
+
+        @postcommit.add
+        def incrementar():
+            with registry.cursor() as cr:
+                cr.execute("SELECT nextval('controle_combustivel_dashboard_geracao')")
+
+    @api.model
+    def _tanques(self, hoje):
+        """ Visão multi-tanque: estoque e previsão gravada de todos os tanques das empresas ativas numa única consulta.
+
+        Retorna (tanques, depositos): a projeção por tanque e os totais por depósito.
+        """
+        self.env['controle.combustivel.tanque'].flush_model()
+        self.env.cr.execute("""
+            SELECT t.id, t.name, t.deposito_id, COALESCE(d.name, ''), t.capacidade, t.estoque_atual, t.percentual_nivel,
+                   COALESCE(t.consumo_previsto_dia, 0), t.data_ruptura, COALESCE(t.quantidade_reposicao, 0)
+              FROM controle_combustivel_tanque t
+              LEFT JOIN controle_combustivel_deposito d ON d.id = t.deposito_id
+             WHERE t.active AND t.company_id IN %s
+             ORDER BY d.name NULLS FIRST, t.sequence, t.id
+        """, [tuple(self.env.companies.ids)])
+        tanques, depositos = [], {}
+        for tanque_id, nome, deposito_id, deposito, capacidade, estoque, nivel, consumo_dia, ruptura, reposicao in self.env.cr.fetchall():
+            tanques.append({
+                'id': tanque_id, 'nome': nome, 'deposito': deposito, 'capacidade': capacidade, 'estoque': estoque,
+                'nivel': nivel, 'consumo_dia': consumo_dia, 'reposicao': reposicao,
+                'dias_restantes': max(0, (ruptura - hoje).days) if ruptura else 0,
+            })
+            total = depositos.setdefault(deposito_id or 0, {'deposito': deposito, 'tanques': 0, 'capacidade': 0.0, 'estoque': 0.0, 'consumo_dia': 0.0, 'reposicao': 0.0})
+            total['tanques'] += 1
+            total['capacidade'] += capacidade
+            total['estoque'] += estoque
+            total['consumo_dia'] += consumo_dia
+            total['reposicao'] += reposicao
+        for total in depositos.values():
+            total['nivel'] = total['estoque'] / total['capacidade'] * 100 if total['capacidade'] else 0.0
+            total['dias_restantes'] = int(total['estoque'] / total['consumo_dia']) if total['consumo_dia'] > 0 else 0
+        return tanques, list(depositos.values())
+
+    @api.model
+    def get_dados(self, vehicle_id=0, driver_id=0, hoje=None):
+        """ Retorna os indicadores do mês corrente como valores simples (sem recordsets). """
+        Consumo = self.env['controle.combustivel.consumo.diario']
+        hoje = hoje or fields.Date.today()
+        p_dia = hoje.replace(day=1)
+        u_dia = (p_dia + relativedelta(months=1)) - relativedelta(days=1)
+
+        filtros = []
+        if vehicle_id: filtros.append(('equipamento_id', '=', vehicle_id))
+        if driver_id: filtros.append(('motorista_id', '=', driver_id))
+
+        # Totais e KPIs (agregação diária)
+        [(quantidade, litros, valor, total_km)] = Consumo._read_group(
+            [('data', '>=', p_dia), ('data', '<=', u_dia)] + filtros,
+            aggregates=['quantidade_abastecimentos:sum', 'quantidade_litros:sum', 'total:sum', 'km_percorrido:sum'])
+        quantidade, litros, valor, total_km = quantidade or 0, litros or 0.0, valor or 0.0, total_km or 0.0
+
+        # Alertas de Desvio (calculados em lote pelo cron de detecção), um por veículo
+        alerta_domain = [('tipo', '=', 'consumo'), ('data_hora', '>=', datetime.combine(p_dia, datetime.min.time())),
+                         '|', ('company_id', '=', False), ('company_id', 'in', self.env.companies.ids)]
+        if vehicle_id: alerta_domain.append(('equipamento_id', '=', vehicle_id))
+        if driver_id: alerta_domain.append(('motorista_id', '=', driver_id))
+        veiculos_alerta, vistos = [], set()
+        for alerta in self.env['controle.combustivel.alerta'].search(alerta_domain, order='desvio asc', limit=50):
+            if alerta.equipamento_id in vistos: continue
+            vistos.add(alerta.equipamento_id)
+            veiculos_alerta.append({'veiculo': alerta.equipamento_id.name, 'placa': alerta.placa, 'consumo': alerta.valor, 'media': alerta.referencia})
+            if len(veiculos_alerta) == 3: break
+
+        # Gráfico últimos 7 dias
+        por_dia = dict(Consumo._read_group(
+            [('data', '>=', hoje - relativedelta(days=6)), ('data', '<=', hoje)], ['data:day'], ['quantidade_litros:sum']))
+        # Altura proporcional para o gráfico CSS (seguro)
+        divisor = max(10, (litros / quantidade) * 3) if quantidade else 100
+        consumo_7d = []
+        for i in range(6, -1, -1):
+            dia = hoje - relativedelta(days=i)
+            l_dia = por_dia.get(dia) or 0.0
+            consumo_7d.append({'dia': dia.strftime('%d/%m'), 'litros': l_dia, 'altura': min(100, (l_dia / divisor) * 100)})
+
+        tanques, depositos = self._tanques(hoje)
+
+        return {
+            'consumo_litros': litros,
+            'consumo_valor': valor,
+            'total_abastecimentos': quantidade,
+            'avg_kml': total_km / litros if litros > 0 else 0,
+            'avg_cost_km': valor / total_km if total_km > 0 else 0,
+            'consumo_medio_dia': litros / max(1, hoje.day),
+            'consumo_diario': consumo_7d,
+            'veiculos_alerta': veiculos_alerta,
+            'periodo_mes': f"{MESES[hoje.month]}/{hoje.year}",
+            'tanques': tanques,
+            'depositos': depositos,
+        }
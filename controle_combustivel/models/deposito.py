@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+class DepositoCombustivel(models.Model):
+    """ Depósito (base operacional) que agrupa os tanques de uma empresa. """
+    _name = 'controle.combustivel.deposito'
+    _description = 'Depósito de Combustível'
+    _order = 'name'
+    _check_company_auto = True
+
+    name = fields.Char(string='Nome', required=True)
+    codigo = fields.Char(string='Código')
+    company_id = fields.Many2one('res.company', string='Empresa', required=True, index=True, default=lambda self: self.env.company)
+    tanque_ids = fields.One2many('controle.combustivel.tanque', 'deposito_id', string='Tanques')
+    tanque_padrao_id = fields.Many2one('controle.combustivel.tanque', string='Tanque Padrão', check_company=True,
+                                       domain="[('deposito_id', '=', id)]", help='Tanque usado por padrão nos abastecimentos do depósito.')
+    active = fields.Boolean(default=True)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'company_id', 'tanque_padrao_id', 'active'}.intersection(vals):
+            self.env.registry.clear_cache()
+        if 'name' in vals:
+            # Nome exibido nos totais por depósito do dashboard
+            self.env['controle.combustivel.dashboard']._invalidar_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools.pdf import PdfFileReader, PdfFileWriter
+import csv
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+
+import xlsxwriter
+
+_logger = logging.getLogger(__name__)
+
+# Colunas do livro de abastecimentos (CSV/XLSX), na ordem da consulta
+COLUNAS_LIVRO = ['Número', 'Data/Hora', 'Placa', 'Veículo', 'Motorista', 'Tanque', 'Leitura', 'Tipo de Medição',
+                 'Quantidade (L)', 'Valor por Litro (R$)', 'Total (R$)', 'KM/H Percorrido', 'Consumo (km/L)', 'Custo por KM (R$)', 'Status']
+SQL_LIVRO = """
+    SELECT a.name, a.data_hora, a.placa, v.name, p.name, t.name, a.horimetro_odometro, a.tipo_medicao,
+           a.quantidade_litros, a.valor_por_litro, a.total, a.km_percorrido, a.consumo_kml, a.custo_km, a.state
+      FROM controle_combustivel_abastecimento a
+      LEFT JOIN fleet_vehicle v ON v.id = a.equipamento_id
+      LEFT JOIN res_partner p ON p.id = a.motorista_id
+      LEFT JOIN controle_combustivel_tanque t ON t.id = a.tanque_id
+     WHERE a.id = ANY(%s)
+     ORDER BY a.data_hora, a.id
+"""
+# Linhas trazidas do cursor no servidor por ida ao banco
+LOTE_CURSOR = 2000
+# Bytes lidos por vez ao calcular o checksum e copiar o arquivo para o filestore
+BLOCO_ARQUIVO = 1 << 20
+MIMETYPES = {
+    'pdf': 'application/pdf',
+    'zip': 'application/zip',
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+class ExportacaoAbastecimento(models.Model):
+    """ Exportação em lote de comprovantes e do livro de abastecimentos, processada em segundo plano. """
+    _name = 'controle.combustivel.exportacao'
+    _description = 'Exportação de Abastecimentos'
+    _inherit = ['mail.thread']
+    _order = 'id desc'
+
+    name = fields.Char(string='Descrição', required=True, default=lambda self: _('Exportação de %s', fields.Date.today()))
+    formato = fields.Selection([
+        ('pdf', 'PDF único (comprovantes)'),
+        ('zip', 'ZIP (PDF por lote + anexos)'),
+        ('csv', 'Livro CSV'),
+        ('xlsx', 'Livro XLSX'),
+    ], string='Formato', required=True, default='pdf')
+    abastecimento_ids = fields.Many2many('controle.combustivel.abastecimento', 'controle_combustivel_abastecimento_exportacao_rel',
+                                         'exportacao_id', 'abastecimento_id', string='Abastecimentos')
+    tamanho_lote = fields.Integer(string='Comprovantes por Lote', default=200, required=True)
+    incluir_comprovantes = fields.Boolean(string='Incluir Anexos', default=True, help='Inclui no ZIP os arquivos de comprovante anexados.')
+    state = fields.Selection([
+        ('rascunho', 'Rascunho'), ('pendente', 'Na Fila'), ('processando', 'Processando'),
+        ('concluido', 'Concluído'), ('erro', 'Erro'),
+    ], string='Status', default='rascunho', readonly=True, tracking=True)
+    total = fields.Integer(string='Total', readonly=True)
+    processados = fields.Integer(string='Processados', readonly=True)
+    progresso = fields.Float(string='Progresso (%)', compute='_compute_progresso')
+    anexo_id = fields.Many2one('ir.attachment', string='Arquivo', readonly=True)
+    mensagem_erro = fields.Text(string='Erro', readonly=True)
+
+    @api.depends('total', 'processados')
+    def _compute_progresso(self):
+        for record in self:
+            record.progresso = record.processados * 100.0 / record.total if record.total else 0.0
+
+    def action_iniciar(self):
+        for record in self:
+            if not record.abastecimento_ids:
+                raise UserError(_('Selecione ao menos um abastecimento.'))
+            if record.tamanho_lote <= 0:
+                raise UserError(_('O tamanho do lote deve ser maior que zero.'))
+        self.write({'state': 'pendente', 'total': 0, 'processados': 0, 'mensagem_erro': False, 'anexo_id': False})
+        self.env.ref('controle_combustivel.cron_processar_exportacoes')._trigger()
+        return True
+
+    @api.model
+    def _cron_processar(self):
+        """ Processa a fila, uma exportação por vez, gravando o progresso a cada lote. """
+        vistos = []
+        # Cada job é tentado uma vez por execução, mesmo que não saia de 'pendente'
+        while job := self.search([('state', '=', 'pendente'), ('id', 'not in', vistos)], order='id', limit=1):
+            vistos.append(job.id)
+            job.with_user(job.create_uid)._processar(auto_commit=True)
+
+    def _avancar(self, quantidade, auto_commit):
+        self.processados += quantidade
+        if auto_commit:
+            self.env.cr.commit()
+
+    def _processar(self, auto_commit=False):
+        self.ensure_one()
+        caminho = None
+        # Toda a preparação dentro do try: qualquer falha leva o job a 'erro', nunca o deixa na fila
+        try:
+            self.write({'state': 'processando', 'total': len(self._permitidos()), 'processados': 0})
+            if auto_commit:
+                self.env.cr.commit()
+            descritor, caminho = tempfile.mkstemp(suffix='.' + self.formato)
+            os.close(descritor)
+            getattr(self, '_exportar_' + self.formato)(caminho, auto_commit)
+            anexo = self._anexar(caminho)
+            self.write({'state': 'concluido', 'anexo_id': anexo.id})
+            self.message_post(body=_('Exportação concluída: %s abastecimento(s).', self.total),
+                              attachment_ids=anexo.ids, partner_ids=self.create_uid.partner_id.ids)
+        except Exception as e:
+            if not auto_commit:
+                raise
+            self.env.cr.rollback()
+            _logger.exception("Falha na exportação %s", self.id)
+            # sudo: a falha pode ser justamente o acesso do dono do job
+            self.sudo().write({'state': 'erro', 'mensagem_erro': str(e)})
+        finally:
+            if caminho:
+                os.unlink(caminho)
+        if auto_commit:
+            self.env.cr.commit()
+
+    def _anexar(self, caminho):
+        """ Cria o anexo do arquivo gerado copiando-o em blocos para o filestore, sem carregá-lo na memória. """
+        Attachment = self.env['ir.attachment']
+        valores = {
+            'name': '%s.%s' % (self.name, self.formato),
+            'mimetype': MIMETYPES[self.formato],
+            'res_model': self._name,
+            'res_id': self.id,
+        }
+        if Attachment._storage() != 'file':
+            # Anexos no banco: o conteúdo precisa passar pela memória de qualquer forma
+            with open(caminho, 'rb') as arquivo:
+                return Attachment.create(dict(valores, raw=arquivo.read()))
+        sha = hashlib.sha1()
+        with open(caminho, 'rb') as arquivo:
+            while bloco := arquivo.read(BLOCO_ARQUIVO):
+                sha.update(bloco)
+        checksum = sha.hexdigest()
+        # Mesmo layout de ir.attachment._file_write; o conteúdo idêntico já gravado é reaproveitado
+        store_fname = '%s/%s' % (checksum[:2], checksum)
+        destino = Attachment._full_path(store_fname)
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            shutil.copyfile(caminho, destino)
+            # Se a transação abortar, o coletor do filestore remove o arquivo órfão
+            Attachment._mark_for_gc(store_fname)
+        # create() e write() descartam store_fname, checksum e file_size: o vínculo é gravado direto
+        anexo = Attachment.create(valores)
+        self.env.cr.execute("UPDATE ir_attachment SET store_fname = %s, checksum = %s, file_size = %s WHERE id = %s",
+                            [store_fname, checksum, os.path.getsize(caminho), anexo.id])
+        anexo.invalidate_recordset()
+        return anexo
+
+    def _permitidos(self):
+        """ Ids dos abastecimentos da exportação que o usuário pode ler (regras de registro e de empresa),
+        na ordem do livro. As consultas diretas da exportação partem sempre daqui.
+        """
+        return self.env['controle.combustivel.abastecimento'].search(
+            [('id', 'in', self.sudo().abastecimento_ids.ids)], order='data_hora, id').ids
+
+    def _lotes(self):
+        ids = self._permitidos()
+        for inicio in range(0, len(ids), self.tamanho_lote):
+            yield ids[inicio:inicio + self.tamanho_lote]
+
+    def _renderizar_lote(self, ids):
+        pdf, _tipo = self.env['ir.actions.report']._render_qweb_pdf('controle_combustivel.action_report_abastecimento', res_ids=ids)
+        # Descarta do cache os registros do lote já renderizado
+        self.env['controle.combustivel.abastecimento'].browse(ids).invalidate_recordset()
+        return pdf
+
+    def _exportar_pdf(self, caminho, auto_commit):
+        """ Renderiza em lotes para arquivos temporários e une as páginas no final. """
+        partes = []
+        try:
+            for ids in self._lotes():
+                descritor, parte = tempfile.mkstemp(suffix='.pdf')
+                with os.fdopen(descritor, 'wb') as arquivo:
+                    arquivo.write(self._renderizar_lote(ids))
+                partes.append(parte)
+                self._avancar(len(ids), auto_commit)
+            escritor = PdfFileWriter()
+            leitores = [open(parte, 'rb') for parte in partes]
+            try:
+                for leitor in leitores:
+                    pdf = PdfFileReader(leitor, strict=False)
+                    for pagina in range(pdf.getNumPages()):
+                        escritor.addPage(pdf.getPage(pagina))
+                with open(caminho, 'wb') as saida:
+                    escritor.write(saida)
+            finally:
+                for leitor in leitores:
+                    leitor.close()
+        finally:
+            for parte in partes:
+                os.unlink(parte)
+
+    def _exportar_zip(self, caminho, auto_commit):
+        """ Um PDF por lote gravado direto no ZIP, mais os comprovantes anexados, um de cada vez. """
+        Attachment = self.env['ir.attachment']
+        with zipfile.ZipFile(caminho, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for numero, ids in enumerate(self._lotes(), start=1):
+                zf.writestr('comprovantes_%04d.pdf' % numero, self._renderizar_lote(ids))
+                if self.incluir_comprovantes:
+                    anexos = Attachment.search([
+                        ('res_model', '=', 'controle.combustivel.abastecimento'),
+                        ('res_field', '=', 'comprovante'),
+                        ('res_id', 'in', ids),
+                    ])
+                    nomes = dict(self.env['controle.combustivel.abastecimento'].browse(anexos.mapped('res_id')).mapped(lambda a: (a.id, a.name)))
+                    for anexo in anexos:
+                        destino = 'anexos/%s_%s' % (nomes[anexo.res_id].replace('/', '-'), anexo.name or anexo.id)
+                        if anexo.store_fname:
+                            zf.write(Attachment._full_path(anexo.store_fname), destino)
+                        else:
+                            zf.writestr(destino, anexo.raw)
+                            anexo.invalidate_recordset(['raw', 'datas'])
+                self._avancar(len(ids), auto_commit)
+
+    def _linhas_livro(self, auto_commit):
+        """ Itera o livro em blocos por um cursor no servidor (WITH HOLD sobrevive aos commits de progresso). """
+        self.env['controle.combustivel.abastecimento'].flush_model()
+        self.env.cr.execute("DECLARE exportacao_livro NO SCROLL CURSOR WITH HOLD FOR " + SQL_LIVRO, [self._permitidos()])
+        try:
+            while True:
+                self.env.cr.execute("FETCH %s FROM exportacao_livro", [LOTE_CURSOR])
+                linhas = self.env.cr.fetchall()
+                if not linhas:
+                    break
+                yield linhas
+                self._avancar(len(linhas), auto_commit)
+        finally:
+            self.env.cr.execute("CLOSE exportacao_livro")
+
+    def _exportar_csv(self, caminho, auto_commit):
+        with open(caminho, 'w', newline='', encoding='utf-8-sig') as arquivo:
+            escritor = csv.writer(arquivo, delimiter=';')
+            escritor.writerow(COLUNAS_LIVRO)
+            for linhas in self._linhas_livro(auto_commit):
+                escritor.writerows(linhas)
+
+    def _exportar_xlsx(self, caminho, auto_commit):
+        # constant_memory grava cada linha no disco assim que a próxima começa
+        livro = xlsxwriter.Workbook(caminho, {'constant_memory': True, 'default_date_format': 'dd/mm/yyyy hh:mm'})
+        planilha = livro.add_worksheet('Abastecimentos')
+        planilha.write_row(0, 0, COLUNAS_LIVRO)
+        linha_atual = 1
+        for linhas in self._linhas_livro(auto_commit):
+            for linha in linhas:
+                planilha.write_row(linha_atual, 0, linha)
+                linha_atual += 1
+        livro.close()
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, _
+
+class FleetVehicle(models.Model):
+    _inherit = 'fleet.vehicle'
+
+    deposito_id = fields.Many2one('controle.combustivel.deposito', string='Depósito de Combustível', check_company=True)
+    tanque_padrao_id = fields.Many2one('controle.combustivel.tanque', string='Tanque Padrão', check_company=True,
+                                       help='Tanque sugerido nos abastecimentos do veículo; tem prioridade sobre o depósito.')
+    leitura_combustivel_ids = fields.One2many('controle.combustivel.leitura.veiculo', 'equipamento_id', string='Leituras de Combustível')
+
+    def action_reconstruir_leituras_combustivel(self):
+        """ Recalcula a última leitura e a média de km/L dos veículos a partir dos abastecimentos confirmados. """
+        self.env['controle.combustivel.leitura.veiculo'].sudo().reconstruir(self)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Leituras de Combustível'),
+                'message': _('Leituras de %s veículo(s) reconstruídas.') % len(self),
+                'type': 'success',
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            },
+        }
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Colunas copiadas do abastecimento para o histórico (mesmos nomes nas duas tabelas)
+COLUNAS_HISTORICO = ['name', 'data_hora', 'equipamento_id', 'placa', 'motorista_id', 'usuario_id', 'tanque_id', 'company_id',
+                     'horimetro_odometro', 'tipo_medicao', 'quantidade_litros', 'valor_por_litro', 'total',
+                     'leitura_anterior', 'km_percorrido', 'consumo_kml', 'custo_km', 'chave_externa']
+
+class AbastecimentoHistorico(models.Model):
+    """ Abastecimentos confirmados arquivados: tabela compacta, sem chatter nem recálculos. """
+    _name = 'controle.combustivel.abastecimento.historico'
+    _description = 'Histórico de Abastecimentos'
+    _order = 'data_hora desc, id desc'
+    _log_access = False
+
+    _veiculo_data_idx = models.Index('(equipamento_id, data_hora)')
+    _empresa_chave_externa_uniq = models.UniqueIndex('(company_id, chave_externa) WHERE chave_externa IS NOT NULL')
+
+    origem_id = fields.Integer(string='ID Original', readonly=True, index=True)
+    name = fields.Char(string='Número', readonly=True)
+    data_hora = fields.Datetime(string='Data/Hora', readonly=True, index=True)
+    # 'restrict' como no abastecimento ativo (Many2one obrigatório): o histórico de consumo e custo não
+    # fica órfão; veículos e tanques que saem de operação são arquivados (active=False), não excluídos
+    equipamento_id = fields.Many2one('fleet.vehicle', string='Veículo/Equipamento', readonly=True, ondelete='restrict')
+    placa = fields.Char(string='Placa', readonly=True)
+    motorista_id = fields.Many2one('res.partner', string='Motorista', readonly=True)
+    usuario_id = fields.Many2one('res.users', string='Registrado por', readonly=True)
+    tanque_id = fields.Many2one('controle.combustivel.tanque', string='Tanque', readonly=True, index=True, ondelete='restrict')
+    company_id = fields.Many2one('res.company', string='Empresa', readonly=True)
+    horimetro_odometro = fields.Float(string='Horímetro/Odômetro', readonly=True)
+    tipo_medicao = fields.Selection([('horimetro', 'Horímetro (h)'), ('odometro', 'Odômetro (km)')], string='Tipo de Medição', readonly=True)
+    quantidade_litros = fields.Float(string='Quantidade (L)', readonly=True)
+    valor_por_litro = fields.Float(string='Valor por Litro (R$)', readonly=True, digits=(12, 4))
+    total = fields.Float(string='Total (R$)', readonly=True, digits=(12, 2))
+    leitura_anterior = fields.Float(string='Leitura Anterior', readonly=True)
+    km_percorrido = fields.Float(string='KM/H Percorrido', readonly=True)
+    consumo_kml = fields.Float(string='Consumo (km/L)', readonly=True, digits=(12, 2))
+    custo_km = fields.Float(string='Custo por KM (R$)', readonly=True, digits=(12, 2))
+    chave_externa = fields.Char(string='Chave Externa', readonly=True)
+    comprovante = fields.Binary(string='Comprovante', attachment=True, readonly=True)
+    arquivado_em = fields.Datetime(string='Arquivado em', readonly=True)
+
+    @api.model
+    def _horizonte(self):
+        """ Dias mantidos na tabela ativa (parâmetro controle_combustivel.arquivo_dias, padrão 730; 0 desliga). """
+        return int(self.env['ir.config_parameter'].sudo().get_param('controle_combustivel.arquivo_dias', 730))
+
+    @api.model
+    def arquivar(self, dias=None, tamanho_lote=5000, auto_commit=False):
+        """ Move para o histórico os abastecimentos confirmados mais antigos que `dias`, em lotes.
+
+        Antes de apagar cada lote da tabela ativa: os litros são somados ao estoque inicial
+        do tanque (e retirados das saídas e do razão, com checkpoint novo), e a última leitura
+        de cada veículo vira a leitura base da eficiência. Tanques divergentes do razão
+        ficam de fora até serem reconciliados. Retorna a quantidade arquivada.
+        """
+        dias = self._horizonte() if dias is None else dias
+        if dias <= 0:
+            return 0
+        corte = fields.Datetime.now() - timedelta(days=dias)
+        Tanque = self.env['controle.combustivel.tanque'].with_context(active_test=False)
+        tanques = Tanque.search([])
+        divergentes = tanques._divergencias(tanques._totais_razao()) if tanques else Tanque
+        for tanque in divergentes:
+            _logger.warning("Arquivamento: tanque %s diverge do razão e não será arquivado; execute a reconciliação.", tanque.display_name)
+        validos = tanques - divergentes
+        total = 0
+        while validos:
+            self.env['controle.combustivel.abastecimento'].flush_model()
+            self.env.cr.execute("""
+                SELECT id FROM controle_combustivel_abastecimento
+                 WHERE state = 'confirmado' AND data_hora < %s AND tanque_id IN %s
+                 ORDER BY data_hora, id LIMIT %s
+            """, [corte, tuple(validos.ids), tamanho_lote])
+            ids = [i for i, in self.env.cr.fetchall()]
+            if not ids:
+                break
+            self._arquivar_lote(ids)
+            total += len(ids)
+            if auto_commit:
+                self.env.cr.commit()
+            _logger.info("Arquivamento de abastecimentos: %s movidos para o histórico (corte %s)", total, corte)
+        return total
+
+    @api.model
+    def _arquivar_lote(self, ids):
+        cr, params = self.env.cr, {'ids': tuple(ids), 'agora': fields.Datetime.now()}
+        cr.execute("SELECT DISTINCT tanque_id FROM controle_combustivel_abastecimento WHERE id IN %(ids)s", params)
+        tanques = self.env['controle.combustivel.tanque'].browse([t for t, in cr.fetchall()])
+        tanques._bloquear()
+        totais = tanques._totais_razao()
+
+        colunas = ', '.join(COLUNAS_HISTORICO)
+        cr.execute(f"""
+            INSERT INTO controle_combustivel_abastecimento_historico (origem_id, {colunas}, arquivado_em)
+            SELECT id, {colunas}, %(agora)s FROM controle_combustivel_abastecimento WHERE id IN %(ids)s
+        """, params)
+        # Comprovantes e anexos acompanham o registro
+        cr.execute("""
+            UPDATE ir_attachment a
+               SET res_model = 'controle.combustivel.abastecimento.historico', res_id = h.id
+              FROM controle_combustivel_abastecimento_historico h
+             WHERE a.res_model = 'controle.combustivel.abastecimento' AND a.res_id = h.origem_id AND h.origem_id IN %(ids)s
+        """, params)
+        # Última leitura arquivada por veículo e tipo de medição
+        cr.execute("""
+            INSERT INTO controle_combustivel_leitura_veiculo (equipamento_id, tipo_medicao, leitura_base, data_base,
+                                                              create_uid, create_date, write_uid, write_date)
+            SELECT DISTINCT ON (equipamento_id, tipo_medicao) equipamento_id, tipo_medicao, horimetro_odometro, data_hora,
+                   %(uid)s, %(agora)s, %(uid)s, %(agora)s
+              FROM controle_combustivel_abastecimento
+             WHERE id IN %(ids)s AND tipo_medicao IS NOT NULL
+             ORDER BY equipamento_id, tipo_medicao, data_hora DESC, id DESC
+            ON CONFLICT (equipamento_id, tipo_medicao) DO UPDATE
+               SET leitura_base = EXCLUDED.leitura_base, data_base = EXCLUDED.data_base,
+                   write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+             WHERE controle_combustivel_leitura_veiculo.data_base IS NULL
+                OR EXCLUDED.data_base >= controle_combustivel_leitura_veiculo.data_base
+        """, dict(params, uid=self.env.uid))
+        # Litros arquivados saem das saídas e entram no estoque inicial: o saldo não muda
+        cr.execute("""
+            SELECT tanque_id, SUM(quantidade_litros) FROM controle_combustivel_abastecimento
+             WHERE id IN %(ids)s GROUP BY tanque_id
+        """, params)
+        litros = dict(cr.fetchall())
+        for tanque_id, quantidade in litros.items():
+            cr.execute("""
+                UPDATE controle_combustivel_tanque
+                   SET estoque_manual = COALESCE(estoque_manual, 0) - %s, total_saidas = COALESCE(total_saidas, 0) - %s
+                 WHERE id = %s
+            """, [quantidade, quantidade, tanque_id])
+        cr.execute("DELETE FROM controle_combustivel_movimento WHERE abastecimento_id IN %(ids)s", params)
+        cr.execute("DELETE FROM mail_message WHERE model = 'controle.combustivel.abastecimento' AND res_id IN %(ids)s", params)
+        cr.execute("DELETE FROM mail_followers WHERE res_model = 'controle.combustivel.abastecimento' AND res_id IN %(ids)s", params)
+        cr.execute("DELETE FROM mail_activity WHERE res_model = 'controle.combustivel.abastecimento' AND res_id IN %(ids)s", params)
+        cr.execute("DELETE FROM controle_combustivel_abastecimento WHERE id IN %(ids)s", params)
+
+        self.env.invalidate_all()
+        tanques.modified(['estoque_manual', 'total_saidas'])
+        # O razão restante (até o mesmo último movimento) soma as saídas sem os litros arquivados
+        tanques._criar_checkpoint({t: (e, s - litros.get(t, 0.0), u) for t, (e, s, u) in totais.items()})
+        self.env['controle.combustivel.dashboard']._invalidar_cache()
+
+    @api.model
+    def _cron_arquivar(self):
+        self.sudo().arquivar(auto_commit=True)
+
+class AbastecimentoRelatorio(models.Model):
+    """ Leitura transparente dos abastecimentos confirmados, ativos e arquivados (relatórios de longo prazo). """
+    _name = 'controle.combustivel.abastecimento.relatorio'
+    _description = 'Abastecimentos Confirmados (Ativos e Histórico)'
+    _auto = False
+    _order = 'data_hora desc, id desc'
+
+    origem = fields.Selection([('ativo', 'Ativo'), ('historico', 'Histórico')], string='Origem', readonly=True)
+    registro_id = fields.Integer(string='ID do Registro', readonly=True)
+    name = fields.Char(string='Número', readonly=True)
+    data_hora = fields.Datetime(string='Data/Hora', readonly=True)
+    equipamento_id = fields.Many2one('fleet.vehicle', string='Veículo/Equipamento', readonly=True)
+    placa = fields.Char(string='Placa', readonly=True)
+    motorista_id = fields.Many2one('res.partner', string='Motorista', readonly=True)
+    usuario_id = fields.Many2one('res.users', string='Registrado por', readonly=True)
+    tanque_id = fields.Many2one('controle.combustivel.tanque', string='Tanque', readonly=True)
+    company_id = fields.Many2one('res.company', string='Empresa', readonly=True)
+    horimetro_odometro = fields.Float(string='Horímetro/Odômetro', readonly=True)
+    tipo_medicao = fields.Selection([('horimetro', 'Horímetro (h)'), ('odometro', 'Odômetro (km)')], string='Tipo de Medição', readonly=True)
+    quantidade_litros = fields.Float(string='Quantidade (L)', readonly=True)
+    valor_por_litro = fields.Float(string='Valor por Litro (R$)', readonly=True, digits=(12, 4), aggregator='avg')
+    total = fields.Float(string='Total (R$)', readonly=True, digits=(12, 2))
+    leitura_anterior = fields.Float(string='Leitura Anterior', readonly=True, aggregator=False)
+    km_percorrido = fields.Float(string='KM/H Percorrido', readonly=True)
+    consumo_kml = fields.Float(string='Consumo (km/L)', readonly=True, digits=(12, 2), aggregator='avg')
+    custo_km = fields.Float(string='Custo por KM (R$)', readonly=True, digits=(12, 2), aggregator='avg')
+    chave_externa = fields.Char(string='Chave Externa', readonly=True)
+    state = fields.Selection([('confirmado', 'Confirmado')], string='Status', readonly=True)
+
+    def init(self):
+        # Ids pares para os ativos e ímpares para o histórico: únicos na visão sem colidir
+        colunas = ', '.join(COLUNAS_HISTORICO)
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f"""
+            CREATE VIEW {self._table} AS (
+                SELECT id * 2 AS id, 'ativo' AS origem, id AS registro_id, {colunas}, state
+                  FROM controle_combustivel_abastecimento
+                 WHERE state = 'confirmado'
+                UNION ALL
+                SELECT id * 2 + 1, 'historico', origem_id, {colunas}, 'confirmado'
+                  FROM controle_combustivel_abastecimento_historico
+            )
+        """)
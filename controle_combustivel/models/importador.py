@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from datetime import datetime
+from itertools import islice
+import csv
+import hashlib
+import io
+import logging
+import time
+
+import psycopg2
+import pytz
+
+_logger = logging.getLogger(__name__)
+
+# Coluna do arquivo -> nomes aceitos no cabeçalho
+COLUNAS = {
+    'placa': ('placa', 'license_plate'),
+    'data_hora': ('data_hora', 'data', 'datetime'),
+    'horimetro_odometro': ('horimetro_odometro', 'odometro', 'horimetro', 'leitura'),
+    'quantidade_litros': ('quantidade_litros', 'litros', 'quantidade'),
+    'valor_por_litro': ('valor_por_litro', 'preco', 'valor_litro'),
+    'motorista': ('motorista', 'driver'),
+    'tipo_medicao': ('tipo_medicao',),
+    'tanque': ('tanque',),
+    'chave': ('chave', 'transacao', 'transaction_id', 'id_transacao'),
+}
+FORMATOS_DATA = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%Y-%m-%dT%H:%M:%S')
+
+def normalizar_placa(placa):
+    return ''.join(c for c in (placa or '') if c.isalnum()).upper()
+
+class ImportadorAbastecimento(models.AbstractModel):
+    """ Importação em lote de exportações de bombas e cartões-combustível. """
+    _name = 'controle.combustivel.importador'
+    _description = 'Importador de Abastecimentos'
+
+    # Leitura
+
+    @api.model
+    def _ler_lotes(self, arquivo, tamanho_lote, delimitador=None):
+        """ Gera lotes [(numero_linha, {coluna: valor})] lendo o CSV em streaming.
+
+        O stream continua do chamador: aberto ao final, para ser relido ou reaproveitado.
+        """
+        texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+        try:
+            cabecalho = texto.readline()
+            delimitador = delimitador or (';' if cabecalho.count(';') > cabecalho.count(',') else ',')
+            nomes = [c.strip().lower() for c in next(csv.reader([cabecalho], delimiter=delimitador))]
+            aliases = {alias: coluna for coluna, opcoes in COLUNAS.items() for alias in opcoes}
+            leitor = csv.DictReader(texto, fieldnames=[aliases.get(n, n) for n in nomes], delimiter=delimitador)
+            linhas = enumerate(leitor, start=2)
+            while lote := list(islice(linhas, tamanho_lote)):
+                yield lote
+        finally:
+            # Sem detach, o wrapper fecharia o stream binário ao ser coletado
+            texto.detach()
+
+    # Conversão
+
+    @api.model
+    def _mapas(self):
+        """ Dicionários de resolução montados uma única vez por importação. """
+        Tanque = self.env['controle.combustivel.tanque']
+        veiculos = {}
+        for v in self.env['fleet.vehicle'].search_fetch([('license_plate', '!=', False)], ['license_plate', 'driver_id', 'deposito_id', 'tanque_padrao_id']):
+            veiculos[normalizar_placa(v.license_plate)] = (v.id, v.driver_id.id, Tanque._tanque_padrao(v).id)
+        tanques = {t['name'].strip().lower(): t['id'] for t in Tanque.search_read([], ['name'])}
+        return {
+            'veiculos': veiculos,
+            'tanques': tanques,
+            'motoristas': {},
+            'tz': pytz.timezone(self.env.user.tz or 'UTC'),
+        }
+
+    @api.model
+    def _carregar_motoristas(self, linhas, mapas):
+        """ Resolve de uma vez os nomes de motorista do lote ainda não conhecidos. """
+        cache = mapas['motoristas']
+        nomes = {(l.get('motorista') or '').strip() for _n, l in linhas} - {''}
+        faltantes = [n for n in nomes if n.lower() not in cache]
+        if faltantes:
+            for parceiro in self.env['res.partner'].search_read([('name', 'in', faltantes), ('is_company', '=', False)], ['name']):
+                cache.setdefault(parceiro['name'].lower(), parceiro['id'])
+            for nome in faltantes:
+                cache.setdefault(nome.lower(), False)
+
+    @api.model
+    def _numero(self, valor, campo):
+        valor = (valor or '').strip()
+        if ',' in valor:
+            valor = valor.replace('.', '').replace(',', '.')
+        try:
+            return float(valor)
+        except ValueError:
+            raise UserError(_('Valor inválido em %(campo)s: "%(valor)s"', campo=campo, valor=valor))
+
+    @api.model
+    def _data_hora(self, valor, tz):
+        valor = (valor or '').strip()
+        for formato in FORMATOS_DATA:
+            try:
+                local = datetime.strptime(valor, formato)
+            except ValueError:
+                continue
+            return tz.localize(local).astimezone(pytz.utc).replace(tzinfo=None)
+        raise UserError(_('Data/hora inválida: "%s"', valor))
+
+    @api.model
+    def _valores(self, linha, mapas):
+        """ Converte uma linha em valores de create(), levantando UserError com a causa. """
+        placa = normalizar_placa(linha.get('placa'))
+        if placa not in mapas['veiculos']:
+            raise UserError(_('Placa não cadastrada na frota: "%s"', linha.get('placa') or ''))
+        veiculo_id, motorista_padrao, tanque_padrao = mapas['veiculos'][placa]
+        data_hora = self._data_hora(linha.get('data_hora'), mapas['tz'])
+        leitura = self._numero(linha.get('horimetro_odometro'), 'horimetro_odometro')
+        litros = self._numero(linha.get('quantidade_litros'), 'quantidade_litros')
+        valores = {
+            'equipamento_id': veiculo_id,
+            'data_hora': data_hora,
+            'horimetro_odometro': leitura,
+            'quantidade_litros': litros,
+            'valor_por_litro': self._numero(linha.get('valor_por_litro'), 'valor_por_litro'),
+            'motorista_id': motorista_padrao,
+            'tanque_id': tanque_padrao,
+        }
+        motorista = (linha.get('motorista') or '').strip()
+        if motorista:
+            if not mapas['motoristas'].get(motorista.lower()):
+                raise UserError(_('Motorista não encontrado: "%s"', motorista))
+            valores['motorista_id'] = mapas['motoristas'][motorista.lower()]
+        tanque = (linha.get('tanque') or '').strip()
+        if tanque:
+            if tanque.lower() not in mapas['tanques']:
+                raise UserError(_('Tanque não encontrado: "%s"', tanque))
+            valores['tanque_id'] = mapas['tanques'][tanque.lower()]
+        tipo = (linha.get('tipo_medicao') or '').strip().lower()
+        if tipo:
+            if tipo not in ('horimetro', 'odometro'):
+                raise UserError(_('Tipo de medição inválido: "%s"', tipo))
+            valores['tipo_medicao'] = tipo
+        # Chave de idempotência: id da transação ou impressão digital da linha
+        chave = (linha.get('chave') or '').strip()
+        valores['chave_externa'] = chave or 'csv:' + hashlib.sha1(
+            f"{placa}|{data_hora.isoformat()}|{leitura:.2f}|{litros:.3f}".encode()).hexdigest()
+        return valores
+
+    # Gravação
+
+    @api.model
+    def _gravar_lote(self, linhas, confirmar=True):
+        """ Cria (e confirma) um lote de valores já convertidos.
+
+        `linhas` é [(numero_linha, valores)]. Ignora chaves já importadas e,
+        se o lote falhar, reprocessa linha a linha para isolar os erros.
+        Retorna (registros, duplicados, erros).
+        """
+        # Importações usam a auditoria adiada, salvo pedido explícito em contrário
+        Abastecimento = self.env['controle.combustivel.abastecimento'].with_context(
+            auditoria_adiada=self.env.context.get('auditoria_adiada', True))
+        # Mesmo escopo da restrição única (empresa, chave), sem as regras de registro do chamador:
+        # uma chave que ele não enxerga ainda é duplicada, e não uma violação no insert
+        dominio = [('company_id', '=', self.env.company.id), ('chave_externa', 'in', [v['chave_externa'] for _n, v in linhas])]
+        existentes = set(Abastecimento.sudo().with_context(active_test=False).search_fetch(
+            dominio, ['chave_externa']).mapped('chave_externa'))
+        # Chaves já arquivadas também contam como importadas
+        existentes.update(self.env['controle.combustivel.abastecimento.historico'].sudo().search_fetch(
+            dominio, ['chave_externa']).mapped('chave_externa'))
+        novos, duplicados = [], 0
+        for numero, valores in linhas:
+            if valores['chave_externa'] in existentes:
+                duplicados += 1
+                continue
+            existentes.add(valores['chave_externa'])
+            novos.append((numero, valores))
+        if not novos:
+            return Abastecimento, duplicados, []
+
+        for (_n, valores), nome in zip(novos, Abastecimento._reservar_nomes(len(novos))):
+            valores['name'] = nome
+        try:
+            with self.env.cr.savepoint():
+                registros = Abastecimento.create([v for _n, v in novos])
+                if confirmar:
+                    registros.action_confirmar()
+            return registros, duplicados, []
+        except (UserError, psycopg2.Error):
+            self.env.clear()
+
+        registros, erros = Abastecimento, []
+        for numero, valores in novos:
+            try:
+                with self.env.cr.savepoint():
+                    registro = Abastecimento.create(valores)
+                    if confirmar:
+                        registro.action_confirmar()
+                registros |= registro
+            except (UserError, psycopg2.Error) as e:
+                self.env.clear()
+                erros.append((numero, str(e)))
+        return registros, duplicados, erros
+
+    @api.model
+    def importar_csv(self, arquivo, tamanho_lote=500, confirmar=True, delimitador=None, auto_commit=False):
+        """ Importa um CSV (stream binário) em lotes de `tamanho_lote` linhas.
+
+        Retorna um resumo {'linhas', 'criados', 'duplicados', 'erros': [(linha, mensagem)], 'segundos'}.
+        Com `auto_commit`, grava cada lote ao final (uso via linha de comando).
+        """
+        if tamanho_lote <= 0:
+            raise UserError(_('O tamanho do lote deve ser maior que zero.'))
+        inicio = time.perf_counter()
+        mapas = self._mapas()
+        resumo = {'linhas': 0, 'criados': 0, 'duplicados': 0, 'erros': []}
+        for lote in self._ler_lotes(arquivo, tamanho_lote, delimitador):
+            resumo['linhas'] += len(lote)
+            self._carregar_motoristas(lote, mapas)
+            convertidas = []
+            for numero, linha in lote:
+                try:
+                    convertidas.append((numero, self._valores(linha, mapas)))
+                except UserError as e:
+                    resumo['erros'].append((numero, str(e)))
+            registros, duplicados, erros = self._gravar_lote(convertidas, confirmar=confirmar)
+            resumo['criados'] += len(registros)
+            resumo['duplicados'] += duplicados
+            resumo['erros'] += erros
+            if auto_commit:
+                self.env.cr.commit()
+            _logger.info("Importação de abastecimentos: %s linhas lidas, %s criadas, %s duplicadas, %s erros",
+                         resumo['linhas'], resumo['criados'], resumo['duplicados'], len(resumo['erros']))
+        resumo['segundos'] = time.perf_counter() - inicio
+        return resumo
+
+    @api.model
+    def importar_arquivo(self, caminho, **kwargs):
+        """ Ponto de entrada para o shell: env['controle.combustivel.importador'].importar_arquivo('/caminho.csv'). """
+        with open(caminho, 'rb') as arquivo:
+            return self.importar_csv(arquivo, **kwargs)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Peso da leitura mais recente na média móvel exponencial de km/L
+ALFA_CONSUMO = 0.2
+
+def media_movel(media, valor, alfa=ALFA_CONSUMO):
+    return alfa * valor + (1 - alfa) * media if media else valor
+
+class LeituraVeiculo(models.Model):
+    """ Estado de leitura de cada veículo e tipo de medição, mantido na confirmação e no cancelamento.
+
+    Guarda a última leitura confirmada (e a última arquivada, base da eficiência depois do
+    arquivamento) e a média móvel de km/L: validação do odômetro e leitura anterior em O(1).
+    """
+    _name = 'controle.combustivel.leitura.veiculo'
+    _description = 'Leitura do Veículo'
+    _order = 'equipamento_id, tipo_medicao'
+    _rec_name = 'equipamento_id'
+
+    _veiculo_tipo_uniq = models.UniqueIndex('(equipamento_id, tipo_medicao)')
+
+    equipamento_id = fields.Many2one('fleet.vehicle', string='Veículo/Equipamento', required=True, ondelete='cascade', readonly=True)
+    tipo_medicao = fields.Selection([('horimetro', 'Horímetro (h)'), ('odometro', 'Odômetro (km)')], string='Tipo de Medição', required=True, readonly=True)
+    ultima_leitura = fields.Float(string='Última Leitura', readonly=True)
+    ultima_data = fields.Datetime(string='Último Abastecimento', readonly=True)
+    ultimo_abastecimento_id = fields.Many2one('controle.combustivel.abastecimento', string='Abastecimento', readonly=True, ondelete='set null')
+    consumo_medio = fields.Float(string='Consumo Médio (km/L)', readonly=True, digits=(12, 2), help='Média móvel exponencial do km/L das leituras confirmadas.')
+    leitura_base = fields.Float(string='Última Leitura Arquivada', readonly=True)
+    data_base = fields.Datetime(string='Data da Leitura Arquivada', readonly=True)
+
+    def _posterior(self, abastecimento):
+        """ Se o abastecimento vem depois da última leitura registrada (sem estado conhecido: não). """
+        return bool(self.ultima_data) and (abastecimento.data_hora, abastecimento._origin.id or 0) > (self.ultima_data, self.ultimo_abastecimento_id.id or 0)
+
+    @api.model
+    def _estados(self, abastecimentos):
+        """ Estados dos pares (veículo, tipo de medição) dos abastecimentos: {(veiculo_id, tipo): estado}. """
+        if not abastecimentos.equipamento_id:
+            return {}
+        estados = self.search_fetch([('equipamento_id', 'in', abastecimentos.equipamento_id.ids)],
+                                    ['equipamento_id', 'tipo_medicao', 'ultima_leitura', 'ultima_data', 'ultimo_abastecimento_id', 'consumo_medio'])
+        return {(e.equipamento_id.id, e.tipo_medicao): e for e in estados}
+
+    @api.model
+    def _cadeias(self, abastecimentos):
+        """ Abastecimentos agrupados por par e ordenados no tempo: [(chave, estado, registros)]. """
+        estados = self._estados(abastecimentos)
+        return [(chave, estados.get(chave, self), registros.sorted(lambda r: (r.data_hora, r.id)))
+                for chave, registros in abastecimentos.filtered('tipo_medicao').grouped(lambda r: (r.equipamento_id.id, r.tipo_medicao)).items()]
+
+    @api.model
+    def _anteriores(self, abastecimentos):
+        """ Leitura anterior dos abastecimentos que seguem a última leitura do veículo, sem varrer o histórico.
+
+        Retorna ({id: leitura_anterior}, restantes): os demais (retroativos, sem estado) vão para a busca completa.
+        """
+        anteriores, restantes = {}, abastecimentos.browse()
+        for _chave, estado, registros in self._cadeias(abastecimentos):
+            if not estado._posterior(registros[0]):
+                restantes |= registros
+                continue
+            anterior = estado.ultima_leitura
+            for registro in registros:
+                anteriores[registro._origin.id] = anterior
+                anterior = registro.horimetro_odometro
+        return anteriores, restantes | abastecimentos.filtered(lambda r: not r.tipo_medicao)
+
+    @api.model
+    def _leituras_invalidas(self, abastecimentos):
+        """ Abastecimentos cuja leitura quebra a sequência do veículo: [(registro, operador, referência)].
+
+        Posteriores à última leitura são conferidos com o estado (e com o próprio lote), em O(1);
+        retroativos e veículos sem estado, com as leituras vizinhas (LAG/LEAD) dos confirmados.
+        """
+        invalidos, retroativos = [], abastecimentos.browse()
+        for _chave, estado, registros in self._cadeias(abastecimentos):
+            if not estado._posterior(registros[0]):
+                retroativos |= registros
+                continue
+            anterior = estado.ultima_leitura
+            for registro in registros:
+                if registro.horimetro_odometro < anterior:
+                    invalidos.append((registro, '<', anterior))
+                anterior = registro.horimetro_odometro
+        vizinhos = retroativos._vizinhos_leitura() if retroativos else {}
+        for registro in retroativos:
+            anterior, seguinte = vizinhos.get(registro._origin.id, (None, None))
+            if anterior is not None and registro.horimetro_odometro < anterior:
+                invalidos.append((registro, '<', anterior))
+            elif seguinte is not None and registro.horimetro_odometro > seguinte:
+                invalidos.append((registro, '>', seguinte))
+        return invalidos
+
+    @api.model
+    def _atualizar(self, abastecimentos):
+        """ Avança o estado com abastecimentos recém-confirmados, em O(1) por registro.
+
+        Confirmações retroativas (anteriores à última leitura) ou pares sem estado reconstroem o veículo.
+        """
+        confirmados = abastecimentos.filtered(lambda r: r.state == 'confirmado')
+        if not confirmados:
+            return
+        reconstruir, linhas = set(), []
+        for (veiculo_id, _tipo), estado, registros in self._cadeias(confirmados):
+            if not estado._posterior(registros[0]):
+                reconstruir.add(veiculo_id)
+                continue
+            media = estado.consumo_medio
+            for registro in registros:
+                if registro.consumo_kml > 0:
+                    media = media_movel(media, registro.consumo_kml)
+            ultimo = registros[-1]
+            linhas.append((estado.id, ultimo.horimetro_odometro, ultimo.data_hora, ultimo.id, media))
+        if linhas:
+            # Uma única escrita para todos os veículos do lote
+            self.flush_model()
+            ids, leituras, datas, abastecimentos_ids, medias = zip(*linhas)
+            self.env.cr.execute("""
+                UPDATE controle_combustivel_leitura_veiculo l
+                   SET ultima_leitura = u.leitura, ultima_data = u.data, ultimo_abastecimento_id = u.abastecimento_id,
+                       consumo_medio = u.media, write_uid = %(uid)s, write_date = NOW() AT TIME ZONE 'UTC'
+                  FROM unnest(%(ids)s::int[], %(leituras)s::float8[], %(datas)s::timestamp[], %(abastecimentos)s::int[], %(medias)s::float8[])
+                       AS u(id, leitura, data, abastecimento_id, media)
+                 WHERE l.id = u.id
+            """, {'ids': list(ids), 'leituras': list(leituras), 'datas': list(datas), 'abastecimentos': list(abastecimentos_ids),
+                  'medias': list(medias), 'uid': self.env.uid})
+            self.browse(ids).invalidate_recordset()
+        if reconstruir:
+            self.reconstruir(self.env['fleet.vehicle'].browse(reconstruir))
+
+    @api.model
+    def reconstruir(self, veiculos=None):
+        """ Recalcula o estado dos veículos (todos, sem `veiculos`) a partir dos abastecimentos confirmados.
+
+        Para cargas retroativas e correções: env['controle.combustivel.leitura.veiculo'].reconstruir()
+        """
+        self.env['controle.combustivel.abastecimento'].flush_model(['state', 'equipamento_id', 'tipo_medicao', 'data_hora', 'horimetro_odometro', 'consumo_kml'])
+        self.flush_model()
+        if veiculos is not None and not veiculos:
+            return
+        filtro, params = ('AND equipamento_id IN %(veiculos)s', {'veiculos': tuple(veiculos.ids)}) if veiculos is not None else ('', {})
+        cr = self.env.cr
+        # Média móvel na ordem das leituras, em streaming
+        medias = {}
+        cr.execute(f"""
+            SELECT equipamento_id, tipo_medicao, consumo_kml FROM controle_combustivel_abastecimento
+             WHERE state = 'confirmado' AND consumo_kml > 0 AND tipo_medicao IS NOT NULL {filtro}
+             ORDER BY equipamento_id, tipo_medicao, data_hora, id
+        """, params)
+        while linhas := cr.fetchmany(10000):
+            for veiculo_id, tipo, consumo in linhas:
+                medias[veiculo_id, tipo] = media_movel(medias.get((veiculo_id, tipo), 0.0), consumo)
+        cr.execute(f"""
+            SELECT DISTINCT ON (equipamento_id, tipo_medicao) equipamento_id, tipo_medicao, horimetro_odometro, data_hora, id
+              FROM controle_combustivel_abastecimento
+             WHERE state = 'confirmado' AND tipo_medicao IS NOT NULL {filtro}
+             ORDER BY equipamento_id, tipo_medicao, data_hora DESC, id DESC
+        """, params)
+        ultimas = cr.fetchall()
+        # Sem abastecimento ativo: a última leitura é a arquivada (se houver)
+        cr.execute(f"""
+            UPDATE controle_combustivel_leitura_veiculo
+               SET ultima_leitura = leitura_base, ultima_data = data_base, ultimo_abastecimento_id = NULL, consumo_medio = 0
+             WHERE TRUE {filtro}
+        """, params)
+        if ultimas:
+            veiculos_ids, tipos, leituras, datas, ids = zip(*ultimas)
+            cr.execute("""
+                INSERT INTO controle_combustivel_leitura_veiculo
+                       (equipamento_id, tipo_medicao, ultima_leitura, ultima_data, ultimo_abastecimento_id, consumo_medio,
+                        create_uid, create_date, write_uid, write_date)
+                SELECT u.*, %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+                  FROM unnest(%(veiculos)s::int[], %(tipos)s::varchar[], %(leituras)s::float8[], %(datas)s::timestamp[],
+                              %(ids)s::int[], %(medias)s::float8[]) AS u
+                ON CONFLICT (equipamento_id, tipo_medicao) DO UPDATE
+                   SET ultima_leitura = EXCLUDED.ultima_leitura, ultima_data = EXCLUDED.ultima_data,
+                       ultimo_abastecimento_id = EXCLUDED.ultimo_abastecimento_id, consumo_medio = EXCLUDED.consumo_medio,
+                       write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+            """, {
+                'veiculos': list(veiculos_ids), 'tipos': list(tipos), 'leituras': list(leituras), 'datas': list(datas), 'ids': list(ids),
+                'medias': [medias.get((v, t), 0.0) for v, t in zip(veiculos_ids, tipos)], 'uid': self.env.uid,
+            })
+        self.invalidate_model()
+        _logger.info("Leituras de veículos reconstruídas: %s pares com abastecimentos ativos", len(ultimas))
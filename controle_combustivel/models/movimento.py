@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.tools import float_is_zero
+from collections import defaultdict
+
+# Campos dos documentos que alteram o efeito no estoque
+CAMPOS_ESTOQUE = {'state', 'tanque_id', 'quantidade_litros'}
+
+class MovimentoCombustivel(models.Model):
+    """ Razão de estoque: um delta assinado por confirmação, estorno ou ajuste de documento. """
+    _name = 'controle.combustivel.movimento'
+    _description = 'Movimentação de Estoque de Combustível'
+    _order = 'id desc'
+
+    tanque_id = fields.Many2one('controle.combustivel.tanque', string='Tanque', required=True, index=True, ondelete='cascade', readonly=True)
+    data_hora = fields.Datetime(string='Data/Hora', required=True, default=fields.Datetime.now, readonly=True)
+    tipo = fields.Selection([('entrada', 'Entrada'), ('saida', 'Saída')], string='Tipo', required=True, readonly=True)
+    quantidade = fields.Float(string='Quantidade (L)', required=True, readonly=True, help='Positivo soma ao total do tipo; negativo é estorno.')
+    abastecimento_id = fields.Many2one('controle.combustivel.abastecimento', string='Abastecimento', index='btree_not_null', ondelete='set null', readonly=True)
+    entrada_id = fields.Many2one('controle.combustivel.entrada', string='Entrada', index='btree_not_null', ondelete='set null', readonly=True)
+
+    @api.model
+    def _efeito(self, documentos):
+        """ Litros efetivos de cada documento no estoque: {id: (tanque_id, litros)}. """
+        return {d.id: (d.tanque_id.id, d.quantidade_litros) for d in documentos if d.state == 'confirmado'}
+
+    @api.model
+    def _registrar_documentos(self, documentos, antes, tipo):
+        """ Lança a diferença entre o efeito anterior (`antes`) e o atual de cada documento. """
+        campo = 'abastecimento_id' if tipo == 'saida' else 'entrada_id'
+        depois = self._efeito(documentos)
+        vals_list = []
+        for doc in documentos:
+            antigo, novo = antes.get(doc.id), depois.get(doc.id)
+            if antigo == novo: continue
+            for efeito, sinal in ((antigo, -1), (novo, 1)):
+                if efeito:
+                    tanque_id, litros = efeito
+                    vals_list.append({'tanque_id': tanque_id, 'tipo': tipo, 'quantidade': sinal * litros, campo: doc.id, 'data_hora': doc.data_hora})
+        return self._registrar(vals_list)
+
+    @api.model
+    def _registrar(self, vals_list):
+        vals_list = [v for v in vals_list if not float_is_zero(v['quantidade'], precision_digits=4)]
+        if not vals_list:
+            return self.browse()
+        movimentos = self.sudo().create(vals_list)
+        deltas = defaultdict(lambda: {'entrada': 0.0, 'saida': 0.0, 'data_hora': False})
+        for vals in vals_list:
+            delta = deltas[vals['tanque_id']]
+            delta[vals['tipo']] += vals['quantidade']
+            delta['data_hora'] = max(delta['data_hora'] or vals['data_hora'], vals['data_hora'])
+        self.env['controle.combustivel.tanque'].browse(deltas)._aplicar_movimentos(deltas)
+        self.env['controle.combustivel.dashboard']._invalidar_cache()
+        return movimentos
+
+class CheckpointTanque(models.Model):
+    """ Fotografia periódica dos totais do tanque, base para conferir o razão sem relê-lo inteiro. """
+    _name = 'controle.combustivel.tanque.checkpoint'
+    _description = 'Checkpoint de Estoque do Tanque'
+    _order = 'id desc'
+
+    tanque_id = fields.Many2one('controle.combustivel.tanque', string='Tanque', required=True, index=True, ondelete='cascade')
+    data_hora = fields.Datetime(string='Data/Hora', required=True, default=fields.Datetime.now)
+    ultimo_movimento_id = fields.Integer(string='Último Movimento', help='Maior id do razão incluído nos totais.')
+    total_entradas = fields.Float(string='Total Entradas (L)')
+    total_saidas = fields.Float(string='Total Saídas (L)')
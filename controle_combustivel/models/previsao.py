@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# Suavização do nível e da sazonalidade semanal
+ALFA = 0.3
+GAMA = 0.2
+PERIODO = 7
+
+def suavizar_sazonal(series, inicio, alfa=ALFA, gama=GAMA):
+    """ Suavização exponencial com sazonalidade semanal aditiva, vetorizada sobre as linhas (tanques).
+
+    `series` é (tanques x dias) com o consumo diário, o dia 0 numa segunda-feira;
+    `inicio` é o primeiro dia com histórico de cada tanque (dias anteriores são ignorados).
+    Retorna (nivel, sazonal): o nível final por tanque e o ajuste por dia da semana (tanques x 7).
+    """
+    tanques, dias = series.shape
+    ativo = np.arange(dias)[None, :] >= inicio[:, None]
+    observados = np.maximum(ativo.sum(axis=1), 1)
+    nivel = np.where(ativo, series, 0.0).sum(axis=1) / observados
+    # Média de cada dia da semana sobre o histórico ativo, menos o nível
+    semana = np.arange(dias) % PERIODO
+    soma = np.zeros((tanques, PERIODO))
+    contagem = np.zeros((tanques, PERIODO))
+    for dia in range(PERIODO):
+        coluna = ativo & (semana == dia)[None, :]
+        soma[:, dia] = np.where(coluna, series, 0.0).sum(axis=1)
+        contagem[:, dia] = coluna.sum(axis=1)
+    sazonal = np.where(contagem > 0, soma / np.maximum(contagem, 1) - nivel[:, None], 0.0)
+
+    for t in range(dias):
+        dia = t % PERIODO
+        y, s, a = series[:, t], sazonal[:, dia], ativo[:, t]
+        novo_nivel = alfa * (y - s) + (1 - alfa) * nivel
+        sazonal[:, dia] = np.where(a, gama * (y - novo_nivel) + (1 - gama) * s, s)
+        nivel = np.where(a, novo_nivel, nivel)
+    return nivel, sazonal
+
+def prever(nivel, sazonal, primeiro_dia, horizonte):
+    """ Consumo previsto (tanques x horizonte) a partir do dia da semana `primeiro_dia` (0 = segunda). """
+    semana = (primeiro_dia + np.arange(horizonte)) % PERIODO
+    return np.maximum(nivel[:, None] + sazonal[:, semana], 0.0)
+
+def projetar_ruptura(estoque, previsao):
+    """ Índice do dia em que o consumo acumulado esgota o estoque (-1 se não esgota no horizonte). """
+    esgota = np.cumsum(previsao, axis=1) >= estoque[:, None]
+    return np.where(esgota.any(axis=1), esgota.argmax(axis=1), -1)
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields
+
+class ResUsers(models.Model):
+    _inherit = 'res.users'
+
+    deposito_combustivel_id = fields.Many2one('controle.combustivel.deposito', string='Depósito de Combustível',
+                                              help='Depósito usado para sugerir o tanque nos abastecimentos registrados pelo usuário.')
@@ -2,28 +2,107 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
+from .movimento import CAMPOS_ESTOQUE
+from odoo.tools import float_compare, ormcache
+from .previsao import suavizar_sazonal, prever, projetar_ruptura
+from datetime import timedelta
+import logging
+
+import numpy as np
+
+_logger = logging.getLogger(__name__)
+
+# Campos que mudam a resolução do tanque padrão (cache em _tanque_padrao_id)
+CAMPOS_RESOLUCAO = {'company_id', 'deposito_id', 'sequence', 'active'}
+# Campos do tanque exibidos no dashboard (além dos totais do razão e da previsão, que já invalidam o cache)
+CAMPOS_DASHBOARD = CAMPOS_RESOLUCAO | {'name', 'capacidade', 'estoque_manual', 'prazo_reposicao', 'dias_cobertura'}
+# Dias à frente cobertos pela projeção de estoque
+HORIZONTE_PREVISAO = 180
 
 class TanqueCombustivel(models.Model):
-    """ Gerenciamento do tanque de combustível (6.000 L). """
+    """ Gerenciamento dos tanques de combustível, por empresa e depósito. """
     _name = 'controle.combustivel.tanque'
     _description = 'Tanque de Combustível'
     _rec_name = 'name'
+    _order = 'sequence, id'
+    _check_company_auto = True
 
     name = fields.Char(string='Nome', required=True, default='Tanque Principal')
-    capacidade = fields.Float(string='Capacidade (L)', default=6000.0, readonly=True)
+    sequence = fields.Integer(string='Sequência', default=10)
+    company_id = fields.Many2one('res.company', string='Empresa', required=True, index=True, default=lambda self: self.env.company)
+    deposito_id = fields.Many2one('controle.combustivel.deposito', string='Depósito', index='btree_not_null', check_company=True)
+    capacidade = fields.Float(string='Capacidade (L)', default=6000.0)
     estoque_atual = fields.Float(string='Estoque Atual (L)', compute='_compute_estoque_atual', store=True)
     estoque_manual = fields.Float(string='Estoque Inicial', default=0.0)
     percentual_nivel = fields.Float(string='Nível (%)', compute='_compute_percentual_nivel', store=True)
     cor_indicador = fields.Char(string='Cor', compute='_compute_cor_indicador')
     status_nivel = fields.Selection([('critico', 'Crítico'), ('atencao', 'Atenção'), ('normal', 'Normal')], string='Status', compute='_compute_cor_indicador')
     
-    total_entradas = fields.Float(string='Total Entradas (L)', compute='_compute_movimentacoes', store=True)
-    total_saidas = fields.Float(string='Total Saídas (L)', compute='_compute_movimentacoes', store=True)
+    # Totais acumulados incrementalmente pelo razão (controle.combustivel.movimento)
+    total_entradas = fields.Float(string='Total Entradas (L)', readonly=True)
+    total_saidas = fields.Float(string='Total Saídas (L)', readonly=True)
+    ultima_entrada = fields.Datetime(string='Última Entrada', readonly=True)
+    ultima_saida = fields.Datetime(string='Última Saída', readonly=True)
+    
+    # Previsão de consumo e reposição (gravadas pelo cron de previsão)
+    prazo_reposicao = fields.Integer(string='Prazo de Entrega (dias)', default=3)
+    dias_cobertura = fields.Integer(string='Cobertura da Compra (dias)', default=15, help='Dias de consumo que cada reposição sugerida deve cobrir.')
+    consumo_previsto_dia = fields.Float(string='Consumo Previsto (L/dia)', readonly=True, help='Média prevista para os próximos 7 dias.')
+    data_ruptura = fields.Date(string='Previsão de Esgotamento', readonly=True)
+    data_pedido = fields.Date(string='Pedir Até', readonly=True)
+    quantidade_reposicao = fields.Float(string='Reposição Sugerida (L)', readonly=True)
+    data_previsao = fields.Datetime(string='Previsão Calculada em', readonly=True)
+    dias_restantes = fields.Integer(string='Dias Restantes', compute='_compute_dias_restantes')
     
     abastecimento_ids = fields.One2many('controle.combustivel.abastecimento', 'tanque_id', string='Abastecimentos')
     entrada_ids = fields.One2many('controle.combustivel.entrada', 'tanque_id', string='Entradas')
+    movimento_ids = fields.One2many('controle.combustivel.movimento', 'tanque_id', string='Movimentações')
     active = fields.Boolean(default=True)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        self.env['controle.combustivel.dashboard']._invalidar_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if CAMPOS_RESOLUCAO.intersection(vals):
+            self.env.registry.clear_cache()
+        if CAMPOS_DASHBOARD.intersection(vals):
+            self.env['controle.combustivel.dashboard']._invalidar_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        self.env['controle.combustivel.dashboard']._invalidar_cache()
+        return res
+
+    @api.model
+    @ormcache('company_id', 'deposito_id')
+    def _tanque_padrao_id(self, company_id, deposito_id):
+        """ Tanque padrão de (empresa, depósito): o definido no depósito, senão o primeiro do depósito, senão o da empresa. """
+        # Resultado compartilhado entre usuários: contexto fixo (sem active_test do chamador) e filtro explícito de ativos
+        Tanque = self.sudo().with_context(active_test=False)
+        if deposito_id:
+            deposito = self.env['controle.combustivel.deposito'].sudo().browse(deposito_id)
+            if deposito.tanque_padrao_id.active and deposito.tanque_padrao_id.company_id.id == company_id:
+                return deposito.tanque_padrao_id.id
+            tanque = Tanque.search([('active', '=', True), ('company_id', '=', company_id), ('deposito_id', '=', deposito_id)], limit=1)
+            if tanque:
+                return tanque.id
+        return Tanque.search([('active', '=', True), ('company_id', '=', company_id)], limit=1).id
+
+    @api.model
+    def _tanque_padrao(self, veiculo=None):
+        """ Resolve o tanque de um novo documento: veículo, depósito do veículo, depósito do usuário, empresa. """
+        if veiculo and veiculo.tanque_padrao_id:
+            return veiculo.tanque_padrao_id
+        deposito = (veiculo and veiculo.deposito_id) or self.env.user.deposito_combustivel_id
+        return self.browse(self._tanque_padrao_id(self.env.company.id, deposito.id))
+
     @api.depends('estoque_manual', 'total_entradas', 'total_saidas')
     def _compute_estoque_atual(self):
         for record in self:
@@ -42,11 +121,238 @@ class TanqueCombustivel(models.Model):
             elif p >= 20: record.cor_indicador, record.status_nivel = '#FFC107', 'atencao'
             else: record.cor_indicador, record.status_nivel = '#A43A2F', 'critico'
 
-    @api.depends('abastecimento_ids.state', 'abastecimento_ids.quantidade_litros', 'entrada_ids.state', 'entrada_ids.quantidade_litros')
-    def _compute_movimentacoes(self):
+    @api.depends('data_ruptura')
+    def _compute_dias_restantes(self):
+        hoje = fields.Date.context_today(self)
         for record in self:
-            record.total_saidas = sum(record.abastecimento_ids.filtered(lambda a: a.state == 'confirmado').mapped('quantidade_litros'))
-            record.total_entradas = sum(record.entrada_ids.filtered(lambda e: e.state == 'confirmado').mapped('quantidade_litros'))
+            record.dias_restantes = max(0, (record.data_ruptura - hoje).days) if record.data_ruptura else 0
+
+    def _serie_consumo(self, inicio, fim):
+        """ Consumo diário (tanques x dias) de [inicio, fim) a partir da agregação diária, numa consulta. """
+        self.env['controle.combustivel.consumo.diario'].flush_model(['tanque_id', 'data', 'quantidade_litros'])
+        self.env.cr.execute("""
+            SELECT tanque_id, data - %(inicio)s::date, SUM(quantidade_litros)
+              FROM controle_combustivel_consumo_diario
+             WHERE tanque_id IN %(ids)s AND data >= %(inicio)s AND data < %(fim)s
+             GROUP BY tanque_id, data
+        """, {'ids': tuple(self.ids), 'inicio': inicio, 'fim': fim})
+        series = np.zeros((len(self), (fim - inicio).days))
+        linha = {tanque_id: i for i, tanque_id in enumerate(self.ids)}
+        for tanque_id, dia, litros in self.env.cr.fetchall():
+            series[linha[tanque_id], dia] = litros
+        return series
+
+    def prever_consumo(self, hoje=None):
+        """ Ajusta a previsão de consumo de todos os tanques numa passada e grava esgotamento e reposição sugerida.
+
+        Histórico: parâmetro controle_combustivel.previsao_dias (padrão 112), a partir de uma segunda-feira.
+        """
+        if not self:
+            return
+        hoje = hoje or fields.Date.context_today(self)
+        dias = int(self.env['ir.config_parameter'].sudo().get_param('controle_combustivel.previsao_dias', 112))
+        inicio = hoje - timedelta(days=dias)
+        inicio -= timedelta(days=inicio.weekday())
+        series = self._serie_consumo(inicio, hoje)
+        tem_consumo = series > 0
+        primeiro = np.where(tem_consumo.any(axis=1), tem_consumo.argmax(axis=1), series.shape[1])
+        nivel, sazonal = suavizar_sazonal(series, primeiro)
+        previsao = prever(nivel, sazonal, hoje.weekday(), HORIZONTE_PREVISAO)
+
+        estoque = np.array(self.mapped('estoque_atual'), dtype=float)
+        capacidade = np.array(self.mapped('capacidade'), dtype=float)
+        prazo = np.clip(self.mapped('prazo_reposicao'), 0, HORIZONTE_PREVISAO)
+        cobertura = np.clip(prazo + np.array(self.mapped('dias_cobertura')), 0, HORIZONTE_PREVISAO)
+        acumulado = np.hstack([np.zeros((len(self), 1)), np.cumsum(previsao, axis=1)])
+        linhas = np.arange(len(self))
+        # Compra: cobre prazo + cobertura sem ultrapassar a capacidade na chegada
+        chegada = np.maximum(estoque - acumulado[linhas, prazo], 0.0)
+        reposicao = np.clip(acumulado[linhas, cobertura] - estoque, 0.0, np.maximum(capacidade - chegada, 0.0))
+        ruptura = projetar_ruptura(estoque, previsao)
+        consumo_dia = previsao[:, :7].mean(axis=1)
+
+        agora = fields.Datetime.now()
+        for i, tanque in enumerate(self):
+            data_ruptura = hoje + timedelta(days=int(ruptura[i])) if ruptura[i] >= 0 else False
+            tanque.write({
+                'consumo_previsto_dia': float(consumo_dia[i]),
+                'data_ruptura': data_ruptura,
+                'data_pedido': data_ruptura and max(hoje, data_ruptura - timedelta(days=int(prazo[i]))),
+                'quantidade_reposicao': float(reposicao[i]),
+                'data_previsao': agora,
+            })
+        self.env['controle.combustivel.dashboard']._invalidar_cache()
+        _logger.info("Previsão de consumo: %s tanques, %s com esgotamento em até %s dias", len(self), int((ruptura >= 0).sum()), HORIZONTE_PREVISAO)
+
+    @api.model
+    def _cron_prever_consumo(self):
+        self.sudo().search([]).prever_consumo()
+
+    def action_prever_consumo(self):
+        self.sudo().prever_consumo()
+        return True
+
+    def _aplicar_movimentos(self, deltas):
+        """ Soma os deltas do razão aos totais do tanque em O(1), direto no banco. """
+        self.flush_recordset(['total_entradas', 'total_saidas', 'ultima_entrada', 'ultima_saida'])
+        for tanque_id, delta in deltas.items():
+            self.env.cr.execute("""
+                UPDATE controle_combustivel_tanque
+                   SET total_entradas = COALESCE(total_entradas, 0) + %(entrada)s,
+                       total_saidas = COALESCE(total_saidas, 0) + %(saida)s,
+                       ultima_entrada = CASE WHEN %(entrada)s > 0 THEN GREATEST(ultima_entrada, %(data_hora)s) ELSE ultima_entrada END,
+                       ultima_saida = CASE WHEN %(saida)s > 0 THEN GREATEST(ultima_saida, %(data_hora)s) ELSE ultima_saida END
+                 WHERE id = %(tanque_id)s
+            """, dict(delta, tanque_id=tanque_id))
+        self.invalidate_recordset(['total_entradas', 'total_saidas', 'ultima_entrada', 'ultima_saida'])
+        self.modified(['total_entradas', 'total_saidas'])
+
+    def _totais_razao(self):
+        """ Totais esperados pelo razão: último checkpoint + movimentos posteriores. """
+        self.env['controle.combustivel.movimento'].flush_model()
+        self.env['controle.combustivel.tanque.checkpoint'].flush_model()
+        self.env.cr.execute("""
+            SELECT t.id,
+                   COALESCE(c.total_entradas, 0) + COALESCE(SUM(m.quantidade) FILTER (WHERE m.tipo = 'entrada'), 0),
+                   COALESCE(c.total_saidas, 0) + COALESCE(SUM(m.quantidade) FILTER (WHERE m.tipo = 'saida'), 0),
+                   COALESCE(MAX(m.id), c.ultimo_movimento_id, 0)
+              FROM controle_combustivel_tanque t
+              LEFT JOIN LATERAL (
+                    SELECT total_entradas, total_saidas, ultimo_movimento_id
+                      FROM controle_combustivel_tanque_checkpoint
+                     WHERE tanque_id = t.id
+                     ORDER BY id DESC LIMIT 1
+              ) c ON TRUE
+              LEFT JOIN controle_combustivel_movimento m
+                     ON m.tanque_id = t.id AND m.id > COALESCE(c.ultimo_movimento_id, 0)
+             WHERE t.id IN %s
+             GROUP BY t.id, c.total_entradas, c.total_saidas, c.ultimo_movimento_id
+        """, [tuple(self.ids)])
+        return {tanque_id: (entradas, saidas, ultimo) for tanque_id, entradas, saidas, ultimo in self.env.cr.fetchall()}
+
+    def _divergencias(self, esperado):
+        """ Tanques cujos totais gravados diferem de `esperado` ({id: (entradas, saidas, ...)}). """
+        return self.filtered(lambda t: t.id in esperado and (
+            float_compare(t.total_entradas, esperado[t.id][0], precision_digits=2)
+            or float_compare(t.total_saidas, esperado[t.id][1], precision_digits=2)))
+
+    def _criar_checkpoint(self, totais=None):
+        totais = totais or self._totais_razao()
+        return self.env['controle.combustivel.tanque.checkpoint'].sudo().create([{
+            'tanque_id': tanque.id,
+            'total_entradas': totais[tanque.id][0],
+            'total_saidas': totais[tanque.id][1],
+            'ultimo_movimento_id': totais[tanque.id][2],
+        } for tanque in self])
+
+    @api.model
+    def _cron_checkpoint_estoque(self):
+        """ Confere cada tanque contra o razão e grava um novo checkpoint dos que estão íntegros. """
+        tanques = self.search([])
+        if not tanques:
+            return
+        totais = tanques._totais_razao()
+        divergentes = tanques._divergencias(totais)
+        for tanque in divergentes:
+            _logger.warning("Tanque %s diverge do razão (gravado %.2f/%.2f, razão %.2f/%.2f); execute a reconciliação.",
+                            tanque.display_name, tanque.total_entradas, tanque.total_saidas, *totais[tanque.id][:2])
+        (tanques - divergentes)._criar_checkpoint(totais)
+
+    def reconciliar_estoque(self, corrigir=True):
+        """ Recalcula do zero os totais a partir dos documentos confirmados e confere totais e razão.
+
+        Com `corrigir`, reconstrói o razão dos tanques divergentes e grava um checkpoint novo.
+        Retorna a lista de divergências encontradas.
+        """
+        if not self:
+            return []
+        self.env['controle.combustivel.abastecimento'].flush_model(['state', 'tanque_id', 'quantidade_litros'])
+        self.env['controle.combustivel.entrada'].flush_model(['state', 'tanque_id', 'quantidade_litros'])
+        self.env['controle.combustivel.movimento'].flush_model()
+        self.flush_recordset()
+        domain = [('tanque_id', 'in', self.ids), ('state', '=', 'confirmado')]
+        saidas = {t.id: litros for t, litros in self.env['controle.combustivel.abastecimento']._read_group(domain, ['tanque_id'], ['quantidade_litros:sum'])}
+        entradas = {t.id: litros for t, litros in self.env['controle.combustivel.entrada']._read_group(domain, ['tanque_id'], ['quantidade_litros:sum'])}
+        razao = dict.fromkeys(self.ids, (0.0, 0.0))
+        for tanque, tipo, litros in self.env['controle.combustivel.movimento']._read_group([('tanque_id', 'in', self.ids)], ['tanque_id', 'tipo'], ['quantidade:sum']):
+            e, s = razao[tanque.id]
+            razao[tanque.id] = (e + litros, s) if tipo == 'entrada' else (e, s + litros)
+
+        fontes = {t: (entradas.get(t, 0.0), saidas.get(t, 0.0)) for t in self.ids}
+        divergentes = self._divergencias(fontes) | self.filtered(lambda t: any(
+            float_compare(a, b, precision_digits=2) for a, b in zip(razao[t.id], fontes[t.id])))
+        resultado = [{
+            'tanque': tanque.display_name,
+            'gravado': (tanque.total_entradas, tanque.total_saidas),
+            'razao': razao[tanque.id],
+            'documentos': fontes[tanque.id],
+        } for tanque in divergentes]
+        for item in resultado:
+            _logger.warning("Reconciliação do tanque %(tanque)s: gravado %(gravado)s, razão %(razao)s, documentos %(documentos)s", item)
+        if corrigir and divergentes:
+            divergentes._reconstruir_razao()
+        return resultado
+
+    @api.model
+    def _inicializar_razao(self):
+        """ Popula o razão e o checkpoint inicial dos tanques que ainda não têm movimentos (instalação e atualização). """
+        self.env.cr.execute("""
+            SELECT t.id FROM controle_combustivel_tanque t
+             WHERE NOT EXISTS (SELECT 1 FROM controle_combustivel_movimento m WHERE m.tanque_id = t.id)
+        """)
+        tanques = self.browse([t for t, in self.env.cr.fetchall()])
+        if tanques:
+            tanques._reconstruir_razao()
+            _logger.info("Razão de estoque inicializado para %s tanques", len(tanques))
+        return tanques
+
+    def _reconstruir_razao(self):
+        """ Regrava o razão a partir dos documentos confirmados e redefine os totais. """
+        ids = tuple(self.ids)
+        self.env.cr.execute("DELETE FROM controle_combustivel_movimento WHERE tanque_id IN %s", [ids])
+        self.env.cr.execute("""
+            INSERT INTO controle_combustivel_movimento
+                   (tanque_id, data_hora, tipo, quantidade, abastecimento_id, entrada_id, create_uid, create_date, write_uid, write_date)
+            SELECT tanque_id, data_hora, 'saida', quantidade_litros, id, NULL, %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM controle_combustivel_abastecimento WHERE state = 'confirmado' AND tanque_id IN %(ids)s
+            UNION ALL
+            SELECT tanque_id, data_hora, 'entrada', quantidade_litros, NULL, id, %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM controle_combustivel_entrada WHERE state = 'confirmado' AND tanque_id IN %(ids)s
+        """, {'uid': self.env.uid, 'ids': ids})
+        self.env.cr.execute("""
+            UPDATE controle_combustivel_tanque t
+               SET total_entradas = m.entradas, total_saidas = m.saidas,
+                   ultima_entrada = m.ultima_entrada, ultima_saida = m.ultima_saida
+              FROM (
+                    SELECT t2.id,
+                           COALESCE(SUM(mv.quantidade) FILTER (WHERE mv.tipo = 'entrada'), 0) AS entradas,
+                           COALESCE(SUM(mv.quantidade) FILTER (WHERE mv.tipo = 'saida'), 0) AS saidas,
+                           MAX(mv.data_hora) FILTER (WHERE mv.tipo = 'entrada') AS ultima_entrada,
+                           MAX(mv.data_hora) FILTER (WHERE mv.tipo = 'saida') AS ultima_saida
+                      FROM controle_combustivel_tanque t2
+                      LEFT JOIN controle_combustivel_movimento mv ON mv.tanque_id = t2.id
+                     WHERE t2.id IN %(ids)s
+                     GROUP BY t2.id
+              ) m
+             WHERE t.id = m.id
+        """, {'ids': ids})
+        self.env['controle.combustivel.movimento'].invalidate_model()
+        self.invalidate_recordset(['total_entradas', 'total_saidas', 'ultima_entrada', 'ultima_saida'])
+        self.modified(['total_entradas', 'total_saidas'])
+        self._criar_checkpoint()
+
+    def action_recalculate_stock(self):
+        divergencias = self.sudo().reconciliar_estoque()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Recalcular Saldo'),
+                'message': _('%s tanque(s) divergente(s) reconstruído(s) a partir dos documentos.') % len(divergencias) if divergencias else _('Saldo conferido: razão e documentos conferem.'),
+                'type': 'warning' if divergencias else 'success',
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            },
+        }
 
     def consuming_combustivel(self, quantidade):
         if quantidade > self.estoque_atual:
@@ -58,6 +364,18 @@ class TanqueCombustivel(models.Model):
             raise ValidationError(_('Excede a capacidade do tanque!'))
         return True
 
+    def _bloquear(self):
+        """ Trava as linhas dos tanques até o fim da transação (SELECT ... FOR UPDATE).
+
+        Confirmações concorrentes no mesmo tanque ficam serializadas e o estoque
+        relido após a trava é o vigente, impedindo que duas transações aprovem
+        saídas sobre o mesmo saldo.
+        """
+        if not self:
+            return
+        self.env.cr.execute("SELECT id FROM controle_combustivel_tanque WHERE id IN %s ORDER BY id FOR UPDATE", [tuple(self.ids)])
+        self.invalidate_recordset(['estoque_atual', 'total_entradas', 'total_saidas', 'percentual_nivel'])
+
     def verificar_disponibilidade(self, quantidade):
         return self.estoque_atual >= quantidade
 
@@ -84,9 +402,11 @@ class EntradaCombustivel(models.Model):
     nota_fiscal = fields.Char(string='Nota Fiscal')
     state = fields.Selection([('rascunho', 'Rascunho'), ('confirmado', 'Confirmado'), ('cancelado', 'Cancelado')], string='Status', default='rascunho', tracking=True)
     usuario_id = fields.Many2one('res.users', string='Responsável', default=lambda self: self.env.user, readonly=True)
+    observacao = fields.Text(string='Observações')
+    company_id = fields.Many2one(related='tanque_id.company_id', string='Empresa', store=True, index=True)
 
     def _default_tanque(self):
-        return self.env['controle.combustivel.tanque'].search([], limit=1)
+        return self.env['controle.combustivel.tanque']._tanque_padrao()
 
     @api.depends('quantidade_litros', 'valor_por_litro')
     def _compute_total(self):
@@ -98,13 +418,19 @@ class EntradaCombustivel(models.Model):
         for vals in vals_list:
             if vals.get('name', _('Novo')) == _('Novo'):
                 vals['name'] = self.env['ir.sequence'].next_by_code('controle.combustivel.entrada') or _('Novo')
-        return super().create(vals_list)
+        records = super().create(vals_list)
+        self.env['controle.combustivel.movimento']._registrar_documentos(records, {}, 'entrada')
+        return records
 
     def action_confirmar(self):
-        for record in self:
-            if record.state != 'rascunho': continue
-            record.tanque_id.adicionar_combustivel(record.quantidade_litros)
-            record.state = 'confirmado'
+        """ Confirma em lote: trava cada tanque uma vez e valida a capacidade com a soma das entradas. """
+        rascunhos = self.filtered(lambda r: r.state == 'rascunho')
+        if not rascunhos:
+            return True
+        rascunhos.tanque_id._bloquear()
+        for tanque, registros in rascunhos.grouped('tanque_id').items():
+            tanque.adicionar_combustivel(sum(registros.mapped('quantidade_litros')))
+        rascunhos.write({'state': 'confirmado'})
         return True
 
     def action_cancelar(self):
@@ -114,11 +440,20 @@ class EntradaCombustivel(models.Model):
             record.state = 'cancelado'
         return True
 
+    def action_voltar_rascunho(self):
+        self.filtered(lambda r: r.state == 'cancelado').write({'state': 'rascunho'})
+        return True
+
     def write(self, vals):
         for record in self:
             if record.state in ['confirmado', 'cancelado'] and not self.env.user.has_group('controle_combustivel.group_administrador'):
                 raise UserError(_('Registros confirmados não podem ser editados.'))
-        return super(EntradaCombustivel, self).write(vals)
+        Movimento = self.env['controle.combustivel.movimento']
+        antes = Movimento._efeito(self) if CAMPOS_ESTOQUE.intersection(vals) else None
+        res = super(EntradaCombustivel, self).write(vals)
+        if antes is not None:
+            Movimento._registrar_documentos(self, antes, 'entrada')
+        return res
 
     def unlink(self):
         for record in self:
@@ -8,7 +8,6 @@ export class FuelDashboard extends Component {
     static template = "controle_combustivel.FuelDashboard";
 
     setup() {
-        this.rpc = useService("rpc");
         this.action = useService("action");
         this.state = useState({
             data: {}
@@ -20,8 +19,11 @@ export class FuelDashboard extends Component {
     }
 
     async loadData() {
-        const data = await this.rpc("/combustivel/dashboard/data");
-        Object.assign(this.state.data, data);
+        // GET simples: o navegador reenvia o ETag e reaproveita a resposta em caso de 304
+        const response = await fetch("/combustivel/dashboard/data", { credentials: "same-origin" });
+        if (response.ok) {
+            Object.assign(this.state.data, await response.json());
+        }
     }
 
     async createAbastecimento() {
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+from . import test_performance
+from . import test_concorrencia
+from . import test_ingestao
+from . import test_historico
+from . import test_leitura_veiculo
+from . import test_exportacao
+from . import test_alerta
+from . import test_importador
+from . import test_estoque
+from . import test_consumo_diario
+from . import test_dashboard
+from . import test_previsao
+from . import test_eficiencia
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Teste de carga da API de ingestão: terminais simulados postando lotes contra um servidor de teste.
+
+Uso:
+    python carga_ingestao.py --url http://localhost:8069 --chave <chave de API> --placas SIN0000,SIN0001 \\
+        --terminais 8 --lotes 50 --tamanho 20
+
+Cada terminal envia `--lotes` requisições de `--tamanho` eventos com leituras crescentes por placa
+e chaves únicas. Ao final informa eventos/s e latência (p50/p99) por requisição.
+Não é carregado pelo runner de testes do Odoo.
+"""
+
+from datetime import datetime, timedelta
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+def terminal(args, numero, placas, latencias, contagem, lock):
+    leitura = 10 ** 7 + numero * 10 ** 6
+    inicio = datetime.now()
+    for lote in range(args.lotes):
+        eventos = []
+        for i in range(args.tamanho):
+            leitura += 400
+            eventos.append({
+                'placa': placas[(numero + i) % len(placas)],
+                'data_hora': (inicio + timedelta(seconds=lote * args.tamanho + i)).strftime('%Y-%m-%dT%H:%M:%S'),
+                'odometro': leitura,
+                'litros': 50.0,
+                'preco': 6.0,
+                'chave': 'carga-%s' % uuid.uuid4(),
+            })
+        requisicao = urllib.request.Request(
+            args.url.rstrip('/') + '/combustivel/api/abastecimentos',
+            data=json.dumps({'eventos': eventos}).encode(),
+            headers={'Content-Type': 'application/json', 'Authorization': 'Bearer %s' % args.chave},
+        )
+        antes = time.perf_counter()
+        try:
+            with urllib.request.urlopen(requisicao, timeout=60) as resposta:
+                resultados = json.load(resposta)['resultados']
+        except urllib.error.URLError as e:
+            resultados = [{'status': 'falha_http: %s' % getattr(e, 'code', e.reason)}] * len(eventos)
+        latencia = time.perf_counter() - antes
+        with lock:
+            latencias.append(latencia)
+            for resultado in resultados:
+                contagem[resultado['status']] = contagem.get(resultado['status'], 0) + 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8069')
+    parser.add_argument('--chave', required=True, help='chave de API do usuário do terminal')
+    parser.add_argument('--placas', required=True, help='placas cadastradas, separadas por vírgula')
+    parser.add_argument('--terminais', type=int, default=4)
+    parser.add_argument('--lotes', type=int, default=25)
+    parser.add_argument('--tamanho', type=int, default=20)
+    args = parser.parse_args()
+
+    placas = [p.strip() for p in args.placas.split(',') if p.strip()]
+    latencias, contagem, lock = [], {}, threading.Lock()
+    threads = [threading.Thread(target=terminal, args=(args, n, placas, latencias, contagem, lock)) for n in range(args.terminais)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    eventos = sum(contagem.values())
+    print("Requisições: %s  Eventos: %s  %s" % (len(latencias), eventos, contagem))
+    print("Duração: %.2f s  Vazão: %.1f eventos/s" % (duracao, eventos / duracao if duracao else 0))
+    if latencias:
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        print("Latência por requisição: p50 %.1f ms  p99 %.1f ms  máx %.1f ms" % (
+            statistics.median(latencias) * 1000, p99 * 1000, latencias[-1] * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import itertools
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+_logger = logging.getLogger(__name__)
+
+ARQUIVO_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline_performance.json')
+# Modo de gravação: as medições vão para SAIDA_BASELINE (nunca para a árvore de código); revise e copie para a baseline
+ATUALIZAR_BASELINE = bool(os.environ.get('COMBUSTIVEL_ATUALIZAR_BASELINE'))
+SAIDA_BASELINE = os.environ.get('COMBUSTIVEL_BASELINE_SAIDA') or os.path.join(tempfile.gettempdir(), 'baseline_performance.json')
+
+# Volume da massa sintética; sobrescreva por variável de ambiente (ex.: COMBUSTIVEL_ABASTECIMENTOS=2000000)
+VOLUME = {
+    'veiculos': int(os.environ.get('COMBUSTIVEL_VEICULOS', 50)),
+    'motoristas': int(os.environ.get('COMBUSTIVEL_MOTORISTAS', 20)),
+    'tanques': int(os.environ.get('COMBUSTIVEL_TANQUES', 3)),
+    'abastecimentos': int(os.environ.get('COMBUSTIVEL_ABASTECIMENTOS', 5000)),
+}
+
+def gerar_frota(env, veiculos, motoristas, tanques):
+    """ Cria veículos (placas SIN0000...), motoristas e tanques pelo ORM; volumes pequenos. """
+    marca = env['fleet.vehicle.model.brand'].create({'name': 'Sintética'})
+    modelo = env['fleet.vehicle.model'].create({'name': 'Caminhão', 'brand_id': marca.id})
+    parceiros = env['res.partner'].create([{'name': 'Motorista Sintético %04d' % i} for i in range(motoristas)])
+    frota = env['fleet.vehicle'].create([{
+        'model_id': modelo.id,
+        'license_plate': 'SIN%04d' % i,
+        'driver_id': parceiros[i % motoristas].id,
+    } for i in range(veiculos)])
+    reservatorios = env['controle.combustivel.tanque'].create([{
+        'name': 'Tanque Sintético %02d' % i, 'capacidade': 10 ** 9, 'estoque_manual': 10 ** 8,
+    } for i in range(tanques)])
+    return frota, parceiros, reservatorios
+
+def criar_cadastros(env, nome, placa, tanque_padrao=False, tanque=None, veiculo=None):
+    """ Cadastros dos testes funcionais: um veículo (marca e modelo `nome`) e um tanque de 10.000 L com 5.000 L iniciais.
+
+    `tanque` e `veiculo` sobrescrevem valores de create(); com `tanque_padrao` o tanque é o padrão do veículo.
+    Retorna (veiculo, tanque).
+    """
+    marca = env['fleet.vehicle.model.brand'].create({'name': nome})
+    modelo = env['fleet.vehicle.model'].create({'name': nome, 'brand_id': marca.id})
+    reservatorio = env['controle.combustivel.tanque'].create(dict({
+        'name': 'Tanque %s' % nome, 'capacidade': 10000.0, 'estoque_manual': 5000.0,
+    }, **(tanque or {})))
+    carro = env['fleet.vehicle'].create(dict({
+        'model_id': modelo.id, 'license_plate': placa, 'tanque_padrao_id': reservatorio.id if tanque_padrao else False,
+    }, **(veiculo or {})))
+    return carro, reservatorio
+
+def criar_usuario(env, login, grupo, **valores):
+    """ Usuário interno num grupo do módulo (ex.: 'group_administrador'). """
+    return env['res.users'].create(dict({
+        'name': login, 'login': login,
+        'group_ids': [(4, env.ref('controle_combustivel.%s' % grupo).id)],
+    }, **valores))
+
+def gerar_historico(env, frota, parceiros, reservatorios, quantidade, fim=None):
+    """ Insere `quantidade` abastecimentos confirmados direto no banco (escala para milhões).
+
+    Leituras crescentes por veículo, um abastecimento a cada poucos minutos até `fim`.
+    Em seguida reconstrói eficiência, estado de leitura dos veículos, razão, checkpoint e agregação diária como o módulo faria.
+    """
+    fim = fim or datetime.now()
+    passo = max(1, int(180 * 86400 / max(quantidade, 1)))
+    params = {
+        'n': quantidade, 'passo': passo, 'inicio': fim - timedelta(seconds=passo * quantidade),
+        'veiculos': frota.ids, 'motoristas': parceiros.ids, 'tanques': reservatorios.ids,
+        'uid': env.uid, 'company': env.company.id,
+    }
+    env.cr.execute("""
+        INSERT INTO controle_combustivel_abastecimento
+               (name, data_hora, equipamento_id, motorista_id, tanque_id, usuario_id, company_id,
+                horimetro_odometro, tipo_medicao, quantidade_litros, valor_por_litro, total, state,
+                create_uid, create_date, write_uid, write_date)
+        SELECT 'SIN/' || g,
+               %(inicio)s + g * %(passo)s * interval '1 second',
+               (%(veiculos)s::int[])[1 + g %% cardinality(%(veiculos)s::int[])],
+               (%(motoristas)s::int[])[1 + g %% cardinality(%(motoristas)s::int[])],
+               (%(tanques)s::int[])[1 + g %% cardinality(%(tanques)s::int[])],
+               %(uid)s, %(company)s,
+               (g / cardinality(%(veiculos)s::int[])) * 400 + random() * 50, 'odometro',
+               l.litros, l.preco, l.litros * l.preco, 'confirmado',
+               %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+          FROM generate_series(0, %(n)s - 1) g,
+               LATERAL (SELECT 40 + random() * 30 AS litros, 5.5 + random() AS preco) l
+    """, params)
+    env.cr.execute("""
+        UPDATE controle_combustivel_abastecimento a
+           SET leitura_anterior = l.anterior,
+               km_percorrido = a.horimetro_odometro - l.anterior,
+               consumo_kml = (a.horimetro_odometro - l.anterior) / a.quantidade_litros,
+               custo_km = CASE WHEN a.horimetro_odometro > l.anterior THEN a.total / (a.horimetro_odometro - l.anterior) ELSE 0 END
+          FROM (
+                SELECT id, LAG(horimetro_odometro) OVER (PARTITION BY equipamento_id, tipo_medicao ORDER BY data_hora, id) AS anterior
+                  FROM controle_combustivel_abastecimento
+                 WHERE state = 'confirmado' AND equipamento_id = ANY(%(veiculos)s)
+          ) l
+         WHERE l.id = a.id AND l.anterior IS NOT NULL
+    """, params)
+    env.cr.execute("""
+        UPDATE controle_combustivel_abastecimento a SET placa = v.license_plate
+          FROM fleet_vehicle v
+         WHERE v.id = a.equipamento_id AND a.placa IS NULL AND a.equipamento_id = ANY(%(veiculos)s)
+    """, params)
+    env.invalidate_all()
+    env['controle.combustivel.leitura.veiculo'].reconstruir(frota)
+    reservatorios._reconstruir_razao()
+    env['controle.combustivel.consumo.diario'].reconstruir()
+    env.invalidate_all()
+
+class CombustivelPerformanceCase(TransactionCase):
+    """ Base dos benchmarks: frota sintética, histórico em massa e medição (consultas, tempo, memória).
+
+    Cada medição é comparada com tests/baseline_performance.json (consultas por assertQueryCount,
+    tempo e memória) e falha acima da tolerância. Medição sem entrada na baseline roda sem limites
+    e é listada em aviso ao final da classe: os limites só valem a partir de uma gravação real.
+    Com COMBUSTIVEL_ATUALIZAR_BASELINE=1 nada é comparado e as medições são gravadas em
+    COMBUSTIVEL_BASELINE_SAIDA (padrão: baseline_performance.json no diretório temporário).
+    """
+
+    # Subclasses de carga sobrescrevem o volume da massa (ex.: dict(VOLUME, abastecimentos=100000))
+    volume = VOLUME
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True, mail_create_nolog=True))
+        cls.frota, cls.motoristas, cls.tanques = gerar_frota(cls.env, cls.volume['veiculos'], cls.volume['motoristas'], cls.volume['tanques'])
+        inicio = time.perf_counter()
+        gerar_historico(cls.env, cls.frota, cls.motoristas, cls.tanques, cls.volume['abastecimentos'])
+        _logger.info("Massa sintética: %s, gerada em %.1f s", cls.volume, time.perf_counter() - inicio)
+        with open(ARQUIVO_BASELINE) as arquivo:
+            cls.baseline = json.load(arquivo)
+        cls.medicoes = {}
+        cls.sem_baseline = set()
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.sem_baseline:
+            _logger.warning("Benchmarks sem baseline (medidos, sem limites): %s", sorted(cls.sem_baseline))
+        if ATUALIZAR_BASELINE and cls.medicoes:
+            # Várias classes gravam na mesma saída: acumula sobre a gravação anterior, se houver
+            origem = SAIDA_BASELINE if os.path.exists(SAIDA_BASELINE) else ARQUIVO_BASELINE
+            with open(origem) as arquivo:
+                baseline = json.load(arquivo)
+            baseline['medicoes'].update(cls.medicoes)
+            with open(SAIDA_BASELINE, 'w') as arquivo:
+                json.dump(baseline, arquivo, indent=4, sort_keys=True)
+                arquivo.write('\n')
+            _logger.warning("Medições gravadas em %s (%s); revise e copie para %s", SAIDA_BASELINE, sorted(cls.medicoes), ARQUIVO_BASELINE)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.sequencia = itertools.count()
+        self.base = datetime.now() + timedelta(hours=1)
+
+    def novos_abastecimentos(self, quantidade, **valores):
+        """ Valores de create() para `quantidade` rascunhos após o histórico, com leituras sempre crescentes. """
+        vals_list = []
+        for _i in range(quantidade):
+            n = next(self.sequencia)
+            vals_list.append(dict({
+                'equipamento_id': self.frota[n % len(self.frota)].id,
+                'tanque_id': self.tanques[n % len(self.tanques)].id,
+                'data_hora': self.base + timedelta(minutes=n),
+                'horimetro_odometro': 10 ** 6 + n * 400,
+                'quantidade_litros': 50.0,
+                'valor_por_litro': 6.0,
+            }, **valores))
+        return vals_list
+
+    @contextmanager
+    def medicao(self, nome):
+        """ Mede consultas SQL, tempo e pico de memória Python do bloco e confere com a baseline. """
+        self.env.flush_all()
+        referencia = None if ATUALIZAR_BASELINE else self.baseline['medicoes'].get(nome)
+        if not ATUALIZAR_BASELINE and not referencia:
+            self.sem_baseline.add(nome)
+            _logger.warning("Benchmark %s sem entrada em %s: medido, mas sem limites; grave com COMBUSTIVEL_ATUALIZAR_BASELINE=1",
+                            nome, ARQUIVO_BASELINE)
+        tolerancia = self.baseline['tolerancia']
+        resultado = {}
+        limite_consultas = int(referencia['consultas'] * (1 + tolerancia['consultas'])) + tolerancia['consultas_folga'] if referencia else None
+        consultas = self.cr.sql_log_count
+        tracemalloc.start()
+        try:
+            inicio = time.perf_counter()
+            if limite_consultas is not None:
+                with self.assertQueryCount(limite_consultas):
+                    yield resultado
+            else:
+                yield resultado
+                self.env.flush_all()
+            resultado['segundos'] = round(time.perf_counter() - inicio, 4)
+            resultado['memoria_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        finally:
+            # Sem parar o rastreamento numa falha, os testes seguintes seriam medidos (e atrasados) com ele ligado
+            tracemalloc.stop()
+        resultado['consultas'] = self.cr.sql_log_count - consultas
+        self.medicoes[nome] = {k: resultado[k] for k in ('consultas', 'segundos', 'memoria_mb')}
+        _logger.info("Benchmark %s: %s consultas, %.3f s, %.2f MB", nome, resultado['consultas'], resultado['segundos'], resultado['memoria_mb'])
+        if referencia:
+            self.assertLessEqual(resultado['segundos'], referencia['segundos'] * (1 + tolerancia['segundos']) + tolerancia['segundos_folga'],
+                                 "%s: tempo regrediu em relação à baseline" % nome)
+            self.assertLessEqual(resultado['memoria_mb'], referencia['memoria_mb'] * (1 + tolerancia['memoria']) + tolerancia['memoria_folga_mb'],
+                                 "%s: memória regrediu em relação à baseline" % nome)
+
+    def contar_consultas(self, funcao):
+        self.env.flush_all()
+        antes = self.cr.sql_log_count
+        funcao()
+        self.env.flush_all()
+        return self.cr.sql_log_count - antes
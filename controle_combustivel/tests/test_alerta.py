@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+from .common import criar_cadastros, criar_usuario
+from datetime import timedelta
+
+@tagged('post_install', '-at_install')
+class TestAlertaEmpresa(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.empresa_a = cls.env.company
+        cls.empresa_b = cls.env['res.company'].create({'name': 'Transportadora B'})
+        cls.veiculo, tanque = criar_cadastros(cls.env, 'Alerta', 'ALE0001', tanque={'company_id': cls.empresa_b.id}, veiculo={'company_id': cls.empresa_b.id})
+        agora = fields.Datetime.now()
+        # Seis leituras a 10 km/L e uma queda para 2,5 km/L
+        leituras = [1000.0, 1400.0, 1800.0, 2200.0, 2600.0, 3000.0, 3100.0]
+        cls.abastecimentos = cls.env['controle.combustivel.abastecimento'].with_company(cls.empresa_b).create([{
+            'equipamento_id': cls.veiculo.id, 'tanque_id': tanque.id, 'data_hora': agora - timedelta(days=len(leituras) - i),
+            'horimetro_odometro': leitura, 'quantidade_litros': 40.0, 'valor_por_litro': 6.0,
+        } for i, leitura in enumerate(leituras)])
+        cls.abastecimentos.action_confirmar()
+        cls.analista_a = criar_usuario(cls.env, 'analista_alerta_a', 'group_analista',
+                                       company_id=cls.empresa_a.id, company_ids=[(6, 0, cls.empresa_a.ids)])
+
+    def test_alerta_fica_na_empresa_do_abastecimento(self):
+        alertas = self.env['controle.combustivel.alerta'].detectar(dias=30)
+        queda = alertas.filtered(lambda a: a.tipo == 'consumo')
+        self.assertEqual(queda.abastecimento_id, self.abastecimentos[-1])
+        self.assertEqual(queda.company_id, self.empresa_b)
+
+        self.assertFalse(self.env['controle.combustivel.alerta'].with_user(self.analista_a).search([]) & queda)
+        Dashboard = self.env['controle.combustivel.dashboard']
+        self.assertEqual(Dashboard.with_user(self.analista_a).get_dados()['veiculos_alerta'], [])
+        self.assertEqual([a['placa'] for a in Dashboard.with_company(self.empresa_b).get_dados()['veiculos_alerta']], ['ALE0001'])
+
+    def test_tanque_padrao_ignora_arquivados(self):
+        Tanque = self.env['controle.combustivel.tanque']
+        empresa = self.env['res.company'].create({'name': 'Transportadora C'})
+        arquivado, ativo = Tanque.create([
+            {'name': 'Tanque C Arquivado', 'company_id': empresa.id, 'sequence': 1},
+            {'name': 'Tanque C', 'company_id': empresa.id, 'sequence': 5},
+        ])
+        arquivado.active = False
+        # O primeiro a resolver (aqui, com active_test=False) não pode gravar no cache um tanque arquivado
+        self.assertEqual(Tanque.with_context(active_test=False)._tanque_padrao_id(empresa.id, False), ativo.id)
+        self.assertEqual(Tanque.with_company(empresa)._tanque_padrao(), ativo)
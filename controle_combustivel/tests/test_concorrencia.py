@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, SUPERUSER_ID
+from odoo.exceptions import ValidationError
+from odoo.sql_db import db_connect
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase, get_db_name
+from psycopg2 import errors
+import threading
+import time
+
+@tagged('post_install', '-at_install', 'combustivel_concorrencia')
+class TestConcorrenciaEstoque(BaseCase):
+    """ Duas transações reais confirmando saídas sobre o mesmo saldo: só uma pode passar.
+
+    Usa conexões próprias (fora da transação do teste) e apaga os dados ao final.
+    """
+
+    def _env(self, cr):
+        return api.Environment(cr, SUPERUSER_ID, {'tracking_disable': True})
+
+    def setUp(self):
+        super().setUp()
+        self.db = db_connect(get_db_name())
+        with self.db.cursor() as cr:
+            env = self._env(cr)
+            modelo = env['fleet.vehicle.model'].create({'name': 'Concorrência', 'brand_id': env['fleet.vehicle.model.brand'].create({'name': 'Concorrência'}).id})
+            veiculo = env['fleet.vehicle'].create({'model_id': modelo.id, 'license_plate': 'CONC0001'})
+            tanque = env['controle.combustivel.tanque'].create({'name': 'Tanque Concorrência', 'capacidade': 1000.0, 'estoque_manual': 100.0})
+            abastecimentos = env['controle.combustivel.abastecimento'].create([{
+                'equipamento_id': veiculo.id, 'tanque_id': tanque.id, 'horimetro_odometro': 1000.0 + i * 100,
+                'quantidade_litros': 60.0, 'valor_por_litro': 6.0,
+            } for i in range(2)])
+            self.ids = {'modelo': modelo.id, 'marca': modelo.brand_id.id, 'veiculo': veiculo.id, 'tanque': tanque.id, 'abastecimentos': abastecimentos.ids}
+        self.addCleanup(self._limpar)
+
+    def _limpar(self):
+        with self.db.cursor() as cr:
+            ids = tuple(self.ids['abastecimentos'])
+            cr.execute("DELETE FROM mail_message WHERE model = 'controle.combustivel.abastecimento' AND res_id IN %s", [ids])
+            cr.execute("DELETE FROM controle_combustivel_abastecimento WHERE id IN %s", [ids])
+            env = self._env(cr)
+            env['controle.combustivel.tanque'].browse(self.ids['tanque']).unlink()
+            env['fleet.vehicle'].browse(self.ids['veiculo']).unlink()
+            env['fleet.vehicle.model'].browse(self.ids['modelo']).unlink()
+            env['fleet.vehicle.model.brand'].browse(self.ids['marca']).unlink()
+
+    def _confirmar(self, abastecimento_id, resultados, travou, primeiro):
+        """ Confirma numa transação própria; refaz em conflito de serialização, como o servidor faria. """
+        for _tentativa in range(3):
+            with self.db.cursor() as cr:
+                try:
+                    if not primeiro:
+                        travou.wait(5)
+                    self._env(cr)['controle.combustivel.abastecimento'].browse(abastecimento_id).action_confirmar()
+                    if primeiro:
+                        # Segura a trava do tanque enquanto a outra transação tenta confirmar
+                        travou.set()
+                        time.sleep(0.5)
+                    cr.commit()
+                    resultados.append('confirmado')
+                    return
+                except errors.SerializationFailure:
+                    cr.rollback()
+                except ValidationError:
+                    cr.rollback()
+                    resultados.append('recusado')
+                    return
+                finally:
+                    travou.set()
+        resultados.append('conflito')
+
+    def test_confirmacoes_concorrentes_nao_estouram_estoque(self):
+        resultados, travou = [], threading.Event()
+        primeiro, segundo = self.ids['abastecimentos']
+        threads = [
+            threading.Thread(target=self._confirmar, args=(primeiro, resultados, travou, True)),
+            threading.Thread(target=self._confirmar, args=(segundo, resultados, travou, False)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual(sorted(resultados), ['confirmado', 'recusado'])
+        with self.db.cursor() as cr:
+            tanque = self._env(cr)['controle.combustivel.tanque'].browse(self.ids['tanque'])
+            self.assertAlmostEqual(tanque.estoque_atual, 40.0, places=2)
+            self.assertEqual(tanque.reconciliar_estoque(corrigir=False), [])
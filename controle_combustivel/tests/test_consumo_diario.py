@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+from .common import criar_cadastros, criar_usuario
+from datetime import datetime
+
+@tagged('post_install', '-at_install')
+class TestConsumoDiario(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.veiculo, cls.tanque = criar_cadastros(cls.env, 'Diário', 'DIA0001')
+        cls.administrador = criar_usuario(cls.env, 'admin_combustivel_diario', 'group_administrador')
+        # Dois abastecimentos no dia 1 e um no dia 2 (meio-dia UTC, longe da virada do dia)
+        cls.abastecimentos = cls.env['controle.combustivel.abastecimento'].create([{
+            'equipamento_id': cls.veiculo.id, 'tanque_id': cls.tanque.id, 'data_hora': data_hora,
+            'horimetro_odometro': leitura, 'quantidade_litros': litros, 'valor_por_litro': 6.0,
+        } for data_hora, leitura, litros in [
+            (datetime(2031, 3, 1, 9), 1000.0, 50.0), (datetime(2031, 3, 1, 15), 1400.0, 40.0), (datetime(2031, 3, 2, 12), 1900.0, 50.0),
+        ]])
+
+    def _linhas(self):
+        linhas = self.env['controle.combustivel.consumo.diario'].search([('equipamento_id', '=', self.veiculo.id)], order='data')
+        return [(str(l.data), l.quantidade_litros, l.total, l.km_percorrido, l.quantidade_abastecimentos) for l in linhas]
+
+    def test_confirmacao_atualiza_dias_afetados(self):
+        self.assertEqual(self._linhas(), [])
+        self.abastecimentos.action_confirmar()
+        self.assertEqual(self._linhas(), [
+            ('2031-03-01', 90.0, 540.0, 400.0, 2),
+            ('2031-03-02', 50.0, 300.0, 500.0, 1),
+        ])
+
+        self.abastecimentos[1].with_user(self.administrador).action_cancelar()
+        # O cancelamento refaz o dia e a quilometragem do sucessor
+        self.assertEqual(self._linhas(), [
+            ('2031-03-01', 50.0, 300.0, 0.0, 1),
+            ('2031-03-02', 50.0, 300.0, 900.0, 1),
+        ])
+
+    def test_incremental_igual_a_reconstrucao(self):
+        self.abastecimentos.action_confirmar()
+        self.abastecimentos[2].with_user(self.administrador).write({'quantidade_litros': 45.0})
+        incremental = self._linhas()
+        self.env['controle.combustivel.consumo.diario'].reconstruir()
+        self.assertEqual(self._linhas(), incremental)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.tests import HttpCase, tagged
+from odoo.addons.controle_combustivel.controllers import main
+from odoo.addons.controle_combustivel.controllers.main import DashboardCache
+from .common import criar_cadastros, criar_usuario
+
+@tagged('post_install', '-at_install')
+class TestDashboardCache(HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.analista = criar_usuario(cls.env, 'analista_dashboard', 'group_analista', password='analista_dashboard')
+        cls.veiculo, cls.tanque = criar_cadastros(cls.env, 'Dashboard', 'DSH0001')
+
+    def setUp(self):
+        super().setUp()
+        # Cache próprio por teste: o do processo pode ter entradas de outros testes
+        self.patch(main, 'CACHE', DashboardCache())
+        self.authenticate('analista_dashboard', 'analista_dashboard')
+
+    def _dados(self, etag=None):
+        self.env.flush_all()
+        return self.url_open('/combustivel/dashboard/data', headers={'If-None-Match': etag} if etag else {})
+
+    def _nova_geracao(self):
+        # O incremento roda no postcommit, que a transação do teste nunca dispara
+        self.env.cr.execute("SELECT nextval('controle_combustivel_dashboard_geracao')")
+
+    def test_etag_e_cache(self):
+        resposta = self._dados()
+        self.assertEqual((resposta.status_code, resposta.headers['X-Cache']), (200, 'MISS'))
+        etag = resposta.headers['ETag']
+
+        # Mesma geração: 304 sem corpo, e o dado calculado serve a próxima leitura
+        resposta = self._dados(etag)
+        self.assertEqual((resposta.status_code, resposta.content), (304, b''))
+        self.assertEqual(self._dados().headers['X-Cache'], 'HIT')
+
+        self._nova_geracao()
+        resposta = self._dados(etag)
+        self.assertEqual((resposta.status_code, resposta.headers['X-Cache']), (200, 'MISS'))
+        self.assertNotEqual(resposta.headers['ETag'], etag)
+
+    def test_geracao_muda_a_cada_incremento(self):
+        Dashboard = self.env['controle.combustivel.dashboard']
+        geracao = Dashboard._geracao()
+        self._nova_geracao()
+        self.assertEqual(Dashboard._geracao(), geracao + 1)
+
+        # Confirmações agendam um único incremento para depois do commit
+        abastecimentos = self.env['controle.combustivel.abastecimento'].create([{
+            'equipamento_id': self.veiculo.id, 'tanque_id': self.tanque.id, 'data_hora': fields.Datetime.now(),
+            'horimetro_odometro': 1000.0 + i * 400, 'quantidade_litros': 50.0, 'valor_por_litro': 6.0,
+        } for i in range(2)])
+        abastecimentos.action_confirmar()
+        self.assertTrue(self.env.cr.postcommit.data.get('controle_combustivel.geracao'))
+        self.assertEqual(Dashboard._geracao(), geracao + 1)
+
+    def test_alteracao_do_tanque_invalida(self):
+        # Capacidade, nome e estoque inicial aparecem no payload sem passar pelo razão
+        postcommit = self.env.cr.postcommit.data
+        postcommit.pop('controle_combustivel.geracao', None)
+        self.tanque.write({'capacidade': 12000.0})
+        self.assertTrue(postcommit.get('controle_combustivel.geracao'))
+
+    def test_chave_inclui_tanque_do_usuario(self):
+        etag = self._dados().headers['ETag']
+
+        # Depósito do usuário com outro tanque padrão: nem 304 nem o payload em cache do tanque anterior
+        outro = self.env['controle.combustivel.tanque'].create({'name': 'Tanque Depósito Dashboard', 'capacidade': 8000.0})
+        deposito = self.env['controle.combustivel.deposito'].create({'name': 'Depósito Dashboard'})
+        outro.deposito_id = deposito
+        deposito.tanque_padrao_id = outro
+        self.analista.deposito_combustivel_id = deposito
+        resposta = self._dados(etag)
+        self.assertEqual((resposta.status_code, resposta.headers['X-Cache']), (200, 'MISS'))
+        self.assertEqual(resposta.json()['tanque']['name'], 'Tanque Depósito Dashboard')
+
+    def test_dashboard_cache_lru(self):
+        cache = DashboardCache(tamanho=2, ttl=60)
+        cache.guardar('a', 1, 'A')
+        cache.guardar('b', 1, 'B')
+        self.assertEqual(cache.obter('a', 1), 'A')
+        self.assertIsNone(cache.obter('a', 2), "Geração nova descarta a entrada")
+        cache.guardar('a', 2, 'A2')
+        cache.guardar('c', 2, 'C')
+        self.assertIsNone(cache.obter('b', 1), "A menos usada sai ao exceder o tamanho")
+        estatisticas = cache.estatisticas()
+        self.assertEqual((estatisticas['hits'], estatisticas['expiradas'], estatisticas['descartadas'], estatisticas['entradas']), (1, 1, 1, 2))
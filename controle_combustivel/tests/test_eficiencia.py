@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+from .common import criar_cadastros, criar_usuario
+from datetime import timedelta
+
+@tagged('post_install', '-at_install')
+class TestEficienciaRetroativa(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.veiculo, cls.tanque = criar_cadastros(cls.env, 'Eficiência', 'EFI0001')
+        cls.administrador = criar_usuario(cls.env, 'admin_combustivel_eficiencia', 'group_administrador')
+        cls.inicio = fields.Datetime.now() - timedelta(days=10)
+        cls.anterior, cls.sucessor = cls._abastecer(cls, [(0, 1000.0, 50.0), (2, 1600.0, 40.0)])
+        (cls.anterior | cls.sucessor).action_confirmar()
+
+    def _abastecer(self, leituras):
+        return self.env['controle.combustivel.abastecimento'].create([{
+            'equipamento_id': self.veiculo.id, 'tanque_id': self.tanque.id, 'data_hora': self.inicio + timedelta(days=dia),
+            'horimetro_odometro': leitura, 'quantidade_litros': litros, 'valor_por_litro': 6.0,
+        } for dia, leitura, litros in leituras])
+
+    def _eficiencia(self, registro):
+        return registro.leitura_anterior, registro.km_percorrido, registro.consumo_kml, registro.custo_km
+
+    def test_retroativo_recalcula_sucessor(self):
+        self.assertEqual(self._eficiencia(self.sucessor), (1000.0, 600.0, 15.0, 0.4))
+
+        # Lançado depois, mas com data entre os dois: vira o anterior do sucessor
+        meio = self._abastecer([(1, 1300.0, 30.0)])
+        meio.action_confirmar()
+        self.assertEqual(self._eficiencia(meio), (1000.0, 300.0, 10.0, 0.6))
+        self.assertEqual(self._eficiencia(self.sucessor), (1300.0, 300.0, 7.5, 0.8))
+
+        # Excluído (cancelar e apagar): o sucessor volta a contar desde o primeiro
+        meio.with_user(self.administrador).action_cancelar()
+        meio.unlink()
+        self.assertEqual(self._eficiencia(self.sucessor), (1000.0, 600.0, 15.0, 0.4))
+        self.assertEqual(self._eficiencia(self.anterior), (0.0, 0.0, 0.0, 0.0))
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+from .common import criar_cadastros, criar_usuario
+
+@tagged('post_install', '-at_install')
+class TestRazaoEstoque(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.veiculo, cls.tanque = criar_cadastros(cls.env, 'Estoque', 'EST0001', tanque={'estoque_manual': 1000.0})
+        cls.entrada = cls.env['controle.combustivel.entrada'].create({'tanque_id': cls.tanque.id, 'quantidade_litros': 500.0, 'valor_por_litro': 5.5})
+        cls.entrada.action_confirmar()
+        cls.abastecimento = cls.env['controle.combustivel.abastecimento'].create({
+            'equipamento_id': cls.veiculo.id, 'tanque_id': cls.tanque.id, 'data_hora': fields.Datetime.now(),
+            'horimetro_odometro': 1000.0, 'quantidade_litros': 100.0, 'valor_por_litro': 6.0,
+        })
+        cls.abastecimento.action_confirmar()
+        cls.administrador = criar_usuario(cls.env, 'admin_combustivel_estoque', 'group_administrador')
+
+    def _totais(self):
+        self.tanque.invalidate_recordset()
+        return self.tanque.total_entradas, self.tanque.total_saidas, self.tanque.estoque_atual
+
+    def _ajustar(self, litros):
+        # Só administradores alteram abastecimentos confirmados
+        self.abastecimento.with_user(self.administrador).write({'quantidade_litros': litros})
+
+    def _corromper(self):
+        self.env.cr.execute("UPDATE controle_combustivel_tanque SET total_saidas = 0 WHERE id = %s", [self.tanque.id])
+        self.tanque.invalidate_recordset()
+
+    def test_razao_acompanha_documentos(self):
+        self.assertEqual(self._totais(), (500.0, 100.0, 1400.0))
+        self._ajustar(80.0)
+        self.assertEqual(self._totais(), (500.0, 80.0, 1420.0))
+        # Ajuste lança estorno e novo efeito, sem apagar o movimento original
+        movimentos = self.tanque.movimento_ids.filtered(lambda m: m.abastecimento_id == self.abastecimento)
+        self.assertEqual(sorted(movimentos.mapped('quantidade')), [-100.0, 80.0, 100.0])
+        self.assertEqual(self.tanque.reconciliar_estoque(), [])
+
+    def test_reconciliacao_corrige_divergencia(self):
+        self._corromper()
+        divergencias = self.tanque.reconciliar_estoque(corrigir=False)
+        self.assertEqual([(d['gravado'], d['documentos']) for d in divergencias], [((500.0, 0.0), (500.0, 100.0))])
+        self.assertEqual(self._totais()[1], 0.0)
+
+        self.assertEqual(len(self.tanque.reconciliar_estoque()), 1)
+        self.assertEqual(self._totais(), (500.0, 100.0, 1400.0))
+        self.assertEqual(self.tanque.reconciliar_estoque(), [])
+
+    def test_checkpoint_so_de_tanques_integros(self):
+        Checkpoint = self.env['controle.combustivel.tanque.checkpoint']
+        self.env['controle.combustivel.tanque']._cron_checkpoint_estoque()
+        checkpoint = Checkpoint.search([('tanque_id', '=', self.tanque.id)], limit=1)
+        self.assertEqual((checkpoint.total_entradas, checkpoint.total_saidas), (500.0, 100.0))
+        self.assertEqual(checkpoint.ultimo_movimento_id, max(self.tanque.movimento_ids.ids))
+
+        # Movimento posterior ao checkpoint entra nos totais esperados
+        self._ajustar(90.0)
+        self.assertEqual(self.tanque._totais_razao()[self.tanque.id][:2], (500.0, 90.0))
+
+        self._corromper()
+        self.env['controle.combustivel.tanque']._cron_checkpoint_estoque()
+        self.assertEqual(Checkpoint.search([('tanque_id', '=', self.tanque.id)], limit=1), checkpoint)
+
+    def test_inicializar_razao(self):
+        # Base anterior ao razão: sem movimentos, checkpoints nem totais
+        self.env.cr.execute("DELETE FROM controle_combustivel_movimento WHERE tanque_id = %s", [self.tanque.id])
+        self.env.cr.execute("DELETE FROM controle_combustivel_tanque_checkpoint WHERE tanque_id = %s", [self.tanque.id])
+        self.env.cr.execute("UPDATE controle_combustivel_tanque SET total_entradas = 0, total_saidas = 0 WHERE id = %s", [self.tanque.id])
+        self.env.invalidate_all()
+
+        Tanque = self.env['controle.combustivel.tanque']
+        self.assertIn(self.tanque, Tanque._inicializar_razao())
+        self.assertEqual(self._totais(), (500.0, 100.0, 1400.0))
+        self.assertEqual(len(self.tanque.movimento_ids), 2)
+        self.assertTrue(self.env['controle.combustivel.tanque.checkpoint'].search_count([('tanque_id', '=', self.tanque.id)]))
+        self.assertFalse(Tanque._inicializar_razao() & self.tanque)
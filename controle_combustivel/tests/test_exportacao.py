@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+from .common import criar_cadastros, criar_usuario
+from unittest.mock import patch
+import base64
+import csv
+import io
+
+@tagged('post_install', '-at_install')
+class TestExportacao(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.veiculo, cls.tanque = criar_cadastros(cls.env, 'Exportação', 'EXP0001')
+        cls.motorista = criar_usuario(cls.env, 'motorista_exportacao', 'group_motorista')
+        valores = {'equipamento_id': cls.veiculo.id, 'tanque_id': cls.tanque.id, 'data_hora': fields.Datetime.now(),
+                   'horimetro_odometro': 1000.0, 'quantidade_litros': 50.0, 'valor_por_litro': 6.0}
+        cls.proprio = cls.env['controle.combustivel.abastecimento'].with_user(cls.motorista).create(dict(valores, name='EXP/PROPRIO'))
+        # Rascunho de outro usuário: invisível ao motorista pela regra de registro
+        cls.alheio = cls.env['controle.combustivel.abastecimento'].create(dict(valores, name='EXP/ALHEIO'))
+
+    def _exportar(self, formato):
+        exportacao = self.env['controle.combustivel.exportacao'].with_user(self.motorista).create({'formato': formato})
+        # Ids arbitrários, como numa chamada RPC forjada
+        exportacao.sudo().abastecimento_ids = self.proprio | self.alheio
+        exportacao._processar()
+        return exportacao.sudo()
+
+    def test_livro_respeita_regras_de_registro(self):
+        exportacao = self._exportar('csv')
+        self.assertEqual((exportacao.state, exportacao.total), ('concluido', 1))
+        linhas = list(csv.reader(io.StringIO(base64.b64decode(exportacao.anexo_id.datas).decode('utf-8-sig')), delimiter=';'))
+        self.assertEqual([linha[0] for linha in linhas[1:]], ['EXP/PROPRIO'])
+
+    def test_arquivo_gravado_no_filestore(self):
+        exportacao = self._exportar('csv')
+        anexo = exportacao.anexo_id
+        conteudo = base64.b64decode(anexo.datas)
+        self.assertEqual((anexo.file_size, anexo.mimetype), (len(conteudo), 'text/csv'))
+        if anexo._storage() == 'file':
+            self.assertTrue(anexo.store_fname.endswith(anexo.checksum))
+
+    def test_falha_na_preparacao_marca_erro(self):
+        Exportacao = self.env['controle.combustivel.exportacao']
+        exportacao = Exportacao.with_user(self.motorista).create({'formato': 'csv', 'abastecimento_ids': [(6, 0, self.proprio.ids)]})
+        exportacao.action_iniciar()
+
+        def falhar(registro):
+            raise ValueError('domínio inválido')
+        # Sem commit/rollback reais: a transação é a do teste
+        with patch.object(type(Exportacao), '_permitidos', falhar), \
+             patch.object(self.env.cr, 'commit'), patch.object(self.env.cr, 'rollback'):
+            Exportacao._cron_processar()
+        exportacao = exportacao.sudo()
+        self.assertEqual(exportacao.state, 'erro')
+        self.assertIn('domínio inválido', exportacao.mensagem_erro)
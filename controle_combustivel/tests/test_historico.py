@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+from .common import criar_cadastros
+from datetime import timedelta
+
+@tagged('post_install', '-at_install')
+class TestArquivamento(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.veiculo, cls.tanque = criar_cadastros(cls.env, 'Arquivo', 'ARQ0001', tanque={'estoque_manual': 1000.0})
+        agora = fields.Datetime.now()
+        cls.abastecimentos = cls.env['controle.combustivel.abastecimento'].create([{
+            'equipamento_id': cls.veiculo.id, 'tanque_id': cls.tanque.id, 'data_hora': agora - timedelta(days=dias),
+            'horimetro_odometro': leitura, 'quantidade_litros': 50.0, 'valor_por_litro': 6.0, 'chave_externa': 'arq-%s' % dias,
+        } for dias, leitura in ((800, 1000.0), (790, 1500.0), (10, 2000.0))])
+        cls.abastecimentos.action_confirmar()
+
+    def test_arquivar_mantem_estoque_e_eficiencia(self):
+        antigos, recente = self.abastecimentos[:2], self.abastecimentos[2]
+        self.assertEqual(recente.leitura_anterior, 1500.0)
+        estoque = self.tanque.estoque_atual
+
+        arquivados = self.env['controle.combustivel.abastecimento.historico'].arquivar(dias=730)
+
+        self.assertEqual(arquivados, 2)
+        self.assertFalse(antigos.exists())
+        self.assertAlmostEqual(self.tanque.estoque_atual, estoque, places=2)
+        self.assertAlmostEqual(self.tanque.estoque_manual, 900.0, places=2)
+        self.assertEqual(self.tanque.reconciliar_estoque(corrigir=False), [])
+        historico = self.env['controle.combustivel.abastecimento.historico'].search([('equipamento_id', '=', self.veiculo.id)])
+        self.assertEqual(sorted(historico.mapped('horimetro_odometro')), [1000.0, 1500.0])
+
+        # A última leitura arquivada continua sendo a anterior do primeiro registro ativo
+        base = self.env['controle.combustivel.leitura.veiculo'].search([('equipamento_id', '=', self.veiculo.id)])
+        self.assertEqual((base.tipo_medicao, base.leitura_base), ('odometro', 1500.0))
+        recente.recalcular_eficiencia()
+        self.env.flush_all()
+        self.assertEqual(recente.leitura_anterior, 1500.0)
+        self.assertAlmostEqual(recente.consumo_kml, 10.0, places=2)
+
+    def test_leitura_consolidada_e_agregacao(self):
+        self.env['controle.combustivel.abastecimento.historico'].arquivar(dias=730)
+        Relatorio = self.env['controle.combustivel.abastecimento.relatorio']
+        registros = Relatorio.search([('equipamento_id', '=', self.veiculo.id)])
+        self.assertEqual(sorted(registros.mapped('origem')), ['ativo', 'historico', 'historico'])
+        self.assertAlmostEqual(sum(registros.mapped('quantidade_litros')), 150.0, places=2)
+
+        # A reconstrução da agregação diária não perde os dias arquivados
+        ConsumoDiario = self.env['controle.combustivel.consumo.diario']
+        ConsumoDiario.reconstruir()
+        consumo = ConsumoDiario.search([('equipamento_id', '=', self.veiculo.id)])
+        self.assertAlmostEqual(sum(consumo.mapped('quantidade_litros')), 150.0, places=2)
+
+    def test_chave_arquivada_nao_reimporta(self):
+        self.env['controle.combustivel.abastecimento.historico'].arquivar(dias=730)
+        _registros, duplicados, erros = self.env['controle.combustivel.importador']._gravar_lote([(2, {
+            'equipamento_id': self.veiculo.id, 'tanque_id': self.tanque.id, 'data_hora': fields.Datetime.now() - timedelta(days=800),
+            'horimetro_odometro': 1000.0, 'quantidade_litros': 50.0, 'valor_por_litro': 6.0, 'chave_externa': 'arq-800',
+        })])
+        self.assertEqual((duplicados, erros), (1, []))
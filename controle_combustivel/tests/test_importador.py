@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from odoo.exceptions import UserError
+from odoo.tests import TransactionCase, tagged
+from .common import criar_cadastros
+import io
+
+@tagged('post_install', '-at_install')
+class TestImportador(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.veiculo, cls.tanque = criar_cadastros(cls.env, 'Importação', 'IMP-0001', tanque_padrao=True)
+
+    def _arquivo(self, linhas):
+        return io.BytesIO('\n'.join(['placa;data_hora;odometro;litros;preco'] + linhas).encode())
+
+    def _importar(self, linhas, **kwargs):
+        return self.env['controle.combustivel.importador'].importar_csv(self._arquivo(linhas), **kwargs)
+
+    def test_erros_com_numero_da_linha(self):
+        resumo = self._importar([
+            'IMP0001;2031-04-01 08:00:00;1000;50;6,10',
+            'XXX9999;2031-04-01 08:30:00;1000;50;6,10',
+            'IMP0001;ontem;1100;50;6,10',
+            'IMP0001;2031-04-01 08:45:00;mil;50;6,10',
+            # Converte, mas a confirmação recusa: o lote é refeito linha a linha
+            'IMP0001;2031-04-01 09:00:00;900;50;6,10',
+            'IMP0001;2031-04-01 10:00:00;1400;40;6,10',
+        ])
+        self.assertEqual((resumo['linhas'], resumo['criados'], resumo['duplicados']), (6, 2, 0))
+        self.assertEqual([linha for linha, _mensagem in resumo['erros']], [3, 4, 5, 6])
+        mensagens = dict(resumo['erros'])
+        self.assertIn('XXX9999', mensagens[3])
+        self.assertIn('ontem', mensagens[4])
+        self.assertIn('horimetro_odometro', mensagens[5])
+        self.assertIn('sequência', mensagens[6])
+        importados = self.env['controle.combustivel.abastecimento'].search([('equipamento_id', '=', self.veiculo.id)])
+        self.assertEqual(sorted(importados.mapped('horimetro_odometro')), [1000.0, 1400.0])
+        self.assertEqual(set(importados.mapped('state')), {'confirmado'})
+
+    def test_erros_em_lotes_diferentes(self):
+        resumo = self._importar([
+            'IMP0001;2031-05-01 08:00:00;5000;50;6,10',
+            'IMP0001;2031-05-01 09:00:00;5400;50;6,10',
+            'XXX9999;2031-05-01 10:00:00;5800;50;6,10',
+        ], tamanho_lote=2)
+        self.assertEqual((resumo['criados'], [linha for linha, _mensagem in resumo['erros']]), (2, [4]))
+
+    def test_tamanho_lote_invalido(self):
+        with self.assertRaises(UserError):
+            self._importar(['IMP0001;2031-04-01 08:00:00;1000;50;6,10'], tamanho_lote=0)
+
+    def test_stream_do_chamador_continua_aberto(self):
+        arquivo = self._arquivo(['IMP0001;2031-06-01 08:00:00;9000;50;6,10'])
+        Importador = self.env['controle.combustivel.importador']
+        self.assertEqual(Importador.importar_csv(arquivo)['criados'], 1)
+        self.assertFalse(arquivo.closed)
+        # Relido do início: a mesma linha agora é duplicada
+        arquivo.seek(0)
+        resumo = Importador.importar_csv(arquivo)
+        self.assertEqual((resumo['linhas'], resumo['criados'], resumo['duplicados']), (1, 0, 1))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import HttpCase, tagged
+from .common import criar_cadastros, criar_usuario
+import json
+
+@tagged('post_install', '-at_install')
+class TestIngestao(HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.usuario = criar_usuario(cls.env, 'terminal_bomba_01', 'group_administrador', name='Terminal Bomba 01')
+        cls.chave = cls.env['res.users.apikeys'].with_user(cls.usuario)._generate('rpc', 'Terminal', None)
+        cls.veiculo, cls.tanque = criar_cadastros(cls.env, 'Ingestão', 'ING-1A23', tanque_padrao=True)
+
+    def _postar(self, eventos, chave=None):
+        resposta = self.url_open('/combustivel/api/abastecimentos', data=json.dumps({'eventos': eventos}), headers={
+            'Content-Type': 'application/json', 'Authorization': 'Bearer %s' % (chave or self.chave),
+        })
+        return resposta.status_code, resposta.json()
+
+    def test_lote_com_resultado_por_evento(self):
+        eventos = [
+            {'placa': 'ing1a23', 'data_hora': '2031-01-01T08:00:00', 'odometro': 1000, 'litros': 50, 'preco': 6.1, 'chave': 'bomba-1'},
+            {'placa': 'XXX0000', 'data_hora': '2031-01-01T08:05:00', 'odometro': 1000, 'litros': 50, 'preco': 6.1, 'chave': 'bomba-2'},
+            {'placa': 'ING1A23', 'data_hora': '2031-01-01T09:00:00', 'odometro': 1400, 'litros': 40, 'preco': 6.1, 'chave': 'bomba-3'},
+        ]
+        status, corpo = self._postar(eventos)
+        self.assertEqual(status, 200)
+        self.assertEqual([r['status'] for r in corpo['resultados']], ['criado', 'erro', 'criado'])
+        registros = self.env['controle.combustivel.abastecimento'].browse([r['id'] for r in corpo['resultados'] if r['status'] == 'criado'])
+        self.assertEqual(set(registros.mapped('state')), {'confirmado'})
+        self.assertEqual(registros.tanque_id, self.tanque)
+
+        # Reenvio do mesmo lote (ex.: timeout no terminal) não duplica
+        status, corpo = self._postar(eventos)
+        self.assertEqual([r['status'] for r in corpo['resultados']], ['duplicado', 'erro', 'duplicado'])
+
+    def test_chave_invalida(self):
+        resposta = self.url_open('/combustivel/api/abastecimentos', data=json.dumps({'eventos': []}), headers={
+            'Content-Type': 'application/json', 'Authorization': 'Bearer invalida',
+        })
+        self.assertEqual(resposta.status_code, 401)
+
+    def test_cadastros_novos_valem_no_proximo_lote(self):
+        evento = {'placa': 'ING2B34', 'data_hora': '2031-02-01T08:00:00', 'odometro': 500, 'litros': 30, 'preco': 6.1,
+                  'motorista': 'Motorista Ingestão Novo', 'chave': 'bomba-novo'}
+        _status, corpo = self._postar([evento])
+        self.assertEqual(corpo['resultados'][0]['status'], 'erro')
+
+        # Veículo e motorista cadastrados depois do primeiro lote: sem esperar o cache vencer
+        self.env['fleet.vehicle'].create({'model_id': self.veiculo.model_id.id, 'license_plate': 'ING-2B34', 'tanque_padrao_id': self.tanque.id})
+        _status, corpo = self._postar([evento])
+        self.assertIn('Motorista', corpo['resultados'][0]['mensagem'])
+        self.env['res.partner'].create({'name': 'Motorista Ingestão Novo'})
+        _status, corpo = self._postar([evento])
+        self.assertEqual(corpo['resultados'][0]['status'], 'criado')
+
+    def test_duplicado_invisivel_ao_chamador(self):
+        # Rascunho de outro usuário: fora das regras do motorista, mas a chave já foi gravada
+        valores = {
+            'equipamento_id': self.veiculo.id, 'tanque_id': self.tanque.id, 'data_hora': '2031-03-01 08:00:00',
+            'horimetro_odometro': 2000.0, 'quantidade_litros': 30.0, 'valor_por_litro': 6.1, 'chave_externa': 'bomba-oculta',
+        }
+        self.env['controle.combustivel.abastecimento'].create(dict(valores))
+        motorista = criar_usuario(self.env, 'motorista_ingestao', 'group_motorista')
+        registros, duplicados, erros = self.env['controle.combustivel.importador'].with_user(motorista)._gravar_lote([(0, valores)], confirmar=False)
+        self.assertEqual((len(registros), duplicados, erros), (0, 1, []))
+
+    def test_mesma_chave_em_outra_empresa(self):
+        outra = self.env['res.company'].create({'name': 'Empresa Ingestão B'})
+        veiculo, tanque = criar_cadastros(self.env['res.company'].with_company(outra).env, 'Ingestão B', 'INB-1A23')
+        self.env['controle.combustivel.abastecimento'].with_company(outra).create({
+            'equipamento_id': veiculo.id, 'tanque_id': tanque.id, 'data_hora': '2031-04-01 08:00:00',
+            'horimetro_odometro': 1000.0, 'quantidade_litros': 50.0, 'valor_por_litro': 6.1, 'chave_externa': 'bomba-empresa',
+        })
+        self.env.flush_all()
+
+        # A chave é única por empresa: na empresa do terminal ainda não foi importada
+        status, corpo = self._postar([{'placa': 'ING1A23', 'data_hora': '2031-04-01T08:00:00', 'odometro': 3000, 'litros': 50,
+                                       'preco': 6.1, 'chave': 'bomba-empresa'}])
+        self.assertEqual(status, 200)
+        self.assertEqual(corpo['resultados'][0]['status'], 'criado')
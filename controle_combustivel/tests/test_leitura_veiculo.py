@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.exceptions import ValidationError
+from odoo.tests import Form, TransactionCase, tagged
+from .common import criar_cadastros, criar_usuario
+from datetime import timedelta
+
+@tagged('post_install', '-at_install')
+class TestLeituraVeiculo(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.veiculo, cls.tanque = criar_cadastros(cls.env, 'Leitura', 'LEI0001')
+        cls.administrador = criar_usuario(cls.env, 'admin_combustivel_leitura', 'group_administrador', name='Administrador Combustível')
+        cls.inicio = fields.Datetime.now() - timedelta(days=10)
+        cls.primeiros = cls._abastecer(cls, [(0, 1000.0, 50.0), (1, 1400.0, 40.0)])
+        cls.primeiros.action_confirmar()
+
+    def _abastecer(self, leituras):
+        return self.env['controle.combustivel.abastecimento'].create([{
+            'equipamento_id': self.veiculo.id, 'tanque_id': self.tanque.id, 'data_hora': self.inicio + timedelta(days=dia),
+            'horimetro_odometro': leitura, 'quantidade_litros': litros, 'valor_por_litro': 6.0,
+        } for dia, leitura, litros in leituras])
+
+    def _estado(self):
+        return self.env['controle.combustivel.leitura.veiculo'].search([('equipamento_id', '=', self.veiculo.id), ('tipo_medicao', '=', 'odometro')])
+
+    def test_confirmacao_avanca_estado(self):
+        estado = self._estado()
+        self.assertEqual((estado.ultima_leitura, estado.ultimo_abastecimento_id), (1400.0, self.primeiros[1]))
+        self.assertAlmostEqual(estado.consumo_medio, 10.0, places=2)
+
+        novos = self._abastecer([(2, 1900.0, 50.0), (3, 2300.0, 20.0)])
+        novos.action_confirmar()
+        self.assertEqual(novos.mapped('leitura_anterior'), [1400.0, 1900.0])
+        estado.invalidate_recordset()
+        self.assertEqual(estado.ultima_leitura, 2300.0)
+        # Média móvel: 10 km/L, depois 10 e 20 km/L com peso 0,2
+        self.assertAlmostEqual(estado.consumo_medio, 0.2 * 20.0 + 0.8 * 10.0, places=2)
+
+    def test_leitura_menor_recusada(self):
+        recuo = self._abastecer([(2, 1200.0, 30.0)])
+        with self.assertRaises(ValidationError):
+            recuo.action_confirmar()
+        self.assertEqual(recuo.state, 'rascunho')
+
+        # Dica no formulário, sem salvar
+        formulario = Form(self.env['controle.combustivel.abastecimento'])
+        formulario.equipamento_id = self.veiculo
+        self.assertEqual(formulario.ultima_leitura_veiculo, 1400.0)
+        Abastecimento = self.env['controle.combustivel.abastecimento']
+        recente = Abastecimento.new({'equipamento_id': self.veiculo.id, 'data_hora': self.inicio + timedelta(days=2), 'horimetro_odometro': 1200.0})
+        self.assertIn('warning', recente._onchange_verificar_leitura())
+        # Lançamento anterior à última leitura: sem falso aviso
+        retroativo = Abastecimento.new({'equipamento_id': self.veiculo.id, 'data_hora': self.inicio + timedelta(hours=12), 'horimetro_odometro': 1200.0})
+        self.assertFalse(retroativo._onchange_verificar_leitura())
+
+    def test_leitura_retroativa_fora_da_sequencia(self):
+        # Entre as leituras de 1000 (dia 0) e 1400 (dia 1): maior que a seguinte ou menor que a anterior
+        for leitura in (1500.0, 900.0):
+            retroativo = self._abastecer([(0.5, leitura, 20.0)])
+            with self.assertRaises(ValidationError):
+                retroativo.action_confirmar()
+        valido = self._abastecer([(0.5, 1200.0, 20.0)])
+        valido.action_confirmar()
+        self.assertEqual(valido.state, 'confirmado')
+
+    def test_veiculo_sem_estado_valida_pelos_vizinhos(self):
+        # Base atualizada sem estado de leitura: a primeira confirmação já é conferida
+        self._estado().unlink()
+        recuo = self._abastecer([(2, 1200.0, 30.0)])
+        with self.assertRaises(ValidationError):
+            recuo.action_confirmar()
+
+    def test_cancelamento_e_retroativo_reconstroem(self):
+        self.primeiros[1].with_user(self.administrador).action_cancelar()
+        estado = self._estado()
+        self.assertEqual(estado.ultima_leitura, 1000.0)
+
+        # Confirmação retroativa (antes da última leitura) refaz o par e a eficiência do sucessor
+        retroativo = self._abastecer([(-1, 800.0, 20.0)])
+        retroativo.action_confirmar()
+        estado.invalidate_recordset()
+        self.assertEqual(estado.ultima_leitura, 1000.0)
+        self.assertEqual(self.primeiros[0].leitura_anterior, 800.0)
+
+    def test_reconstruir(self):
+        estado = self._estado()
+        esperado = (estado.ultima_leitura, estado.ultima_data, estado.consumo_medio)
+        self.env.cr.execute("UPDATE controle_combustivel_leitura_veiculo SET ultima_leitura = 0, consumo_medio = 0 WHERE id = %s", [estado.id])
+        estado.invalidate_recordset()
+        self.veiculo.action_reconstruir_leituras_combustivel()
+        estado.invalidate_recordset()
+        self.assertEqual((estado.ultima_leitura, estado.ultima_data, estado.consumo_medio), esperado)
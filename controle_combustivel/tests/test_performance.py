@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.tests import tagged
+from .common import CombustivelPerformanceCase, VOLUME
+from datetime import datetime, timedelta
+import io
+import logging
+
+_logger = logging.getLogger(__name__)
+
+def desvios_por_filtered(abastecimentos):
+    """ Detecção anterior ao módulo de alertas, reproduzida como referência: um filtered() por veículo. """
+    veiculos_alerta = []
+    for v in abastecimentos.mapped('equipamento_id'):
+        abasts_v = abastecimentos.filtered(lambda a: a.equipamento_id == v)
+        if len(abasts_v) >= 2:
+            media_v = sum(a.consumo_kml or 0.0 for a in abasts_v) / len(abasts_v)
+            for a in abasts_v:
+                if 0 < a.consumo_kml < (media_v * 0.8):
+                    veiculos_alerta.append({'placa': v.license_plate, 'consumo': a.consumo_kml, 'media': media_v})
+                    break
+    return veiculos_alerta
+
+@tagged('post_install', '-at_install', 'combustivel_performance')
+class TestPerformanceCombustivel(CombustivelPerformanceCase):
+    """ Benchmarks dos caminhos quentes: rodar com --test-tags combustivel_performance. """
+
+    def test_criar_em_lote(self):
+        Abastecimento = self.env['controle.combustivel.abastecimento']
+        with self.medicao('criar_200'):
+            registros = Abastecimento.create(self.novos_abastecimentos(200))
+        self.assertEqual(len(registros), 200)
+        self.assertTrue(all(registros.mapped('name')))
+
+    def test_confirmar_em_lote(self):
+        Abastecimento = self.env['controle.combustivel.abastecimento']
+        registros = Abastecimento.create(self.novos_abastecimentos(200))
+        estoque = sum(self.tanques.mapped('estoque_atual'))
+        with self.medicao('confirmar_200'):
+            registros.action_confirmar()
+        self.assertEqual(set(registros.mapped('state')), {'confirmado'})
+        self.assertAlmostEqual(sum(self.tanques.mapped('estoque_atual')), estoque - 200 * 50.0, places=2)
+        self.assertTrue(all(registros.mapped('consumo_kml')), "A leitura anterior vem do histórico gerado")
+
+    def test_confirmar_consultas_constantes(self):
+        """ O número de consultas da confirmação não cresce com o tamanho do lote. """
+        Abastecimento = self.env['controle.combustivel.abastecimento']
+        pequeno = Abastecimento.create(self.novos_abastecimentos(20))
+        grande = Abastecimento.create(self.novos_abastecimentos(200))
+        consultas_pequeno = self.contar_consultas(pequeno.action_confirmar)
+        consultas_grande = self.contar_consultas(grande.action_confirmar)
+        self.assertLessEqual(consultas_grande, consultas_pequeno + 5)
+
+    def test_recalcular_eficiencia(self):
+        Abastecimento = self.env['controle.combustivel.abastecimento']
+        registros = Abastecimento.search([('state', '=', 'confirmado')], limit=2000)
+        esperado = {r.id: r.consumo_kml for r in registros}
+        with self.medicao('recalcular_eficiencia_2000'):
+            registros.recalcular_eficiencia()
+            self.env.flush_all()
+        for registro in registros:
+            self.assertAlmostEqual(registro.consumo_kml, esperado[registro.id], places=2)
+
+    def test_dashboard(self):
+        Dashboard = self.env['controle.combustivel.dashboard']
+        with self.medicao('dashboard_dados'):
+            dados = Dashboard.get_dados()
+        self.assertGreater(dados['total_abastecimentos'], 0)
+        self.assertEqual(len(dados['consumo_diario']), 7)
+        valores = dict(dados, tanque=self.tanques[0], dias_restantes=0, ultimo_abastecimento=False, data_atualizacao='',
+                       vehicles=self.frota, drivers=self.motoristas, selected_vehicle=0, selected_driver=0, action_abastecimento=0,
+                       cor_badge='', cor_progress='', cor_tank='')
+        with self.medicao('dashboard_render'):
+            html = self.env['ir.qweb']._render('controle_combustivel.dashboard_combustivel_template', valores)
+        self.assertIn('Tanque Sintético', str(html))
+
+    def test_dashboard_consultas_independem_do_volume(self):
+        """ Os KPIs vêm da agregação diária: mais histórico não gera mais consultas. """
+        Dashboard = self.env['controle.combustivel.dashboard']
+        antes = self.contar_consultas(Dashboard.get_dados)
+        self.env['controle.combustivel.abastecimento'].create(self.novos_abastecimentos(300)).action_confirmar()
+        self.assertLessEqual(self.contar_consultas(Dashboard.get_dados), antes)
+
+    def test_relatorio(self):
+        registros = self.env['controle.combustivel.abastecimento'].search([('state', '=', 'confirmado')], limit=50)
+        with self.medicao('relatorio_html_50'):
+            html, _tipo = self.env['ir.actions.report']._render_qweb_html('controle_combustivel.action_report_abastecimento', registros.ids)
+        self.assertTrue(html)
+
+    def test_exportacao_livro(self):
+        registros = self.env['controle.combustivel.abastecimento'].search([('state', '=', 'confirmado')], limit=3000)
+        exportacao = self.env['controle.combustivel.exportacao'].create({'formato': 'csv', 'abastecimento_ids': [(6, 0, registros.ids)]})
+        with self.medicao('exportacao_csv_3000'):
+            exportacao._processar()
+        self.assertEqual(exportacao.state, 'concluido')
+        self.assertEqual(exportacao.processados, len(registros))
+
+    def test_importacao_csv(self):
+        linhas = ['placa;data_hora;odometro;litros;preco;chave']
+        for i in range(1000):
+            linhas.append('SIN%04d;2031-01-01 %02d:%02d:00;%d;55,5;6,10;bench-%d' % (i % len(self.frota), i // 60 % 24, i % 60, 3 * 10 ** 7 + i * 400, i))
+        arquivo = io.BytesIO('\n'.join(linhas).encode())
+        with self.medicao('importacao_csv_1000'):
+            resumo = self.env['controle.combustivel.importador'].importar_csv(arquivo, tamanho_lote=500)
+        self.assertEqual(resumo['criados'], 1000, resumo['erros'][:5])
+        # Reimportar o mesmo arquivo não duplica nada
+        arquivo.seek(0)
+        resumo = self.env['controle.combustivel.importador'].importar_csv(arquivo, tamanho_lote=500)
+        self.assertEqual((resumo['criados'], resumo['duplicados']), (0, 1000))
+
+    def test_deteccao_desvios(self):
+        Alerta = self.env['controle.combustivel.alerta']
+        with self.medicao('deteccao_desvios'):
+            Alerta.detectar(dias=365)
+        # Uma leitura muito abaixo da eficiência do veículo (0,5 km/L) vira alerta
+        veiculo = self.frota[0]
+        ultimo = self.env['controle.combustivel.abastecimento'].search([('equipamento_id', '=', veiculo.id), ('state', '=', 'confirmado')], limit=1)
+        registro = self.env['controle.combustivel.abastecimento'].create(self.novos_abastecimentos(
+            1, equipamento_id=veiculo.id, horimetro_odometro=ultimo.horimetro_odometro + 400, quantidade_litros=800.0))
+        registro.action_confirmar()
+        self.assertIn(registro, Alerta.detectar(dias=365).abastecimento_id)
+
+    def test_auditoria_adiada(self):
+        """ Com auditoria adiada as escritas fazem menos consultas; o cron publica tudo depois. """
+        Abastecimento = self.env['controle.combustivel.abastecimento'].with_context(tracking_disable=False, mail_create_nolog=False)
+        normal = Abastecimento.create(self.novos_abastecimentos(100))
+        adiado = Abastecimento.with_context(auditoria_adiada=True).create(self.novos_abastecimentos(100))
+        with self.medicao('escrita_com_tracking_100'):
+            normal.write({'valor_por_litro': 6.5})
+            normal.action_confirmar()
+        with self.medicao('escrita_auditoria_adiada_100'):
+            adiado.write({'valor_por_litro': 6.5})
+            adiado.action_confirmar()
+        self.assertLess(self.medicoes['escrita_auditoria_adiada_100']['consultas'], self.medicoes['escrita_com_tracking_100']['consultas'])
+        Auditoria = self.env['controle.combustivel.auditoria']
+        # Criação, alteração do preço e confirmação; a mudança de state da confirmação não duplica o evento
+        self.assertEqual(Auditoria.search_count([('abastecimento_id', 'in', adiado.ids)]), 300)
+        self.assertEqual(Auditoria.search_count([('abastecimento_id', 'in', adiado.ids), ('evento', '=', 'alteracao')]), 100)
+        mensagens = len(adiado.message_ids)
+        Auditoria.publicar()
+        adiado.invalidate_recordset(['message_ids'])
+        self.assertEqual(len(adiado.message_ids), mensagens + 100)
+        self.assertFalse(Auditoria.search_count([('abastecimento_id', 'in', adiado.ids), ('publicado', '=', False)]))
+        self.assertEqual(Auditoria.publicar(), 0)
+
+    def test_previsao(self):
+        with self.medicao('previsao_tanques'):
+            self.tanques.prever_consumo()
+        for tanque in self.tanques:
+            self.assertGreater(tanque.consumo_previsto_dia, 0)
+            self.assertLessEqual(tanque.quantidade_reposicao, tanque.capacidade)
+
+@tagged('post_install', '-at_install', 'combustivel_volume')
+class TestVolumeCombustivel(CombustivelPerformanceCase):
+    """ Cenários de carga (100 mil abastecimentos, importação de 50 mil linhas): rodar com --test-tags combustivel_volume. """
+
+    volume = dict(VOLUME, abastecimentos=max(VOLUME['abastecimentos'], 100000))
+
+    def test_dashboard_em_volume(self):
+        with self.medicao('dashboard_dados_100k'):
+            dados = self.env['controle.combustivel.dashboard'].get_dados()
+        self.assertGreater(dados['total_abastecimentos'], 0)
+
+    def test_desvios_contra_filtered(self):
+        """ Detecção vetorizada contra o laço antigo de filtered() por veículo, sobre a mesma janela de 30 dias. """
+        Abastecimento = self.env['controle.combustivel.abastecimento']
+        with self.medicao('desvios_filtered_100k'):
+            abastecimentos = Abastecimento.search([('state', '=', 'confirmado'), ('data_hora', '>=', fields.Datetime.now() - timedelta(days=30))])
+            desvios_por_filtered(abastecimentos)
+        self.env.invalidate_all()
+        with self.medicao('deteccao_desvios_100k'):
+            self.env['controle.combustivel.alerta'].detectar(dias=30)
+        self.assertLess(self.medicoes['deteccao_desvios_100k']['segundos'], self.medicoes['desvios_filtered_100k']['segundos'])
+
+    def test_importacao_csv_volume(self):
+        linhas = ['placa;data_hora;odometro;litros;preco;chave']
+        inicio = datetime(2032, 1, 1)
+        for i in range(50000):
+            linhas.append('SIN%04d;%s;%d;55,5;6,10;volume-%d' % (
+                i % len(self.frota), (inicio + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'), 4 * 10 ** 7 + i * 400, i))
+        arquivo = io.BytesIO('\n'.join(linhas).encode())
+        with self.medicao('importacao_csv_50000'):
+            resumo = self.env['controle.combustivel.importador'].importar_csv(arquivo, tamanho_lote=1000)
+        self.assertEqual(resumo['criados'], 50000, resumo['erros'][:5])
+        _logger.info("Importação de %s linhas: %.0f linhas/s", resumo['linhas'], resumo['linhas'] / resumo['segundos'])
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+from odoo.addons.controle_combustivel.models.previsao import prever, projetar_ruptura, suavizar_sazonal
+from .common import criar_cadastros
+from datetime import date, timedelta
+import numpy as np
+
+@tagged('post_install', '-at_install')
+class TestPrevisaoConsumo(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.hoje = date(2031, 7, 2)
+        cls.veiculo, cls.tanque = criar_cadastros(cls.env, 'Previsão', 'PRV0001', tanque={'estoque_manual': 1000.0, 'prazo_reposicao': 3, 'dias_cobertura': 15})
+        _veiculo, cls.parado = criar_cadastros(cls.env, 'Previsão Parado', 'PRV0002', tanque={'estoque_manual': 1000.0})
+        # Consumo constante de 100 L/dia nos 200 dias anteriores a hoje
+        cls.env['controle.combustivel.consumo.diario'].create([{
+            'data': cls.hoje - timedelta(days=dia), 'equipamento_id': cls.veiculo.id, 'tanque_id': cls.tanque.id,
+            'quantidade_litros': 100.0, 'quantidade_abastecimentos': 1,
+        } for dia in range(1, 201)])
+
+    def test_sazonalidade_semanal(self):
+        # Dias úteis a 100 L e fim de semana a 20 L, precedidos de duas semanas sem histórico
+        padrao = np.array([100.0, 100.0, 100.0, 100.0, 100.0, 20.0, 20.0])
+        series = np.hstack([np.zeros(14), np.tile(padrao, 16)])[None, :]
+        nivel, sazonal = suavizar_sazonal(series, np.array([14]))
+        np.testing.assert_allclose(prever(nivel, sazonal, 0, 7)[0], padrao)
+        # A partir de um sábado
+        np.testing.assert_allclose(prever(nivel, sazonal, 5, 3)[0], [20.0, 20.0, 100.0])
+
+    def test_projetar_ruptura(self):
+        previsao = np.full((3, 180), 100.0)
+        # 1.000 L acabam no décimo dia (índice 9); sem estoque, já hoje; 20.000 L passam do horizonte
+        self.assertEqual(projetar_ruptura(np.array([1000.0, 0.0, 20000.0]), previsao).tolist(), [9, 0, -1])
+
+    def test_ruptura_pedido_e_reposicao(self):
+        (self.tanque | self.parado).prever_consumo(hoje=self.hoje)
+        self.assertAlmostEqual(self.tanque.consumo_previsto_dia, 100.0, places=2)
+        self.assertEqual(self.tanque.data_ruptura, self.hoje + timedelta(days=9))
+        # Pedido com o prazo de entrega de antecedência
+        self.assertEqual(self.tanque.data_pedido, self.hoje + timedelta(days=6))
+        # Prazo + cobertura (18 dias, 1.800 L) menos o estoque atual
+        self.assertAlmostEqual(self.tanque.quantidade_reposicao, 800.0, places=2)
+
+        # Sem consumo previsto o estoque não se esgota no horizonte
+        self.assertEqual((self.parado.consumo_previsto_dia, self.parado.data_ruptura, self.parado.data_pedido), (0.0, False, False))
+        self.assertEqual(self.parado.quantidade_reposicao, 0.0)
+
+    def test_pedido_nao_fica_no_passado(self):
+        self.tanque.write({'estoque_manual': 150.0, 'prazo_reposicao': 5})
+        self.tanque.prever_consumo(hoje=self.hoje)
+        self.assertEqual(self.tanque.data_ruptura, self.hoje + timedelta(days=1))
+        self.assertEqual(self.tanque.data_pedido, self.hoje)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, _
+import base64
+import io
+
+class ImportacaoAbastecimento(models.TransientModel):
+    """ Assistente de importação de arquivos CSV de bombas e cartões-combustível. """
+    _name = 'controle.combustivel.importacao'
+    _description = 'Importação de Abastecimentos'
+
+    arquivo = fields.Binary(string='Arquivo CSV', required=True)
+    nome_arquivo = fields.Char(string='Nome do Arquivo')
+    tamanho_lote = fields.Integer(string='Tamanho do Lote', default=500, required=True)
+    confirmar = fields.Boolean(string='Confirmar Abastecimentos', default=True)
+    state = fields.Selection([('inicio', 'Início'), ('concluido', 'Concluído')], default='inicio')
+    linhas = fields.Integer(string='Linhas Lidas', readonly=True)
+    criados = fields.Integer(string='Criados', readonly=True)
+    duplicados = fields.Integer(string='Já Importados', readonly=True)
+    erros = fields.Text(string='Erros', readonly=True)
+
+    def action_importar(self):
+        self.ensure_one()
+        resumo = self.env['controle.combustivel.importador'].importar_csv(
+            io.BytesIO(base64.b64decode(self.arquivo)), tamanho_lote=self.tamanho_lote, confirmar=self.confirmar)
+        self.write({
+            'state': 'concluido',
+            'linhas': resumo['linhas'],
+            'criados': resumo['criados'],
+            'duplicados': resumo['duplicados'],
+            'erros': '\n'.join(_('Linha %(linha)s: %(erro)s', linha=linha, erro=erro) for linha, erro in resumo['erros']),
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }